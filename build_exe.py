@@ -10,9 +10,81 @@ import os
 import shutil
 import subprocess
 import platform
+import argparse
+import time
+
+APP_NAME = "itch.io游戏iframe提取器"
+
+# 快速启动模式下排除的标准库模块，GUI和爬虫都不会用到它们
+FAST_START_EXCLUDES = [
+    "unittest",
+    "doctest",
+    "pdb",
+    "pydoc",
+    "pydoc_data",
+    "xmlrpc",
+    "lib2to3",
+    "distutils",
+    "setuptools",
+    "pkg_resources",
+    "test",
+    "idlelib",
+    "turtle",
+    "turtledemo",
+    "tkinter.test",
+    "curses",
+]
+
+def get_exe_path(dist_dir, fast_start):
+    """获取生成的可执行文件路径"""
+    exe_name = f"{APP_NAME}.exe" if platform.system() == "Windows" else APP_NAME
+    if fast_start:
+        # onedir模式下可执行文件位于同名子目录中
+        return os.path.join(dist_dir, APP_NAME, exe_name)
+    return os.path.join(dist_dir, exe_name)
+
+def bench_startup(exe_path, runs=5):
+    """
+    测量打包后程序的冷启动耗时
+    
+    通过环境变量让GUI在完成首次绘制后立即退出，统计从启动进程到进程结束的时间
+    """
+    if not os.path.exists(exe_path):
+        print(f"错误: 找不到可执行文件 {exe_path}")
+        return None
+    
+    env = dict(os.environ, IFRAME_EXTRACTOR_STARTUP_BENCH="1")
+    timings = []
+    
+    print(f"\n开始启动耗时测试: {exe_path} (共 {runs} 次)")
+    for i in range(runs):
+        start = time.perf_counter()
+        subprocess.run([exe_path], env=env, check=False)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        print(f"第 {i+1} 次启动: {elapsed:.3f} 秒")
+    
+    # 第一次启动最接近冷启动，之后的启动会受益于系统文件缓存
+    cold_start = timings[0]
+    ordered = sorted(timings)
+    median = ordered[len(ordered) // 2]
+    print(f"冷启动: {cold_start:.3f} 秒, 中位数: {median:.3f} 秒, 最快: {ordered[0]:.3f} 秒")
+    return timings
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='将itch.io游戏iframe提取器打包为可执行文件')
+    parser.add_argument('--fast-start', action='store_true', help='使用启动优化的打包配置(onedir、排除无用模块、不使用UPX压缩)')
+    parser.add_argument('--bench-startup', type=int, nargs='?', const=5, default=None, metavar='N',
+                        help='只测试已打包程序的启动耗时，N为启动次数(默认为5)')
+    args = parser.parse_args()
+    
+    dist_dir = "dist"
+    
+    if args.bench_startup is not None:
+        bench_startup(get_exe_path(dist_dir, args.fast_start), args.bench_startup)
+        return
+    
     print("=== itch.io游戏iframe提取器打包工具 ===")
     print("本工具将帮助您将应用打包为可执行文件")
     print()
@@ -48,7 +120,6 @@ def main():
     
     # 创建打包目录
     build_dir = "build"
-    dist_dir = "dist"
     
     # 清理旧的构建文件
     for dir_to_clean in [build_dir, dist_dir]:
@@ -94,14 +165,14 @@ hiddenimports = [
 """)
     
     # 构建命令
+    # iframe_scraper作为普通模块打包，GUI启动时直接导入，不再在运行时复制和执行源文件
     cmd = [
         "pyinstaller",
         "--noconfirm",
-        "--onefile",
         "--windowed",
         f"--additional-hooks-dir={hooks_dir}",
-        "--name", "itch.io游戏iframe提取器",
-        "--add-data", f"iframe_scraper.py{os.pathsep}.",
+        "--name", APP_NAME,
+        "--hidden-import", "iframe_scraper",
         "--hidden-import", "urllib.request",
         "--hidden-import", "urllib.error",
         "--hidden-import", "urllib.parse",
@@ -113,6 +184,16 @@ hiddenimports = [
         "--hidden-import", "logging",
     ]
     
+    if args.fast_start:
+        # onedir模式避免每次启动都把整个程序解压到临时目录；
+        # 不使用UPX可以省去启动时的解压缩；优化级别1去掉assert语句
+        print("使用快速启动打包配置")
+        cmd.extend(["--onedir", "--noupx", "--optimize", "1"])
+        for module in FAST_START_EXCLUDES:
+            cmd.extend(["--exclude-module", module])
+    else:
+        cmd.append("--onefile")
+    
     # 添加图标选项
     cmd.extend(icon_option)
     
@@ -132,10 +213,7 @@ hiddenimports = [
         print("\n构建成功! √")
         
         # 获取生成的可执行文件路径
-        if system == "Windows":
-            exe_path = os.path.join(dist_dir, "itch.io游戏iframe提取器.exe")
-        else:
-            exe_path = os.path.join(dist_dir, "itch.io游戏iframe提取器")
+        exe_path = get_exe_path(dist_dir, args.fast_start)
         
         print(f"\n可执行文件位置: {os.path.abspath(exe_path)}")
         
@@ -143,9 +221,10 @@ hiddenimports = [
         print("\n您可以:")
         print(f"1. 打开输出目录: {os.path.abspath(dist_dir)}")
         print("2. 直接运行程序")
-        print("3. 退出")
+        print("3. 测试启动耗时")
+        print("4. 退出")
         
-        choice = input("\n请选择 (1/2/3): ")
+        choice = input("\n请选择 (1/2/3/4): ")
         
         if choice == "1":
             # 打开输出目录
@@ -162,6 +241,8 @@ hiddenimports = [
                 subprocess.Popen([exe_path])
             else:
                 subprocess.Popen([exe_path])
+        elif choice == "3":
+            bench_startup(exe_path)
     
     except Exception as e:
         print(f"\n构建失败: {e}")
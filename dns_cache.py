@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+DNS缓存和连接预热
+
+itch.io上每个游戏都在作者自己的子域名下，每个游戏页面都要单独解析一次域名。
+DnsCache在进程内缓存解析结果(包括解析失败的结果)，同一域名同时只解析一次；
+ConnectionWarmer在处理当前游戏时提前解析并连接接下来几个游戏的主机，
+urllib请求时直接使用已经建立好的连接。
+
+使用build_opener()创建的urllib opener发送请求即可同时使用这两个功能。
+"""
+
+import time
+import select
+import socket
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+class DnsCache:
+    """带有效期的域名解析缓存，解析失败的结果也会缓存一小段时间"""
+
+    def __init__(self, ttl=300, negative_ttl=30, max_entries=10000):
+        """
+        Args:
+            ttl: 解析结果的缓存时间(秒)
+            negative_ttl: 解析失败的缓存时间(秒)
+            max_entries: 最多缓存的域名数，超出时淘汰最久未使用的
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        """
+        解析域名，返回socket.getaddrinfo格式的地址列表
+
+        Raises:
+            socket.gaierror: 解析失败(包括缓存的失败结果)
+        """
+        key = (host, port)
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > time.time():
+                    self._entries.move_to_end(key)
+                    if isinstance(entry[1], Exception):
+                        self.negative_hits += 1
+                        raise entry[1]
+                    self.hits += 1
+                    return entry[1]
+                pending = self._pending.get(key)
+                if pending is None:
+                    # 由当前线程解析，其他线程等待结果
+                    pending = self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            pending.wait()
+
+        try:
+            addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            self._store(key, time.time() + self.negative_ttl, e)
+            raise
+        except Exception:
+            # 其他错误(如被中断)不缓存
+            self._store(key, 0, None)
+            raise
+        self._store(key, time.time() + self.ttl, addresses)
+        return addresses
+
+    def stats(self):
+        """命中统计"""
+        with self._lock:
+            return {
+                'dns_hits': self.hits,
+                'dns_misses': self.misses,
+                'dns_negative_hits': self.negative_hits,
+                'dns_entries': len(self._entries)
+            }
+
+    def _store(self, key, expires, value):
+        with self._lock:
+            if value is None:
+                self._entries.pop(key, None)
+            else:
+                self._entries[key] = (expires, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            self._pending.pop(key).set()
+
+    def create_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        """与socket.create_connection相同，但使用缓存的解析结果"""
+        host, port = address
+        last_error = None
+        for family, socktype, proto, _, sockaddr in self.resolve(host, port):
+            sock = None
+            try:
+                sock = socket.socket(family, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                last_error = e
+                if sock is not None:
+                    sock.close()
+        raise last_error or OSError(f"没有可用的地址: {host}")
+
+class CachedHTTPConnection(http.client.HTTPConnection):
+    """使用DNS缓存建立连接的HTTPConnection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = get_dns_cache().create_connection
+
+class CachedHTTPSConnection(http.client.HTTPSConnection):
+    """使用DNS缓存建立连接的HTTPSConnection(证书仍按域名验证)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = get_dns_cache().create_connection
+
+class ConnectionWarmer:
+    """提前解析并连接接下来要请求的主机"""
+
+    def __init__(self, max_workers=4, idle_seconds=10, max_per_host=2):
+        """
+        Args:
+            max_workers: 同时预热的连接数
+            idle_seconds: 预热的连接超过这个时间没有使用就关闭(服务器可能已经断开)
+            max_per_host: 每个主机最多保留的预热连接数
+        """
+        self.idle_seconds = idle_seconds
+        self.max_per_host = max_per_host
+        self.warmed = 0
+        self.used = 0
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='warmup')
+        # 使用代理时连接的是代理服务器，不预先连接
+        self.enabled = not urllib.request.getproxies()
+
+    def warm(self, urls, timeout=10, context=None):
+        """
+        在后台提前解析并连接这些URL的主机(每个主机只保留max_per_host个连接)
+
+        Args:
+            urls: 接下来要请求的URL
+            timeout: 连接超时(秒)
+            context: HTTPS连接使用的SSL上下文，应与发出请求的opener相同(见build_opener返回的ssl_context)
+        """
+        with self._lock:
+            self._reap()
+        for url in urls:
+            parsed = urllib.parse.urlsplit(url)
+            if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+                continue
+            key = (parsed.scheme, parsed.netloc, context if parsed.scheme == 'https' else None)
+            with self._lock:
+                if len(self._idle.get(key, ())) >= self.max_per_host:
+                    continue
+            self._executor.submit(self._connect, key, timeout)
+
+    def take(self, scheme, netloc, timeout, context=None):
+        """取出一个预热好的、使用同一个SSL上下文的连接，没有时返回None"""
+        with self._lock:
+            connections = self._idle.get((scheme, netloc, context if scheme == 'https' else None))
+            while connections:
+                created, conn = connections.pop()
+                if time.time() - created > self.idle_seconds or not connection_alive(conn):
+                    conn.close()
+                    continue
+                self.used += 1
+                break
+            else:
+                return None
+        conn.timeout = timeout
+        conn.sock.settimeout(None if timeout is socket._GLOBAL_DEFAULT_TIMEOUT else timeout)
+        return conn
+
+    def close_idle(self):
+        """关闭所有没有被使用的预热连接，爬取结束时调用"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, conn in connections:
+                conn.close()
+
+    def stats(self):
+        """预热的连接数和被使用的连接数"""
+        with self._lock:
+            return {'connections_warmed': self.warmed, 'connections_reused': self.used}
+
+    def _reap(self):
+        """关闭超过idle_seconds没有使用或已经被服务器关闭的连接(调用时持有锁)"""
+        now = time.time()
+        for key, connections in list(self._idle.items()):
+            alive = []
+            for created, conn in connections:
+                if now - created > self.idle_seconds or not connection_alive(conn):
+                    conn.close()
+                else:
+                    alive.append((created, conn))
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
+
+    def _connect(self, key, timeout):
+        scheme, netloc, context = key
+        try:
+            if not self.enabled:
+                # 只预先解析域名
+                host = urllib.parse.urlsplit(f"{scheme}://{netloc}").hostname
+                get_dns_cache().resolve(host, 443 if scheme == 'https' else 80)
+                return
+            if scheme == 'https':
+                conn = CachedHTTPSConnection(netloc, timeout=timeout, context=context)
+            else:
+                conn = CachedHTTPConnection(netloc, timeout=timeout)
+            conn.connect()
+        except Exception:
+            return
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) >= self.max_per_host:
+                conn.close()
+                return
+            connections.append((time.time(), conn))
+            self.warmed += 1
+
+def connection_alive(conn):
+    """空闲的连接是否仍然可用(服务器关闭连接后socket会变为可读)"""
+    if conn.sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return False
+    return not readable
+
+class CachedHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(connection_factory('http', CachedHTTPConnection), req)
+
+class CachedHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(connection_factory('https', CachedHTTPSConnection), req, context=self._context)
+
+def connection_factory(scheme, connection_class):
+    """urllib使用的连接工厂，优先使用预热好的连接"""
+    def create(host, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, **kwargs):
+        conn = get_connection_warmer().take(scheme, host, timeout, kwargs.get('context'))
+        if conn is not None:
+            return conn
+        return connection_class(host, timeout=timeout, **kwargs)
+    return create
+
+def build_opener(context=None):
+    """
+    创建使用DNS缓存和预热连接的urllib opener
+
+    Args:
+        context: HTTPS请求使用的SSL上下文，默认使用系统证书验证
+
+    Returns:
+        OpenerDirector: ssl_context属性是HTTPS请求使用的SSL上下文，预热连接时传给ConnectionWarmer.warm
+    """
+    opener = urllib.request.build_opener(CachedHTTPHandler, CachedHTTPSHandler(context=context))
+    opener.ssl_context = context
+    return opener
+
+# 进程内共享的DNS缓存和连接预热
+_default_cache = DnsCache()
+_default_warmer = None
+_default_warmer_lock = threading.Lock()
+
+def get_dns_cache():
+    """获取进程内共享的DNS缓存"""
+    return _default_cache
+
+def get_connection_warmer():
+    """获取进程内共享的连接预热器，第一次调用时才创建线程池"""
+    global _default_warmer
+    with _default_warmer_lock:
+        if _default_warmer is None:
+            _default_warmer = ConnectionWarmer()
+        return _default_warmer
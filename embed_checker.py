@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+iframe源可用性检查
+
+并发地向结果中的iframe_src发送HEAD请求(服务器不支持HEAD时改用只请求第一个字节的GET)，
+记录状态码、延迟和内容类型。同一主机(通常是html-classic.itch.zone)的连接会被复用，
+检查结果在有效期内缓存在SQLite中。只请求itch.io的嵌入主机(EMBED_HOSTS)，重定向到其他主机时不跟随。
+
+命令行用法:
+    python embed_checker.py results/game_iframes.json            检查并把结果写回文件
+    python embed_checker.py results/game_iframes.json --prune    同时删除不可用的结果
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import argparse
+import threading
+import http.client
+import urllib.parse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from result_writers import format_from_path, read_results, write_results
+
+if 'VERCEL' in os.environ:
+    DEFAULT_CHECK_CACHE_PATH = '/tmp/cache/embed_checks.sqlite3'
+else:
+    DEFAULT_CHECK_CACHE_PATH = os.path.join('cache', 'embed_checks.sqlite3')
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+# 最多跟随的重定向次数
+MAX_REDIRECTS = 3
+
+# 允许检查的主机(及其子域名)，避免检查请求被用来访问任意服务器
+EMBED_HOSTS = ('itch.zone', 'itch.io')
+
+# 服务器不支持HEAD时返回的状态码，遇到时改用GET重试
+HEAD_UNSUPPORTED = (403, 405, 501)
+
+def normalize_embed_url(url):
+    """把//开头和/开头的iframe_src补全为完整URL"""
+    if url.startswith('//'):
+        return 'https:' + url
+    if url.startswith('/'):
+        return 'https://itch.io' + url
+    return url
+
+def is_embed_host(url, allowed_hosts=EMBED_HOSTS):
+    """URL是否为http(s)且主机是allowed_hosts之一或其子域名，allowed_hosts为None时允许所有主机"""
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ('http', 'https'):
+        return False
+    if allowed_hosts is None:
+        return True
+    host = (parsed.hostname or '').lower()
+    return any(host == allowed or host.endswith('.' + allowed) for allowed in allowed_hosts)
+
+class HostConnectionPool:
+    """按主机复用的keep-alive HTTP连接池"""
+
+    def __init__(self, max_per_host=8, timeout=10):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, headers=None, max_body=65536):
+        """
+        发送请求，返回 (状态码, 响应头, 最多max_body字节的响应体)
+
+        连接复用失败(服务器已关闭keep-alive连接)时用新连接重试一次
+        """
+        parsed = urllib.parse.urlsplit(url)
+        key = (parsed.scheme, parsed.netloc)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+
+        for attempt in range(2):
+            conn, reused = self._acquire(key)
+            try:
+                conn.request(method, path, headers=headers or {})
+                response = conn.getresponse()
+                # HEAD响应也要读取(为空)，之后连接才会被标记为可以复用
+                body = response.read() if method == 'HEAD' else response.read(max_body)
+                # 响应体没有读完时连接不能复用
+                if response.will_close or not response.isclosed():
+                    conn.close()
+                else:
+                    self._release(key, conn)
+                return response.status, response.headers, body
+            except (http.client.HTTPException, OSError):
+                conn.close()
+                if not reused or attempt:
+                    raise
+
+    def close(self):
+        """关闭所有空闲连接"""
+        with self._lock:
+            for connections in self._idle.values():
+                while not connections.empty():
+                    connections.get_nowait().close()
+            self._idle.clear()
+
+    def _acquire(self, key):
+        with self._lock:
+            connections = self._idle.setdefault(key, queue.LifoQueue())
+        try:
+            return connections.get_nowait(), True
+        except queue.Empty:
+            scheme, netloc = key
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            return connection_class(netloc, timeout=self.timeout), False
+
+    def _release(self, key, conn):
+        connections = self._idle[key]
+        if connections.qsize() < self.max_per_host:
+            connections.put(conn)
+        else:
+            conn.close()
+
+class EmbedCheckCache:
+    """iframe源检查结果缓存(SQLite)"""
+
+    def __init__(self, path=DEFAULT_CHECK_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embed_checks ("
+            " url TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " checked_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, url, ttl_seconds):
+        """返回有效期内的检查结果，没有时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM embed_checks WHERE url = ? AND checked_at >= ?",
+                (url, time.time() - ttl_seconds)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, url, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embed_checks (url, result, checked_at) VALUES (?, ?, ?)",
+                (url, json.dumps(result, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class EmbedChecker:
+    """并发检查iframe源是否可用"""
+
+    def __init__(self, concurrency=16, timeout=10, ttl_seconds=3600, cache=None, allowed_hosts=EMBED_HOSTS):
+        """
+        Args:
+            concurrency: 同时进行的检查数
+            timeout: 单个请求的超时时间(秒)
+            ttl_seconds: 检查结果的缓存有效期(秒)
+            cache: EmbedCheckCache，为None时不缓存
+            allowed_hosts: 允许请求的主机，iframe源和每个重定向目标都要在其中；为None时不限制
+        """
+        self.concurrency = concurrency
+        self.allowed_hosts = allowed_hosts
+        self.ttl_seconds = ttl_seconds
+        self.cache = cache
+        self.pool = HostConnectionPool(max_per_host=concurrency, timeout=timeout)
+
+    def check(self, url):
+        """
+        检查一个iframe源
+
+        Returns:
+            dict: ok、status、latency_ms、content_type、final_url、method、error、checked_at
+        """
+        if self.cache is not None:
+            cached = self.cache.get(url, self.ttl_seconds)
+            if cached is not None:
+                cached['cached'] = True
+                return cached
+
+        result = self._check_uncached(url)
+        if self.cache is not None and result['status'] is not None:
+            # 网络错误不缓存，下次重新检查
+            self.cache.put(url, result)
+        return result
+
+    def check_many(self, urls, on_result=None):
+        """
+        并发检查多个iframe源，重复的URL只检查一次
+
+        Args:
+            urls: iframe源列表
+            on_result: 每完成一个检查时调用 on_result(url, result)
+
+        Returns:
+            dict: URL -> 检查结果
+        """
+        unique_urls = list(dict.fromkeys(url for url in urls if url))
+        checks = {}
+
+        def run(url):
+            result = self.check(url)
+            checks[url] = result
+            if on_result is not None:
+                on_result(url, result)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            list(executor.map(run, unique_urls))
+        return checks
+
+    def close(self):
+        self.pool.close()
+
+    def _request(self, method, url):
+        """发送检查请求，GET请求只请求第一个字节，避免下载整个页面"""
+        request_headers = {'User-Agent': USER_AGENT}
+        if method == 'GET':
+            request_headers['Range'] = 'bytes=0-0'
+        status, headers, _ = self.pool.request(method, url, request_headers, max_body=1024)
+        return status, headers
+
+    def _check_uncached(self, url):
+        result = {
+            'ok': False,
+            'status': None,
+            'latency_ms': None,
+            'content_type': None,
+            'final_url': None,
+            'method': 'HEAD',
+            'error': None,
+            'checked_at': datetime.now().isoformat()
+        }
+        current = normalize_embed_url(url)
+        if not is_embed_host(current, self.allowed_hosts):
+            result['error'] = f"不允许检查的主机: {current}"
+            return result
+        started = time.time()
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                status, headers = self._request(result['method'], current)
+                if result['method'] == 'HEAD' and status in HEAD_UNSUPPORTED:
+                    result['method'] = 'GET'
+                    status, headers = self._request('GET', current)
+                if status in (301, 302, 303, 307, 308) and headers.get('Location'):
+                    target = urllib.parse.urljoin(current, headers['Location'])
+                    if not is_embed_host(target, self.allowed_hosts):
+                        # 不跟随到其他主机的重定向，结果为重定向的状态码(不可用)
+                        result['error'] = f"重定向到不允许的主机: {target}"
+                        break
+                    current = target
+                    continue
+                break
+            result['status'] = status
+            result['content_type'] = headers.get('Content-Type')
+            result['final_url'] = current
+            result['ok'] = 200 <= status < 300
+        except Exception as e:
+            result['error'] = str(e)
+        result['latency_ms'] = round((time.time() - started) * 1000, 1)
+        return result
+
+# 进程内共享的默认缓存
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_check_cache():
+    """获取进程内共享的默认检查结果缓存，无法打开时返回None"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = EmbedCheckCache(os.environ.get('EMBED_CHECK_CACHE_PATH', DEFAULT_CHECK_CACHE_PATH))
+            except Exception as e:
+                print(f"无法打开iframe源检查缓存: {e}")
+                return None
+        return _default_cache
+
+def annotate_results(results, checks):
+    """
+    把检查结果写入每个结果的embed_check字段
+
+    Returns:
+        dict: 检查汇总(checked、alive、dead、unreachable)
+    """
+    summary = {'checked': 0, 'alive': 0, 'dead': 0, 'unreachable': 0}
+    for result in results:
+        check = checks.get(result.get('iframe_src'))
+        if check is None:
+            continue
+        result['embed_check'] = {
+            key: check.get(key)
+            for key in ('ok', 'status', 'latency_ms', 'content_type', 'checked_at', 'error')
+        }
+        summary['checked'] += 1
+        if check['ok']:
+            summary['alive'] += 1
+        elif check['status'] is None:
+            summary['unreachable'] += 1
+        else:
+            summary['dead'] += 1
+    return summary
+
+def check_results(results, concurrency=16, timeout=10, ttl_seconds=3600, use_cache=True, allowed_hosts=EMBED_HOSTS):
+    """
+    检查一组结果的iframe源并写入embed_check字段
+
+    Returns:
+        dict: 检查汇总
+    """
+    checker = EmbedChecker(
+        concurrency=concurrency,
+        timeout=timeout,
+        ttl_seconds=ttl_seconds,
+        cache=get_default_check_cache() if use_cache else None,
+        allowed_hosts=allowed_hosts
+    )
+    try:
+        checks = checker.check_many(result.get('iframe_src') for result in results)
+    finally:
+        checker.close()
+    return annotate_results(results, checks)
+
+def main():
+    """检查结果文件中的iframe源"""
+    parser = argparse.ArgumentParser(description='检查结果文件中的iframe源是否可用')
+    parser.add_argument('files', nargs='+', help='结果文件')
+    parser.add_argument('--concurrency', type=int, default=16, help='同时检查的数量，默认为16')
+    parser.add_argument('--timeout', type=float, default=10, help='单个请求的超时时间（秒），默认为10')
+    parser.add_argument('--ttl', type=int, default=3600, help='检查结果的缓存有效期（秒），默认为3600')
+    parser.add_argument('--no_cache', action='store_true', help='不使用检查结果缓存')
+    parser.add_argument('--prune', action='store_true', help='删除返回错误状态码的结果（网络错误的结果保留）')
+    args = parser.parse_args()
+
+    for path in args.files:
+        format_name = format_from_path(path)
+        results = read_results(path, format_name)
+        started = time.time()
+        summary = check_results(results, args.concurrency, args.timeout, args.ttl, not args.no_cache)
+        print(f"{path}: 检查 {summary['checked']} 个，可用 {summary['alive']} 个，"
+              f"不可用 {summary['dead']} 个，无法连接 {summary['unreachable']} 个，"
+              f"耗时 {time.time() - started:.1f}秒")
+
+        if args.prune:
+            before = len(results)
+            results = [
+                result for result in results
+                if (result.get('embed_check') or {}).get('ok', True) or (result.get('embed_check') or {}).get('status') is None
+            ]
+            print(f"{path}: 删除了 {before - len(results)} 个不可用的结果")
+
+        write_results(results, path, format_name)
+
+if __name__ == "__main__":
+    main()
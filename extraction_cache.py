@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+提取结果缓存
+
+按 (游戏URL, 页面内容哈希, 提取器版本) 缓存游戏页面的提取结果(页面内容哈希见page_content_hash)，
+内存中的LRU缓存在前，SQLite持久化缓存在后，可以在多个任务和多个进程之间共享。
+页面内容没有变化时直接复用上次的提取结果，跳过正则匹配和简介/缩略图解析；
+修改提取逻辑后提升提取器版本号即可让旧的缓存失效。
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+# 默认缓存文件位置，Vercel上只有/tmp可写
+if 'VERCEL' in os.environ:
+    DEFAULT_CACHE_PATH = '/tmp/cache/extraction_cache.sqlite3'
+else:
+    DEFAULT_CACHE_PATH = os.path.join('cache', 'extraction_cache.sqlite3')
+
+def content_hash(content):
+    """计算页面内容的哈希值"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+# 每次请求都不同、提取时不会读取的页面内容: 脚本和样式的内容、CSP nonce和CSRF令牌
+VOLATILE_PATTERNS = (
+    (re.compile(r'(<(script|style)\b[^>]*>).*?(</\2\s*>)', re.DOTALL | re.IGNORECASE), r'\1\3'),
+    (re.compile(r'\snonce="[^"]*"'), ''),
+    (re.compile(r'(<(?:meta|input)\b[^>]*\bname="csrf_token"[^>]*\b(?:value|content)=")[^"]*"'), r'\1"'),
+)
+
+def page_content_hash(html_content):
+    """
+    计算游戏页面的内容哈希，作为提取结果缓存的键
+
+    先去掉每次请求都不同的内容(VOLATILE_PATTERNS)，页面的其余部分没有变化时哈希相同。
+    提取iframe源和附加信息时不读取脚本和样式的内容，所以去掉它们不影响提取结果。
+    """
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('utf-8', 'replace')
+    for pattern, replacement in VOLATILE_PATTERNS:
+        html_content = pattern.sub(replacement, html_content)
+    return content_hash(html_content)
+
+class ExtractionCache:
+    """两级提取结果缓存（内存LRU + SQLite）"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_memory_entries=2048):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite缓存文件路径，为None时只使用内存缓存
+            max_memory_entries: 内存LRU缓存的最大条目数
+        """
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            # 多个线程共用一个连接，由self._lock保证串行访问
+            self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                " url TEXT NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " extractor_version TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (url, content_hash, extractor_version))"
+            )
+            self._conn.commit()
+
+    def get(self, url, page_hash, extractor_version):
+        """
+        查找缓存的提取结果
+
+        Args:
+            url: 游戏URL
+            page_hash: 页面内容哈希
+            extractor_version: 提取器版本
+
+        Returns:
+            dict: 缓存的提取结果，未命中时返回None
+        """
+        key = (url, page_hash, extractor_version)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return dict(self._memory[key])
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT result FROM extraction_cache WHERE url = ? AND content_hash = ? AND extractor_version = ?",
+                    key
+                ).fetchone()
+                if row:
+                    result = json.loads(row[0])
+                    self._remember(key, result)
+                    self.hits += 1
+                    return dict(result)
+
+            self.misses += 1
+            return None
+
+    def put(self, url, page_hash, extractor_version, result):
+        """
+        保存提取结果
+
+        Args:
+            url: 游戏URL
+            page_hash: 页面内容哈希
+            extractor_version: 提取器版本
+            result: 可JSON序列化的提取结果字典
+        """
+        key = (url, page_hash, extractor_version)
+        with self._lock:
+            self._remember(key, dict(result))
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO extraction_cache (url, content_hash, extractor_version, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                    key + (json.dumps(result, ensure_ascii=False), time.time())
+                )
+                self._conn.commit()
+
+    def purge_other_versions(self, extractor_name, extractor_version):
+        """
+        删除同一提取器其他版本的缓存条目
+
+        Args:
+            extractor_name: 提取器名称，即版本字符串中'/'之前的部分
+            extractor_version: 当前的提取器版本
+
+        Returns:
+            int: 删除的条目数
+        """
+        with self._lock:
+            for key in [key for key in self._memory if key[2].startswith(f"{extractor_name}/") and key[2] != extractor_version]:
+                del self._memory[key]
+            if self._conn is None:
+                return 0
+            cursor = self._conn.execute(
+                "DELETE FROM extraction_cache WHERE extractor_version LIKE ? AND extractor_version != ?",
+                (f"{extractor_name}/%", extractor_version)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def purge_older_than(self, max_age_seconds):
+        """
+        删除超过保留期限的缓存条目
+
+        Args:
+            max_age_seconds: 条目保留的秒数
+
+        Returns:
+            int: 从SQLite中删除的条目数
+        """
+        with self._lock:
+            # 内存缓存中无法得知条目的写入时间，直接清空，之后从SQLite重新加载
+            self._memory.clear()
+            if self._conn is None:
+                return 0
+            cursor = self._conn.execute(
+                "DELETE FROM extraction_cache WHERE created_at < ?",
+                (time.time() - max_age_seconds,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self):
+        """返回命中统计"""
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses
+        }
+
+    def close(self):
+        """关闭SQLite连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, key, result):
+        """写入内存LRU缓存，超出容量时淘汰最久未使用的条目"""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+# 进程内共享的默认缓存
+_default_cache = None
+_default_cache_disabled = 'EXTRACTION_CACHE_DISABLED' in os.environ
+_default_cache_lock = threading.Lock()
+_purged_extractors = set()
+
+def get_default_cache(extractor_version=None):
+    """
+    获取进程内共享的默认缓存，第一次调用时才打开缓存文件
+
+    Args:
+        extractor_version: 调用方的提取器版本(如"fast_scraper/2")，
+                           每个提取器第一次使用时会清除它旧版本的缓存条目
+
+    Returns:
+        ExtractionCache: 默认缓存，缓存被禁用或无法打开时返回None
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache_disabled:
+            return None
+        if _default_cache is None:
+            try:
+                _default_cache = ExtractionCache(os.environ.get('EXTRACTION_CACHE_PATH', DEFAULT_CACHE_PATH))
+            except Exception as e:
+                print(f"无法打开提取结果缓存，改为只使用内存缓存: {e}")
+                _default_cache = ExtractionCache(None)
+        cache = _default_cache
+
+    if extractor_version and extractor_version not in _purged_extractors:
+        _purged_extractors.add(extractor_version)
+        cache.purge_other_versions(extractor_version.split('/')[0], extractor_version)
+    return cache
+
+def disable_default_cache():
+    """禁用默认缓存"""
+    global _default_cache_disabled
+    with _default_cache_lock:
+        _default_cache_disabled = True
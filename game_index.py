@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+游戏索引
+
+把所有任务的结果按游戏URL去重后保存在SQLite中，记录首次和最后一次见到的时间，
+标题和简介建立FTS5全文索引。查询使用按ID的游标分页，数据量很大时翻页也不会变慢。
+
+也可以直接运行本文件把已有的结果文件导入索引:
+    python game_index.py results/*.json
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import threading
+
+from result_writers import read_results
+
+if 'VERCEL' in os.environ:
+    DEFAULT_INDEX_PATH = '/tmp/index/game_index.sqlite3'
+else:
+    DEFAULT_INDEX_PATH = os.path.join('index', 'game_index.sqlite3')
+
+# 查询返回的字段
+GAME_COLUMNS = [
+    'id', 'url', 'game_id', 'title', 'iframe_src', 'extracted_method',
+    'description', 'thumbnail_url', 'first_seen', 'last_seen', 'last_job_id'
+]
+
+MAX_PAGE_SIZE = 500
+
+class GameIndex:
+    """按游戏URL去重的持久化游戏索引"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        """
+        初始化索引
+
+        Args:
+            path: SQLite文件路径，为':memory:'时只保存在内存中
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # 多个线程共用一个连接，由self._lock保证串行访问
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            # WAL模式下多个进程可以同时读，写入不会阻塞读取
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS games (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                game_id TEXT,
+                title TEXT,
+                iframe_src TEXT,
+                extracted_method TEXT,
+                description TEXT,
+                thumbnail_url TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                last_job_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS games_method ON games (extracted_method, id);
+            CREATE INDEX IF NOT EXISTS games_game_id ON games (game_id);
+            CREATE INDEX IF NOT EXISTS games_last_seen ON games (last_seen);
+        """)
+
+        # 没有编译FTS5的SQLite上退回到LIKE搜索
+        try:
+            self._conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS games_fts USING fts5(
+                    title, description, content='games', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                );
+                CREATE TRIGGER IF NOT EXISTS games_fts_insert AFTER INSERT ON games BEGIN
+                    INSERT INTO games_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+                END;
+                CREATE TRIGGER IF NOT EXISTS games_fts_delete AFTER DELETE ON games BEGIN
+                    INSERT INTO games_fts (games_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+                END;
+                CREATE TRIGGER IF NOT EXISTS games_fts_update AFTER UPDATE OF title, description ON games BEGIN
+                    INSERT INTO games_fts (games_fts, rowid, title, description) VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO games_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+                END;
+            """)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False
+        self._conn.commit()
+
+    def add_results(self, results, job_id=None, seen_at=None):
+        """
+        把一批结果加入索引，已有的游戏更新字段和最后见到的时间
+
+        Args:
+            results: 结果字典列表(服务器结果使用url字段，命令行结果使用game_url字段)
+            job_id: 结果来自的任务ID
+            seen_at: 见到这些结果的时间戳，默认为当前时间
+
+        Returns:
+            int: 加入或更新的游戏数量
+        """
+        seen_at = time.time() if seen_at is None else seen_at
+        rows = []
+        for result in results:
+            url = result.get('url') or result.get('game_url')
+            # 跳过失败占位结果
+            if not url or not result.get('iframe_src'):
+                continue
+            rows.append((
+                url, result.get('game_id'), result.get('title'), result.get('iframe_src'),
+                result.get('extracted_method'), result.get('description'), result.get('thumbnail_url'),
+                seen_at, seen_at, job_id
+            ))
+
+        with self._lock:
+            # 新结果中没有的字段(如简介)保留索引中已有的值
+            self._conn.executemany("""
+                INSERT INTO games (url, game_id, title, iframe_src, extracted_method, description,
+                                   thumbnail_url, first_seen, last_seen, last_job_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (url) DO UPDATE SET
+                    game_id = COALESCE(excluded.game_id, game_id),
+                    title = COALESCE(excluded.title, title),
+                    iframe_src = excluded.iframe_src,
+                    extracted_method = COALESCE(excluded.extracted_method, extracted_method),
+                    description = COALESCE(excluded.description, description),
+                    thumbnail_url = COALESCE(excluded.thumbnail_url, thumbnail_url),
+                    last_seen = MAX(last_seen, excluded.last_seen),
+                    last_job_id = excluded.last_job_id
+            """, rows)
+            self._conn.commit()
+        return len(rows)
+
+    def get(self, url):
+        """按游戏URL查找，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(GAME_COLUMNS)} FROM games WHERE url = ?", (url,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def query(self, method=None, game_id=None, since=None, cursor=None, limit=50):
+        """
+        按条件查询游戏，从最新加入的开始
+
+        Args:
+            method: 提取方法
+            game_id: itch.io游戏ID
+            since: 只返回最后见到时间不早于这个时间戳的游戏
+            cursor: 上一页返回的next_cursor
+            limit: 每页数量
+
+        Returns:
+            tuple: (游戏字典列表, 下一页的游标，没有下一页时为None)
+        """
+        conditions = []
+        params = []
+        if method:
+            conditions.append("extracted_method = ?")
+            params.append(method)
+        if game_id:
+            conditions.append("game_id = ?")
+            params.append(str(game_id))
+        if since is not None:
+            conditions.append("last_seen >= ?")
+            params.append(since)
+        return self._page(
+            f"SELECT {', '.join(GAME_COLUMNS)} FROM games", conditions, params, 'id', cursor, limit
+        )
+
+    def search(self, text, cursor=None, limit=50):
+        """
+        在标题和简介中全文搜索，每个词都要出现，最后一个词按前缀匹配
+
+        Returns:
+            tuple: (游戏字典列表, 下一页的游标，没有下一页时为None)
+        """
+        words = text.split()
+        if not words:
+            return [], None
+
+        if not self.has_fts:
+            conditions = ["(title LIKE ? OR description LIKE ?)"] * len(words)
+            params = [value for word in words for value in (f"%{word}%", f"%{word}%")]
+            return self._page(
+                f"SELECT {', '.join(GAME_COLUMNS)} FROM games", conditions, params, 'id', cursor, limit
+            )
+
+        # 每个词作为短语引用，避免用户输入被当作FTS5查询语法
+        match = ' '.join('"' + word.replace('"', '""') + '"' for word in words) + '*'
+        columns = ', '.join(f"games.{column}" for column in GAME_COLUMNS)
+        return self._page(
+            f"SELECT {columns} FROM games_fts JOIN games ON games.id = games_fts.rowid",
+            ["games_fts MATCH ?"], [match], 'games_fts.rowid', cursor, limit
+        )
+
+    def stats(self):
+        """索引中的游戏总数和各提取方法的数量"""
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM games").fetchone()[0]
+            methods = self._conn.execute(
+                "SELECT extracted_method, COUNT(*) FROM games GROUP BY extracted_method"
+            ).fetchall()
+        return {
+            'total': total,
+            'methods': {method or 'unknown': count for method, count in methods}
+        }
+
+    def close(self):
+        """关闭SQLite连接"""
+        with self._lock:
+            self._conn.close()
+
+    def _page(self, select, conditions, params, id_column, cursor, limit):
+        """按ID倒序分页，游标是上一页最后一行的ID"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        conditions = list(conditions)
+        params = list(params)
+        if cursor is not None:
+            conditions.append(f"{id_column} < ?")
+            params.append(int(cursor))
+        sql = select
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {id_column} DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = str(rows[-1]['id'])
+        return rows, next_cursor
+
+# 进程内共享的默认索引
+_default_index = None
+_default_index_lock = threading.Lock()
+
+def get_game_index():
+    """获取进程内共享的默认索引，第一次调用时才打开索引文件"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = GameIndex(os.environ.get('GAME_INDEX_PATH', DEFAULT_INDEX_PATH))
+        return _default_index
+
+def main():
+    """把命令行参数中的结果文件导入索引"""
+    if len(sys.argv) < 2:
+        print("用法: python game_index.py 结果文件 [结果文件 ...]")
+        return
+    index = get_game_index()
+    for path in sys.argv[1:]:
+        try:
+            count = index.add_results(read_results(path), seen_at=os.path.getmtime(path))
+            print(f"{path}: 导入 {count} 个游戏")
+        except Exception as e:
+            print(f"{path}: 导入失败: {e}")
+    print(f"索引中共有 {index.stats()['total']} 个游戏")
+
+if __name__ == "__main__":
+    main()
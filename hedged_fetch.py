@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+自适应超时和对冲请求
+
+按主机记录最近的请求耗时，超时时间由耗时的高分位数决定，而不是固定的15秒；
+请求超过该主机p95耗时还没有返回时再发送一个相同的请求(对冲请求)，
+使用先返回的结果并取消另一个。所有请求都不会超过调用方传入的截止时间。
+
+itch.io上每个作者都有自己的子域名，单个子域名的样本很少，
+样本不足时使用同一上级域名(如*.itch.io)的统计。
+"""
+
+import time
+import queue
+import threading
+import urllib.error
+import urllib.parse
+from collections import deque
+
+from transfer_encoding import ResponseTooLarge, read_response
+
+# 样本不足时使用的默认值
+DEFAULT_TIMEOUT = 15
+DEFAULT_HEDGE_DELAY = 2.0
+
+class DeadlineExceeded(Exception):
+    """截止时间之前没有得到结果"""
+
+class FetchCancelled(Exception):
+    """请求已被取消(另一个请求先返回了结果)"""
+
+def host_group(host):
+    """主机所属的上级域名组，如 foo.itch.io -> *.itch.io"""
+    labels = host.split('.')
+    if len(labels) <= 2:
+        return host
+    return '*.' + '.'.join(labels[-2:])
+
+def remaining_seconds(deadline):
+    """距离截止时间的秒数，没有截止时间时返回None"""
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+class HostLatencyTracker:
+    """按主机记录最近的请求耗时，计算超时时间和对冲延迟"""
+
+    def __init__(self, window=200, min_samples=8, min_timeout=2.0, max_timeout=DEFAULT_TIMEOUT,
+                 timeout_factor=2.0):
+        """
+        Args:
+            window: 每个主机保留的最近样本数
+            min_samples: 使用统计值所需的最少样本数
+            min_timeout: 超时时间下限(秒)
+            max_timeout: 超时时间上限(秒)，也是样本不足时的超时时间
+            timeout_factor: 超时时间 = p99耗时 * timeout_factor
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.timeout_factor = timeout_factor
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, host, seconds):
+        """记录一次请求耗时，同时计入主机和上级域名组"""
+        with self._lock:
+            for key in {host, host_group(host)}:
+                samples = self._samples.get(key)
+                if samples is None:
+                    samples = self._samples[key] = deque(maxlen=self.window)
+                samples.append(seconds)
+
+    def percentile(self, host, p):
+        """主机耗时的p分位数(0-100)，主机和上级域名组的样本都不足时返回None"""
+        with self._lock:
+            for key in (host, host_group(host)):
+                samples = self._samples.get(key)
+                if samples and len(samples) >= self.min_samples:
+                    ordered = sorted(samples)
+                    break
+            else:
+                return None
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout_for(self, host):
+        """主机的请求超时时间"""
+        p99 = self.percentile(host, 99)
+        if p99 is None:
+            return self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_factor))
+
+    def hedge_delay(self, host):
+        """请求超过这个时间还没有返回时发送对冲请求"""
+        p95 = self.percentile(host, 95)
+        if p95 is None:
+            return min(DEFAULT_HEDGE_DELAY, self.timeout_for(host) / 2)
+        return p95
+
+    def snapshot(self):
+        """各主机的样本数和p50/p95/p99耗时"""
+        with self._lock:
+            keys = list(self._samples)
+        summary = {}
+        for key in keys:
+            summary[key] = {
+                'samples': len(self._samples[key]),
+                'p50': self.percentile(key, 50),
+                'p95': self.percentile(key, 95),
+                'p99': self.percentile(key, 99)
+            }
+        return summary
+
+class FetchAttempt:
+    """一次请求，可以从其他线程取消"""
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.wire_bytes = 0
+        self.cancelled = threading.Event()
+        self._response = None
+        self._lock = threading.Lock()
+
+    def attach(self, response):
+        """登记正在读取的响应，取消时关闭它"""
+        with self._lock:
+            if self.cancelled.is_set():
+                response.close()
+                raise FetchCancelled()
+            self._response = response
+
+    def read(self, response, chunk_size=65536):
+        """分块读取并解压响应体，每块之间检查是否已被取消；传输的字节数保存在wire_bytes中"""
+        self.attach(response)
+        body, self.wire_bytes = read_response(response, chunk_size, self._check_cancelled)
+        return body
+
+    def _check_cancelled(self):
+        if self.cancelled.is_set():
+            raise FetchCancelled()
+
+    def cancel(self):
+        """取消请求，关闭已经打开的响应"""
+        with self._lock:
+            self.cancelled.set()
+            response = self._response
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+def is_retryable(error):
+    """HTTP 4xx错误(429除外)和超过大小上限的响应重试也不会成功"""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code == 429
+    return not isinstance(error, (FetchCancelled, ResponseTooLarge))
+
+def hedged_fetch(fetch_once, url, tracker=None, deadline=None, retries=2, max_hedges=1, stats=None):
+    """
+    发送请求，超过p95耗时还没返回时发送对冲请求，使用先成功的结果
+
+    Args:
+        fetch_once: fetch_once(attempt) 发送一次请求并返回结果，超时时间为attempt.timeout，
+                    应使用attempt.read()读取响应以便被取消
+        url: 请求的URL，用于按主机统计耗时
+        tracker: HostLatencyTracker，默认为进程内共享的统计
+        deadline: 截止时间(time.time()的时间戳)，为None时不限制
+        retries: 请求失败后最多重新发送的次数(立即发送，不等待)
+        max_hedges: 最多发送的对冲请求数
+        stats: 可选的统计字典，累加requests、hedged、hedge_wins、retries
+
+    Returns:
+        fetch_once的返回值
+
+    Raises:
+        DeadlineExceeded: 截止时间之前没有成功的请求
+        Exception: 所有请求都失败时抛出最后一个错误
+    """
+    tracker = tracker or get_latency_tracker()
+    host = urllib.parse.urlsplit(url).netloc
+    stats = stats if stats is not None else {}
+    for key in ('requests', 'hedged', 'hedge_wins', 'retries'):
+        stats.setdefault(key, 0)
+
+    finished = queue.Queue()
+    attempts = []
+
+    def launch():
+        timeout = tracker.timeout_for(host)
+        left = remaining_seconds(deadline)
+        if left is not None:
+            timeout = min(timeout, left)
+        attempt = FetchAttempt(timeout)
+        attempts.append(attempt)
+        stats['requests'] += 1
+
+        def run():
+            started = time.time()
+            try:
+                value = fetch_once(attempt)
+            except Exception as e:
+                # 超时也计入耗时统计，使慢主机的超时时间随之变长
+                if not attempt.cancelled.is_set() and 'timed out' in str(e):
+                    tracker.record(host, time.time() - started)
+                finished.put((attempt, None, e))
+                return
+            tracker.record(host, time.time() - started)
+            finished.put((attempt, value, None))
+
+        threading.Thread(target=run, daemon=True).start()
+        return attempt
+
+    launch()
+    hedge_attempts = []
+    in_flight = 1
+    hedges = 0
+    failures = 0
+    last_error = None
+
+    while in_flight:
+        wait = tracker.hedge_delay(host) if hedges < max_hedges else None
+        left = remaining_seconds(deadline)
+        if left is not None:
+            if left <= 0:
+                break
+            wait = left if wait is None else min(wait, left)
+
+        try:
+            attempt, value, error = finished.get(timeout=wait)
+        except queue.Empty:
+            if hedges < max_hedges and (left is None or left > wait):
+                hedges += 1
+                stats['hedged'] += 1
+                hedge_attempts.append(launch())
+                in_flight += 1
+            continue
+
+        in_flight -= 1
+        if error is None:
+            if attempt in hedge_attempts:
+                stats['hedge_wins'] += 1
+            # 取消还在进行的请求
+            for other in attempts:
+                if other is not attempt:
+                    other.cancel()
+            return value
+
+        last_error = error
+        left = remaining_seconds(deadline)
+        if is_retryable(error) and failures < retries and (left is None or left > 0):
+            failures += 1
+            stats['retries'] += 1
+            launch()
+            in_flight += 1
+
+    for attempt in attempts:
+        attempt.cancel()
+    if in_flight:
+        raise DeadlineExceeded(f"超过截止时间: {url}")
+    raise last_error
+
+# 进程内共享的耗时统计
+_default_tracker = HostLatencyTracker()
+
+def get_latency_tracker():
+    """获取进程内共享的主机耗时统计"""
+    return _default_tracker
@@ -14,11 +14,36 @@ import re
 import logging
 import html
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from extraction_cache import page_content_hash, get_default_cache, disable_default_cache
+from result_writers import RESULT_FORMATS, available_formats, output_path_for_format, read_results, write_results
+from transfer_encoding import ACCEPT_ENCODING, TransferStats, read_response
+from dns_cache import build_opener, get_connection_warmer, get_dns_cache
+from work_leases import run_worker
+from profiling import PROFILE_MODES, Profiler
+from page_metadata import INFO_FIELDS, info_fields, normalize_include_info
+from page_archive import DEFAULT_ARCHIVE_DIR, PageArchive
+from revisit_scheduler import DEFAULT_DAILY_BUDGET, get_revisit_scheduler
+from parse_pool import completed_future, get_parse_pool, parse_scraper_page, run_parser
+
+# 提取器版本，修改extract_iframe_src的提取逻辑后需要提升版本号，使旧的缓存结果失效
+EXTRACTOR_VERSION = "iframe_scraper/1"
+
+# 全局日志记录器
+# 导入模块时只获取记录器，不创建日志目录和文件；处理器在第一次爬取时才由setup_logger()添加
+logger = logging.getLogger('iframe_scraper')
+_logger_configured = False
+
 # 设置日志
 def setup_logger():
-    """设置日志记录器"""
+    """设置日志记录器，重复调用时直接返回已配置好的记录器"""
+    global _logger_configured
+    if _logger_configured:
+        return logger
+    
     # 创建logs目录
     if not os.path.exists('logs'):
         os.makedirs('logs')
@@ -28,7 +53,6 @@ def setup_logger():
     log_file = f"logs/scraper_log_{timestamp}.txt"
     
     # 配置日志记录器
-    logger = logging.getLogger('iframe_scraper')
     logger.setLevel(logging.DEBUG)
     
     # 创建文件处理器
@@ -47,23 +71,167 @@ def setup_logger():
     # 添加处理器到记录器
     logger.addHandler(file_handler)
     logger.addHandler(console_handler)
+    _logger_configured = True
     
     return logger
 
-# 全局日志记录器
-logger = setup_logger()
+# itch.io列表页每页显示的游戏数量
+LISTING_PAGE_SIZE = 36
+
+# 按主机统计的传输字节数(压缩后和解压后)
+transfer_stats = TransferStats()
+
+# 请求使用DNS缓存和预热的连接
+url_opener = build_opener()
+
+# 原始页面归档，使用--archive时创建
+page_archive = None
+
+def read_page(req, archive=False):
+    """
+    发送请求并返回解压后的页面内容
+    
+    请求时声明支持压缩传输，响应边接收边解压；archive为True且启用了归档时把响应写入原始页面归档
+    """
+    req.add_header('Accept-Encoding', ACCEPT_ENCODING)
+    with url_opener.open(req) as response:
+        body, wire_bytes = read_response(response)
+        if archive and page_archive is not None:
+            page_archive.append(req.full_url, body, response.status, response.headers.items())
+    transfer_stats.record(req.full_url, wire_bytes, len(body))
+    return body.decode('utf-8')
+
+# 列表页中每个游戏单元格的开始标签，带有游戏ID
+GAME_CELL_PATTERN = re.compile(r'<div\b[^>]*\bdata-game_id="(\d+)"[^>]*>')
+# 游戏单元格中的标题链接
+GAME_TITLE_LINK_PATTERN = re.compile(r'<a\b([^>]*\bclass="[^"]*\b(?:title|game_link)\b[^"]*"[^>]*)>(.*?)</a>', re.DOTALL)
+HREF_PATTERN = re.compile(r'\bhref="([^"]+)"')
+
+def build_listing_feed_url(url, offset=0, page_size=LISTING_PAGE_SIZE):
+    """
+    构造列表页的JSON内容片段地址（itch.io无限滚动加载使用的format=json接口）
+    
+    参数:
+        url: itch.io游戏列表页面的URL
+        offset: 分页偏移量
+        page_size: 每页游戏数量
+    
+    返回:
+        JSON接口URL
+    """
+    page = offset // page_size + 1
+    separator = '&' if '?' in url else '?'
+    return f"{url}{separator}page={page}&format=json"
+
+def parse_game_cells(content):
+    """
+    从列表页HTML（或JSON接口返回的内容片段）中解析游戏单元格
+    
+    只识别带有data-game_id属性的游戏单元格，每个单元格内只查找标题链接，
+    不会把页面中其他指向*.itch.io的链接当作游戏。
+    
+    参数:
+        content: 列表页HTML或内容片段
+    
+    返回:
+        包含游戏ID、URL和标题的字典列表
+    """
+    games = []
+    seen_ids = set()
+    cells = list(GAME_CELL_PATTERN.finditer(content))
+    for i, cell in enumerate(cells):
+        game_id = cell.group(1)
+        if game_id in seen_ids:
+            continue
+        
+        # 单元格内容到下一个单元格开始为止；封面图链接没有文字，取第一个带文字的链接
+        cell_end = cells[i + 1].start() if i + 1 < len(cells) else len(content)
+        for title_link in GAME_TITLE_LINK_PATTERN.finditer(content, cell.end(), cell_end):
+            href = HREF_PATTERN.search(title_link.group(1))
+            game_title = html.unescape(re.sub(r'<[^>]*>', '', title_link.group(2))).strip()
+            if href and game_title:
+                seen_ids.add(game_id)
+                games.append({
+                    'title': game_title,
+                    'url': html.unescape(href.group(1)),
+                    'game_id': game_id
+                })
+                break
+    return games
+
+def parse_listing_feed(feed_text):
+    """
+    解析列表页JSON接口的响应
+    
+    参数:
+        feed_text: JSON接口返回的文本
+    
+    返回:
+        游戏字典列表和是否有更多游戏的布尔值；响应不是有效的JSON内容片段时返回None
+    """
+    try:
+        data = json.loads(feed_text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('content'), str):
+        return None
+    
+    games = parse_game_cells(data['content'])
+    # 接口没有返回游戏说明已经到达最后一页
+    return games, bool(games)
 
-def get_game_page_urls(url, offset=0):
+def get_game_page_urls(url, offset=0, use_feed=True, page_size=None):
     """
     获取游戏页面的URL列表和标题
     
+    优先请求列表页的JSON内容片段，失败或没有解析到游戏时回退到完整HTML页面。
+    JSON接口每页固定LISTING_PAGE_SIZE个游戏，page_size与之不同时按需请求后面的页并截取。
+    
     参数:
         url: itch.io游戏列表页面的URL
         offset: 分页偏移量
+        use_feed: 是否优先使用JSON接口
+        page_size: 最多返回的游戏数量，默认返回偏移量所在的一页
     
     返回:
-        包含游戏URL和标题的字典列表, 以及是否有更多游戏的布尔值
+        包含游戏URL、标题和游戏ID的字典列表, 以及是否有更多游戏的布尔值
     """
+    setup_logger()
+    
+    # 设置请求头
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+    }
+    
+    if use_feed:
+        games, has_more = [], True
+        while has_more and (not games or (page_size is not None and len(games) < page_size)):
+            position = offset + len(games)
+            feed_url = build_listing_feed_url(url, position)
+            logger.info(f"正在获取游戏列表JSON: {feed_url} (偏移量: {position})")
+            
+            req = urllib.request.Request(feed_url, headers=dict(headers, Accept='application/json'))
+            try:
+                parsed = parse_listing_feed(read_page(req))
+            except Exception as e:
+                # 已经取到一部分游戏时，剩下的下次从新的偏移量继续获取
+                logger.warning(f"获取JSON接口时出错: {e}" + ("" if games else "，回退到HTML页面"))
+                break
+            if not parsed or not parsed[0]:
+                if not games:
+                    logger.warning("JSON接口没有返回游戏，回退到HTML页面")
+                has_more = False
+                break
+            page_games, has_more = parsed
+            # 偏移量不在页首时跳过本页前面的游戏
+            games.extend(page_games[position % LISTING_PAGE_SIZE:])
+        
+        if games:
+            if page_size is not None and len(games) > page_size:
+                games, has_more = games[:page_size], True
+            logger.info(f"找到 {len(games)} 个游戏")
+            return games, has_more
+    
     # 添加offset参数到URL
     if '?' in url:
         page_url = f"{url}&offset={offset}"
@@ -72,43 +240,42 @@ def get_game_page_urls(url, offset=0):
     
     logger.info(f"正在获取游戏列表: {page_url} (偏移量: {offset})")
     
-    # 设置请求头
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
-    
     # 创建请求
     req = urllib.request.Request(page_url, headers=headers)
     
     try:
         # 发送请求获取网页内容
-        with urllib.request.urlopen(req) as response:
-            html_content = response.read().decode('utf-8')
-            
-        # 找到所有游戏单元格
-        game_cells = re.findall(r'<div class="game_cell[^>]*>(.*?)</div>\s*</div>\s*</div>', html_content, re.DOTALL)
+        html_content = read_page(req)
         
-        games = []
-        for cell in game_cells:
-            # 从game_cell_data中提取游戏标题和链接
-            cell_data = re.search(r'<div class="game_cell_data">(.*?)</div>', cell, re.DOTALL)
-            if cell_data:
-                cell_data_content = cell_data.group(1)
-                
-                # 提取游戏标题和链接
-                title_match = re.search(r'<div class="game_title">\s*<a[^>]*href="([^"]*)"[^>]*>(.*?)</a>', cell_data_content, re.DOTALL)
-                
-                if title_match:
-                    game_url = title_match.group(1)
-                    game_title = re.sub(r'<[^>]*>', '', title_match.group(2)).strip()
+        # 找到所有带游戏ID的游戏单元格
+        games = parse_game_cells(html_content)
+        
+        if not games:
+            # 找到所有游戏单元格
+            game_cells = re.findall(r'<div class="game_cell[^>]*>(.*?)</div>\s*</div>\s*</div>', html_content, re.DOTALL)
+            
+            for cell in game_cells:
+                # 从game_cell_data中提取游戏标题和链接
+                cell_data = re.search(r'<div class="game_cell_data">(.*?)</div>', cell, re.DOTALL)
+                if cell_data:
+                    cell_data_content = cell_data.group(1)
+                    
+                    # 提取游戏标题和链接
+                    title_match = re.search(r'<div class="game_title">\s*<a[^>]*href="([^"]*)"[^>]*>(.*?)</a>', cell_data_content, re.DOTALL)
                     
-                    games.append({
-                        'title': game_title,
-                        'url': game_url
-                    })
+                    if title_match:
+                        game_url = title_match.group(1)
+                        game_title = re.sub(r'<[^>]*>', '', title_match.group(2)).strip()
+                        
+                        games.append({
+                            'title': game_title,
+                            'url': game_url
+                        })
         
         # 检查是否有"下一页"按钮，判断是否还有更多游戏
         has_more = "Next page" in html_content or "下一页" in html_content
+        if page_size is not None and len(games) > page_size:
+            games, has_more = games[:page_size], True
         
         logger.info(f"找到 {len(games)} 个游戏")
         return games, has_more
@@ -117,16 +284,259 @@ def get_game_page_urls(url, offset=0):
         logger.error(f"获取页面时出错: {e}")
         return [], False
 
-def get_iframe_src(game_url):
+# 类别列表页，只包含免费的网页游戏
+CATEGORY_LISTING_URL = 'https://itch.io/games/genre-{}/free/platform-web'
+CATEGORY_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]*$')
+
+def normalize_categories(categories):
     """
-    从游戏页面获取iframe的src属性
+    整理类别参数：去掉无效的值和重复的值并排序，使相同的类别组合得到相同的结果顺序
+    
+    参数:
+        categories: 类别名称列表或逗号分隔的字符串
+    
+    返回:
+        排序后的类别名称列表
+    """
+    if isinstance(categories, str):
+        categories = categories.split(',')
+    return sorted({
+        category.strip().lower() for category in categories or []
+        if isinstance(category, str) and CATEGORY_PATTERN.match(category.strip().lower())
+    })
+
+def category_listing_url(category):
+    """类别对应的itch.io列表页URL"""
+    return CATEGORY_LISTING_URL.format(category)
+
+class CategoryDiscovery:
+    """
+    多类别游戏发现
+    
+    每个类别独立分页，需要新一页的类别并发请求，总耗时取决于最慢的类别而不是所有类别之和。
+    结果按类别轮流交错合并，按URL去重，同样的类别和偏移量总是得到同样的顺序。
+    合并结果中的位置无法换算成每个类别的偏移量，所以起始偏移量不为0时从头重放合并过程
+    (只请求列表页)并跳过之前的游戏，任务切片、工作单元和暂停后恢复都从同一个位置继续。
+    """
+    
+    def __init__(self, fetch_page, categories, start_offset=0):
+        """
+        参数:
+            fetch_page: fetch_page(类别, 偏移量) 返回该类别从偏移量开始的一页游戏字典(含url)，
+                        没有更多游戏时返回空列表
+            categories: 类别名称列表
+            start_offset: 合并结果的起始偏移量
+        """
+        self.fetch_page = fetch_page
+        self.categories = normalize_categories(categories)
+        self.skip = start_offset  # 第一次取游戏前需要跳过的合并结果数量
+        self.cursors = {category: 0 for category in self.categories}
+        self.buffers = {category: deque() for category in self.categories}
+        self.exhausted = set()
+        self.seen = set()
+        self.turn = 0
+        self.page_requests = 0
+    
+    def has_more(self):
+        """是否还有没有返回的游戏"""
+        return any(self.buffers[category] or category not in self.exhausted for category in self.categories)
+    
+    def next_batch(self, count):
+        """
+        返回合并结果中接下来的最多count个游戏，每个游戏字典增加category字段
+        """
+        batch = []
+        if not self.categories:
+            return batch
+        with ThreadPoolExecutor(max_workers=len(self.categories)) as executor:
+            if self.skip:
+                skipped = []
+                while len(skipped) < self.skip and self.has_more():
+                    self._refill(executor)
+                    self._interleave(skipped, self.skip)
+                logger.info(f"重放多类别合并结果，跳过起始偏移量之前的 {len(skipped)} 个游戏")
+                self.skip = 0
+            while len(batch) < count and self.has_more():
+                self._refill(executor)
+                self._interleave(batch, count)
+        return batch
+    
+    def _fetch(self, category):
+        try:
+            return self.fetch_page(category, self.cursors[category]) or []
+        except Exception as e:
+            logger.warning(f"获取{category}类别列表时出错: {e}")
+            return []
+    
+    def _refill(self, executor):
+        """缓冲区已空的类别并发获取下一页"""
+        pending = [
+            category for category in self.categories
+            if not self.buffers[category] and category not in self.exhausted
+        ]
+        if not pending:
+            return
+        self.page_requests += len(pending)
+        for category, page in zip(pending, executor.map(self._fetch, pending)):
+            # 没有新游戏时视为到达最后一页(HTML回退页面可能忽略偏移量，一直返回同一页)
+            if not any(game['url'] not in self.seen for game in page):
+                self.exhausted.add(category)
+                continue
+            self.cursors[category] += len(page)
+            self.buffers[category].extend(page)
+    
+    def _interleave(self, batch, count):
+        """按类别轮流取游戏，直到数量足够或某个还没结束的类别需要获取下一页"""
+        while len(batch) < count and self.has_more():
+            category = self.categories[self.turn % len(self.categories)]
+            buffer = self.buffers[category]
+            if not buffer:
+                if category not in self.exhausted:
+                    return
+                self.turn += 1
+                continue
+            game = buffer.popleft()
+            if game['url'] in self.seen:
+                continue
+            self.seen.add(game['url'])
+            self.turn += 1
+            batch.append(dict(game, category=category))
+
+def discover_category_games(fetch_page, categories, start_offset=0, max_games=None):
+    """
+    并发获取多个类别的游戏列表并交错合并
+    
+    参数:
+        fetch_page: fetch_page(类别, 偏移量) 返回一页游戏字典
+        categories: 类别名称列表
+        start_offset: 合并结果的起始偏移量
+        max_games: 最多返回的游戏数量，为None时获取全部
+    
+    返回:
+        游戏字典列表
+    """
+    discovery = CategoryDiscovery(fetch_page, categories, start_offset)
+    return discovery.next_batch(float('inf') if max_games is None else max_games)
+
+def extract_iframe_src(html_content):
+    """
+    从游戏页面HTML中提取iframe的src属性
+    
+    参数:
+        html_content: 游戏页面HTML
+    
+    返回:
+        (iframe_src, 提取方法)元组，没有找到时iframe_src为None
+    """
+    # 寻找iframe源的综合方法
+    iframe_src = None
+    extraction_method = ""
+    
+    # 情况1: 查找html_embed元素中的iframe标签的src属性
+    html_embed_match = re.search(r'<div[^>]*id="html_embed_\d+"[^>]*>(.*?)</div>', html_content, re.DOTALL)
+    if html_embed_match:
+        html_embed_content = html_embed_match.group(1)
+        
+        # 情况1.1: 直接从iframe标签中提取src属性
+        iframe_tag = re.search(r'<iframe[^>]*src="([^"]*)"[^>]*>', html_embed_content)
+        if iframe_tag:
+            iframe_src = iframe_tag.group(1)
+            extraction_method = "html_embed_iframe"
+            logger.info(f"从html_embed的iframe标签中找到iframe源: {iframe_src}")
+        
+        # 情况1.2: 从data-iframe属性中提取src
+        if not iframe_src:
+            data_iframe = re.search(r'data-iframe="([^"]*)"', html_embed_content)
+            if data_iframe:
+                # 获取data-iframe属性值并解码HTML实体
+                iframe_data_str = data_iframe.group(1)
+                iframe_data_str = html.unescape(iframe_data_str)
+                
+                # 从iframe标签中提取src属性
+                iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
+                if iframe_src_match:
+                    iframe_src = iframe_src_match.group(1)
+                    extraction_method = "html_embed_data_iframe"
+                    logger.info(f"从html_embed的data-iframe属性中找到iframe源: {iframe_src}")
+    
+    # 情况2: 如果在html_embed中找不到，则查找iframe_placeholder中的data-iframe属性
+    if not iframe_src:
+        iframe_placeholder = re.search(r'<div[^>]*class="iframe_placeholder"[^>]*data-iframe="([^"]*)"', html_content, re.DOTALL)
+        if iframe_placeholder:
+            # 获取data-iframe属性值并解码HTML实体
+            iframe_data_str = iframe_placeholder.group(1)
+            iframe_data_str = html.unescape(iframe_data_str)
+            
+            # 从iframe标签中提取src属性
+            iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
+            if iframe_src_match:
+                iframe_src = iframe_src_match.group(1)
+                extraction_method = "iframe_placeholder"
+                logger.info(f"从iframe_placeholder的data-iframe属性中找到iframe源: {iframe_src}")
+    
+    # 情况3: 查找load_iframe_btn的父元素中的data-iframe属性
+    if not iframe_src:
+        load_iframe_btn = re.search(r'<div[^>]*data-iframe="([^"]*)"[^>]*>\s*<button[^>]*class="[^"]*load_iframe_btn[^"]*"', html_content, re.DOTALL)
+        if load_iframe_btn:
+            # 获取data-iframe属性值并解码HTML实体
+            iframe_data_str = load_iframe_btn.group(1)
+            iframe_data_str = html.unescape(iframe_data_str)
+            
+            # 从iframe标签中提取src属性
+            iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
+            if iframe_src_match:
+                iframe_src = iframe_src_match.group(1)
+                extraction_method = "load_iframe_btn"
+                logger.info(f"从load_iframe_btn父元素的data-iframe属性中找到iframe源: {iframe_src}")
+    
+    # 情况4: 查找game_frame元素内的data-iframe属性
+    if not iframe_src:
+        game_frame = re.search(r'<div[^>]*class="game_frame[^"]*"[^>]*>\s*<div[^>]*data-iframe="([^"]*)"', html_content, re.DOTALL)
+        if game_frame:
+            # 获取data-iframe属性值并解码HTML实体
+            iframe_data_str = game_frame.group(1)
+            iframe_data_str = html.unescape(iframe_data_str)
+            
+            # 从iframe标签中提取src属性
+            iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
+            if iframe_src_match:
+                iframe_src = iframe_src_match.group(1)
+                extraction_method = "game_frame"
+                logger.info(f"从game_frame内元素的data-iframe属性中找到iframe源: {iframe_src}")
+    
+    return iframe_src, extraction_method
+
+def extract_game_page(game_url, include_info=()):
+    """
+    获取游戏页面并提取iframe的src属性和include_info指定的附加信息
+    
+    页面内容与之前提取过的页面相同且缓存中包含所需的附加信息时直接使用提取结果缓存
+    
+    参数:
+        game_url: 游戏页面的URL
+        include_info: 需要提取的附加信息(见page_metadata.INFO_FIELDS)，附加信息与iframe源在同一个页面中提取
+    
+    返回:
+        提取结果字典，包含iframe_src、extracted_method和找到的附加信息；没有找到时iframe_src为None，
+        获取页面失败时还包含error
+    """
+    return finish_game_page(start_game_page(game_url, include_info), game_url, include_info)
+
+def start_game_page(game_url, include_info=(), pool=None):
+    """
+    获取游戏页面并开始提取，提取交给解析进程池(pool为None时在当前线程中提取)
+    
+    爬取循环获取下一个页面的同时，这个页面在其他CPU核上解析；结果由finish_game_page取得
     
     参数:
         game_url: 游戏页面的URL
+        include_info: 需要提取的附加信息
+        pool: parse_pool.ParsePool
     
     返回:
-        iframe的src属性值，如果没有找到则返回None
+        (Future, 页面内容, 页面哈希)，命中缓存或获取页面失败时页面内容和哈希为None
     """
+    setup_logger()
     logger.info(f"正在分析游戏页面: {game_url}")
     
     # 设置请求头
@@ -136,11 +546,11 @@ def get_iframe_src(game_url):
     
     # 创建请求
     req = urllib.request.Request(game_url, headers=headers)
+    include_info = sorted(include_info or ())
     
     try:
         # 发送请求获取网页内容
-        with urllib.request.urlopen(req) as response:
-            html_content = response.read().decode('utf-8')
+        html_content = read_page(req, archive=True)
         
         # 保存HTML到文件进行调试
         debug_dir = 'debug_html'
@@ -150,99 +560,94 @@ def get_iframe_src(game_url):
         with open(f"{debug_dir}/{game_id}.html", 'w', encoding='utf-8') as f:
             f.write(html_content)
         
-        # 寻找iframe源的综合方法
-        iframe_src = None
-        
-        # 情况1: 查找html_embed元素中的iframe标签的src属性
-        html_embed_match = re.search(r'<div[^>]*id="html_embed_\d+"[^>]*>(.*?)</div>', html_content, re.DOTALL)
-        if html_embed_match:
-            html_embed_content = html_embed_match.group(1)
-            
-            # 情况1.1: 直接从iframe标签中提取src属性
-            iframe_tag = re.search(r'<iframe[^>]*src="([^"]*)"[^>]*>', html_embed_content)
-            if iframe_tag:
-                iframe_src = iframe_tag.group(1)
-                logger.info(f"从html_embed的iframe标签中找到iframe源: {iframe_src}")
-            
-            # 情况1.2: 从data-iframe属性中提取src
-            if not iframe_src:
-                data_iframe = re.search(r'data-iframe="([^"]*)"', html_embed_content)
-                if data_iframe:
-                    # 获取data-iframe属性值并解码HTML实体
-                    iframe_data_str = data_iframe.group(1)
-                    iframe_data_str = html.unescape(iframe_data_str)
-                    
-                    # 从iframe标签中提取src属性
-                    iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
-                    if iframe_src_match:
-                        iframe_src = iframe_src_match.group(1)
-                        logger.info(f"从html_embed的data-iframe属性中找到iframe源: {iframe_src}")
-        
-        # 情况2: 如果在html_embed中找不到，则查找iframe_placeholder中的data-iframe属性
-        if not iframe_src:
-            iframe_placeholder = re.search(r'<div[^>]*class="iframe_placeholder"[^>]*data-iframe="([^"]*)"', html_content, re.DOTALL)
-            if iframe_placeholder:
-                # 获取data-iframe属性值并解码HTML实体
-                iframe_data_str = iframe_placeholder.group(1)
-                iframe_data_str = html.unescape(iframe_data_str)
-                
-                # 从iframe标签中提取src属性
-                iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
-                if iframe_src_match:
-                    iframe_src = iframe_src_match.group(1)
-                    logger.info(f"从iframe_placeholder的data-iframe属性中找到iframe源: {iframe_src}")
-        
-        # 情况3: 查找load_iframe_btn的父元素中的data-iframe属性
-        if not iframe_src:
-            load_iframe_btn = re.search(r'<div[^>]*data-iframe="([^"]*)"[^>]*>\s*<button[^>]*class="[^"]*load_iframe_btn[^"]*"', html_content, re.DOTALL)
-            if load_iframe_btn:
-                # 获取data-iframe属性值并解码HTML实体
-                iframe_data_str = load_iframe_btn.group(1)
-                iframe_data_str = html.unescape(iframe_data_str)
-                
-                # 从iframe标签中提取src属性
-                iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
-                if iframe_src_match:
-                    iframe_src = iframe_src_match.group(1)
-                    logger.info(f"从load_iframe_btn父元素的data-iframe属性中找到iframe源: {iframe_src}")
-        
-        # 情况4: 查找game_frame元素内的data-iframe属性
-        if not iframe_src:
-            game_frame = re.search(r'<div[^>]*class="game_frame[^"]*"[^>]*>\s*<div[^>]*data-iframe="([^"]*)"', html_content, re.DOTALL)
-            if game_frame:
-                # 获取data-iframe属性值并解码HTML实体
-                iframe_data_str = game_frame.group(1)
-                iframe_data_str = html.unescape(iframe_data_str)
-                
-                # 从iframe标签中提取src属性
-                iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
-                if iframe_src_match:
-                    iframe_src = iframe_src_match.group(1)
-                    logger.info(f"从game_frame内元素的data-iframe属性中找到iframe源: {iframe_src}")
-        
-        if iframe_src:
-            return iframe_src
-        else:
-            logger.warning(f"未能找到iframe源")
-            return None
+        # 页面内容没有变化时复用缓存的提取结果
+        cache = get_default_cache(EXTRACTOR_VERSION)
+        page_hash = page_content_hash(html_content)
+        cached = cache.get(game_url, page_hash, EXTRACTOR_VERSION) if cache else None
+        if cached is not None and cached['iframe_src'] and not set(include_info) <= set(cached.get('include_info', ())):
+            # 缓存的结果缺少这次需要的附加信息
+            cached = None
+        if cached is not None:
+            logger.info(f"使用缓存的提取结果: {cached['iframe_src']}")
+            return completed_future(cached), None, None
+        return run_parser(pool, parse_scraper_page, html_content, include_info), html_content, page_hash
     
     except Exception as e:
         logger.error(f"获取游戏页面时出错: {e}")
-        return None
+        return completed_future({'iframe_src': None, 'extracted_method': "", 'error': str(e)}), None, None
+
+def finish_game_page(started, game_url, include_info=()):
+    """
+    等待start_game_page开始的提取完成并保存到提取结果缓存，解析进程出错时改为在当前线程中提取
+    
+    返回:
+        与extract_game_page相同的提取结果字典
+    """
+    future, html_content, page_hash = started
+    try:
+        extracted = future.result()
+    except Exception as e:
+        if html_content is None:
+            raise
+        logger.warning(f"解析进程出错，改为在当前线程中提取: {e}")
+        extracted = parse_scraper_page(html_content, sorted(include_info or ()))
+    
+    if page_hash is not None:
+        cache = get_default_cache(EXTRACTOR_VERSION)
+        if cache:
+            cache.put(game_url, page_hash, EXTRACTOR_VERSION, extracted)
+    
+    if not extracted['iframe_src'] and not extracted.get('error'):
+        logger.warning("未能找到iframe源")
+    return extracted
+
+def get_iframe_src(game_url, return_method=False):
+    """
+    从游戏页面获取iframe的src属性
+    
+    参数:
+        game_url: 游戏页面的URL
+        return_method: 是否同时返回提取方法名称
+    
+    返回:
+        iframe的src属性值，如果没有找到则返回None；
+        return_method为True时返回(iframe_src, 提取方法)元组
+    """
+    extracted = extract_game_page(game_url)
+    iframe_src = extracted['iframe_src']
+    if return_method:
+        return (iframe_src, extracted['extracted_method']) if iframe_src else (None, "")
+    return iframe_src
 
-def save_results(results, output_file):
-    """保存结果到JSON文件"""
+def read_url_list(path):
+    """
+    读取要爬取的游戏URL列表，每行为URL和可选的标题(以制表符分隔)，忽略空行和#开头的行
+    
+    返回:
+        游戏字典列表，每项包含url和title
+    """
+    games = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            game_url, _, title = line.partition('\t')
+            games.append({'url': game_url.strip(), 'title': title.strip() or game_url.strip()})
+    return games
+
+def save_results(results, output_file, format_name='json'):
+    """保存结果到文件，format_name为result_writers中的格式名称，默认为JSON"""
+    setup_logger()
+    
     # 确保目录存在
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     
-    # 如果没有找到任何游戏，创建一个空数组的JSON文件
+    # 如果没有找到任何游戏，创建一个空的结果文件
     if not results:
         results = []
     
-    # 确保结果是UTF-8格式，不使用ensure_ascii
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json_str = json.dumps(results, ensure_ascii=False, indent=2)
-        f.write(json_str)
+    write_results(results, output_file, format_name)
     
     logger.info(f"结果已保存到 {output_file}")
     logger.info(f"成功获取 {len(results)} 个游戏的iframe源")
@@ -253,12 +658,66 @@ def main():
     parser = argparse.ArgumentParser(description='爬取itch.io网站上的游戏iframe源地址')
     parser.add_argument('--max_games', type=int, default=None, help='最多爬取的游戏数量，默认为无限制')
     parser.add_argument('--start_offset', type=int, default=0, help='开始的偏移量，用于继续上次的爬取')
-    parser.add_argument('--page_size', type=int, default=36, help='每页游戏数量，默认为36')
+    parser.add_argument('--page_size', type=int, default=LISTING_PAGE_SIZE, help=f'每页游戏数量，默认为{LISTING_PAGE_SIZE}')
     parser.add_argument('--delay', type=float, default=2.0, help='请求间隔时间（秒），默认为2秒')
-    parser.add_argument('--output', type=str, default='results/game_iframes.json', help='输出文件路径')
+    parser.add_argument('--output', type=str, default=None, help='输出文件路径，默认为results/game_iframes加上格式对应的扩展名')
+    parser.add_argument('--format', type=str, default='json', choices=list(RESULT_FORMATS), help='输出格式，默认为json')
     parser.add_argument('--save_interval', type=int, default=50, help='每爬取多少个游戏保存一次结果，默认为50')
+    parser.add_argument('--no_cache', action='store_true', help='不使用提取结果缓存')
+    parser.add_argument('--check_embeds', action='store_true', help='爬取完成后检查每个iframe源是否可用，结果写入embed_check字段')
+    parser.add_argument('--stop_file', type=str, default=None, help='这个文件出现时保存已有结果并停止爬取，用于取消或暂停任务')
+    parser.add_argument('--categories', type=str, default=None, help='逗号分隔的游戏类别（如action,puzzle），多个类别并发获取并交错合并，默认为全部免费网页游戏')
+    parser.add_argument('--include_info', type=str, default=None,
+                        help=f"逗号分隔的附加信息（{','.join(INFO_FIELDS)}），与iframe源在同一次页面请求中提取，默认不提取")
+    parser.add_argument('--urls', type=str, default=None, help='只爬取这个文件中的游戏URL（每行一个，可以用制表符分隔加上标题），不再从列表页获取')
+    parser.add_argument('--refresh', nargs='?', type=int, const=DEFAULT_DAILY_BUDGET, default=None,
+                        help=f'按变化频率重新检查已爬取过的游戏，参数为每天的请求预算（默认为{DEFAULT_DAILY_BUDGET}），代替定期从偏移量0完整重新爬取')
+    parser.add_argument('--revisit', action='store_true', help='把每个游戏的检查结果记录到变化历史（使用--urls或--refresh时总是记录），供--refresh安排重新检查')
+    parser.add_argument('--archive', nargs='?', const=DEFAULT_ARCHIVE_DIR, default=None,
+                        help=f'把游戏页面的原始响应写入这个目录的归档（默认为{DEFAULT_ARCHIVE_DIR}），之后可以用page_archive.py reextract离线重新提取')
+    parser.add_argument('--parse_workers', type=int, default=None,
+                        help='解析游戏页面的进程数，获取下一个页面的同时在其他CPU核上解析，默认为PARSE_WORKERS或可用的CPU核数，小于2时在当前进程中解析')
+    parser.add_argument('--worker', type=str, default=None, help='作为工作节点运行，从这个协调节点（如http://127.0.0.1:5000）领取工作单元')
+    parser.add_argument('--worker_id', type=str, default=None, help='工作节点名称，默认为主机名:进程ID')
+    parser.add_argument('--worker_token', type=str, default=os.environ.get('WORKER_TOKEN'), help='协调节点的WORKER_TOKEN，默认读取环境变量WORKER_TOKEN')
+    parser.add_argument('--poll_interval', type=float, default=5, help='工作节点没有工作时再次领取的间隔（秒），默认为5')
+    parser.add_argument('--profile', nargs='?', const='sample', default=None, choices=PROFILE_MODES,
+                        help='性能分析：sample（默认，采样所有线程的调用栈）、cprofile或memory（tracemalloc内存快照）')
+    parser.add_argument('--profile_output', type=str, default=None, help='性能分析结果的路径前缀，默认为输出文件去掉扩展名')
     args = parser.parse_args()
     
+    if args.worker:
+        # 工作节点为每个工作单元启动一个爬虫子进程，其余参数由协调节点决定
+        run_worker(args.worker, args.worker_id, args.worker_token, args.poll_interval)
+        return
+    
+    if args.format not in available_formats():
+        parser.error(f"当前环境不支持{args.format}格式(parquet需要安装pyarrow)")
+    
+    if args.output is None:
+        # 重新检查只得到部分游戏的结果，不覆盖完整爬取的结果文件
+        default_output = 'results/refresh_iframes.json' if args.urls or args.refresh is not None else 'results/game_iframes.json'
+        args.output = output_path_for_format(default_output, args.format)
+    
+    if args.no_cache:
+        disable_default_cache()
+    
+    if not args.profile:
+        crawl(args)
+        return
+    
+    setup_logger()
+    profiler = Profiler(args.profile, args.profile_output or os.path.splitext(args.output)[0]).start()
+    try:
+        crawl(args)
+    finally:
+        for path in profiler.stop():
+            logger.info(f"性能分析结果已保存到 {path}")
+
+def crawl(args):
+    """按命令行参数爬取并保存结果"""
+    setup_logger()
+    
     # 开始记录
     logger.info("==== 开始爬取itch.io游戏iframe源 ====")
     logger.info(f"参数设置: 最大游戏数量={args.max_games}, 起始偏移量={args.start_offset}, 每页大小={args.page_size}, 延迟={args.delay}秒")
@@ -266,6 +725,47 @@ def main():
     # itch.io网页游戏列表页面，只爬取免费游戏
     url = 'https://itch.io/games/free/platform-web'
     
+    # 指定了类别时从各类别的列表页并发获取
+    categories = normalize_categories(args.categories)
+    discovery = None
+    if categories:
+        logger.info(f"游戏类别: {', '.join(categories)}")
+        discovery = CategoryDiscovery(
+            lambda category, page_offset: get_game_page_urls(category_listing_url(category), page_offset)[0],
+            categories,
+            args.start_offset
+        )
+    
+    # 重新检查：按变化率和每天的预算从变化历史中生成队列
+    url_games = None
+    revisit = None
+    if args.refresh is not None or args.urls or args.revisit:
+        revisit = get_revisit_scheduler()
+    if args.refresh is not None:
+        budget = revisit.remaining_budget(args.refresh)
+        url_games = [{'url': entry['url'], 'title': entry['title'] or entry['url'], 'game_id': entry['game_id']}
+                     for entry in revisit.plan(budget)]
+        logger.info(f"重新检查 {len(url_games)} 个游戏（每天预算 {args.refresh}，剩余 {budget}）")
+    elif args.urls:
+        url_games = read_url_list(args.urls)
+        logger.info(f"从 {args.urls} 读取了 {len(url_games)} 个游戏URL")
+    
+    # 原始页面归档
+    global page_archive
+    if args.archive:
+        page_archive = PageArchive(args.archive)
+        logger.info(f"原始页面归档目录: {args.archive}")
+    
+    # 解析进程池，进程数少于2时在当前进程中解析
+    parse_pool = get_parse_pool(args.parse_workers)
+    if parse_pool is not None:
+        logger.info(f"使用 {parse_pool.workers} 个解析进程")
+    
+    # 需要提取的附加信息
+    include_info = normalize_include_info(args.include_info, default=())
+    if include_info:
+        logger.info(f"附加信息: {', '.join(include_info)}")
+    
     # 创建保存结果的目录
     if not os.path.exists('results'):
         os.makedirs('results')
@@ -276,9 +776,8 @@ def main():
     # 如果输出文件已存在并且开始偏移量大于0，尝试加载现有结果
     if os.path.exists(args.output) and args.start_offset > 0:
         try:
-            with open(args.output, 'r', encoding='utf-8') as f:
-                results = json.load(f)
-                logger.info(f"从现有文件加载了 {len(results)} 个结果")
+            results = read_results(args.output, args.format)
+            logger.info(f"从现有文件加载了 {len(results)} 个结果")
         except Exception as e:
             logger.error(f"加载现有结果文件时出错: {e}")
             results = []
@@ -290,72 +789,146 @@ def main():
     # 当前偏移量
     offset = args.start_offset
     
+    # 是否收到停止请求
+    stop_requested = False
+    
+    # 重新检查时发现的变化数
+    revisit_changes = 0
+    
+    def finish_game(index, game, started):
+        """等待游戏页面的提取结果，记录检查结果并加入结果列表"""
+        nonlocal total_processed, successful_processed, revisit_changes
+        extracted = finish_game_page(started, game['url'], include_info)
+        iframe_src = extracted['iframe_src']
+        checked_at = time.time()
+        
+        # 记录检查结果，获取页面失败时不能判断是否变化
+        if revisit is not None and not extracted.get('error'):
+            changed = revisit.observe(game['url'], iframe_src, checked_at, title=game['title'], game_id=game.get('game_id'))
+            if changed:
+                logger.info("iframe源与上次检查时不同")
+                revisit_changes += 1
+        
+        if iframe_src:
+            logger.info(f"成功找到iframe源: {iframe_src}")
+            result = {
+                'title': game['title'],
+                'game_url': game['url'],
+                'iframe_src': iframe_src,
+                'position': offset + index,
+                # 检查时间，结果被之后的任务复用时不会再记为新的检查
+                'timestamp': datetime.fromtimestamp(checked_at).isoformat()
+            }
+            if game.get('game_id'):
+                result['game_id'] = game['game_id']
+            for field in info_fields(include_info):
+                if extracted.get(field) is not None:
+                    result[field] = extracted[field]
+            results.append(result)
+            successful_processed += 1
+        else:
+            logger.warning("未找到iframe源")
+        
+        total_processed += 1
+        
+        # 定期保存结果
+        if total_processed % args.save_interval == 0:
+            save_results(results, args.output, args.format)
+            logger.info(f"已处理 {total_processed} 个游戏，其中 {successful_processed} 个成功")
+    
     # 继续抓取直到达到最大游戏数或没有更多游戏
     while args.max_games is None or total_processed < args.max_games:
         # 获取当前页的游戏
-        games, has_more = get_game_page_urls(url, offset)
+        if url_games is not None:
+            # URL列表一次处理完，没有下一页
+            games, has_more = url_games, False
+        elif discovery is not None:
+            games = discovery.next_batch(args.page_size)
+            has_more = discovery.has_more()
+        else:
+            games, has_more = get_game_page_urls(url, offset, page_size=args.page_size)
         
         if not games:
             logger.info("没有找到更多游戏，结束爬取")
             break
+        # 列表返回的游戏数量可能少于page_size(最后一页或HTML回退页面)，按实际数量前进
+        listing_count = len(games)
         
         # 计算本次要处理的游戏数量
         if args.max_games is not None:
             games_to_process = min(len(games), args.max_games - total_processed)
             games = games[:games_to_process]
         
-        # 遍历游戏页面并获取iframe src
+        # 遍历游戏页面并获取iframe src；
+        # 一个游戏的页面在解析进程中提取时，主进程等待延迟并获取下一个游戏的页面
+        pending = None
         for i, game in enumerate(games):
-            logger.info(f"处理游戏 {total_processed+1}: {game['title']}")
-            
-            # 获取iframe src
-            iframe_src = get_iframe_src(game['url'])
+            if args.stop_file and os.path.exists(args.stop_file):
+                stop_requested = True
+                break
             
-            if iframe_src:
-                logger.info(f"成功找到iframe源: {iframe_src}")
-                results.append({
-                    'title': game['title'],
-                    'game_url': game['url'],
-                    'iframe_src': iframe_src
-                })
-                successful_processed += 1
-            else:
-                logger.warning(f"未找到iframe源")
+            logger.info(f"处理游戏 {total_processed + (pending is not None) + 1}: {game['title']}")
             
-            total_processed += 1
+            # 处理当前游戏和等待的同时预热下一个游戏的连接
+            get_connection_warmer().warm((next_game['url'] for next_game in games[i + 1:i + 2]),
+                                         context=url_opener.ssl_context)
             
-            # 定期保存结果
-            if total_processed % args.save_interval == 0:
-                save_results(results, args.output)
-                logger.info(f"已处理 {total_processed} 个游戏，其中 {successful_processed} 个成功")
+            # 获取页面并开始提取iframe src和附加信息，然后取得上一个游戏的提取结果
+            started = start_game_page(game['url'], include_info, parse_pool)
+            if pending is not None:
+                finish_game(*pending)
+            pending = (i, game, started)
             
             # 添加延迟，避免请求过于频繁
             if i < len(games) - 1:
                 logger.info(f"等待{args.delay}秒...")
                 time.sleep(args.delay)
-            
-            # 检查是否达到最大游戏数量
-            if args.max_games is not None and total_processed >= args.max_games:
-                logger.info(f"已达到最大游戏数量 {args.max_games}，停止爬取")
-                break
         
-        # 如果没有更多游戏或已达到最大游戏数量，退出循环
-        if not has_more or (args.max_games is not None and total_processed >= args.max_games):
+        if pending is not None:
+            finish_game(*pending)
+        if stop_requested:
+            logger.info(f"收到停止请求，已处理 {total_processed} 个游戏")
+        elif args.max_games is not None and total_processed >= args.max_games:
+            logger.info(f"已达到最大游戏数量 {args.max_games}，停止爬取")
+        
+        # 如果收到停止请求、没有更多游戏或已达到最大游戏数量，退出循环
+        if stop_requested or not has_more or (args.max_games is not None and total_processed >= args.max_games):
             break
         
         # 更新偏移量进入下一页
-        offset += args.page_size
+        offset += listing_count
         logger.info(f"进入下一页，偏移量: {offset}")
         
         # 页面之间添加额外延迟
         logger.info(f"翻页等待 {args.delay * 2} 秒...")
         time.sleep(args.delay * 2)
     
+    # 检查iframe源是否可用
+    if args.check_embeds and results:
+        from embed_checker import check_results
+        logger.info(f"检查 {len(results)} 个iframe源是否可用...")
+        summary = check_results(results)
+        logger.info(f"可用 {summary['alive']} 个，不可用 {summary['dead']} 个，无法连接 {summary['unreachable']} 个")
+    
     # 保存最终结果
-    save_results(results, args.output)
+    save_results(results, args.output, args.format)
+    
+    if page_archive is not None:
+        page_archive.close()
+        logger.info(f"{page_archive.records} 个页面已写入归档 {page_archive.directory}")
     
     logger.info("==== 爬取完成 ====")
     logger.info(f"总共处理 {total_processed} 个游戏，成功获取 {successful_processed} 个游戏的iframe源")
+    if revisit is not None:
+        stats = revisit.stats()
+        logger.info(f"发现 {revisit_changes} 个游戏的iframe源有变化，变化历史中预期新鲜比例 {stats['expected_fresh']:.1%}")
+    transfer = transfer_stats.snapshot()
+    for host, entry in sorted(transfer['hosts'].items()):
+        logger.info(f"传输统计 {host}: {entry['responses']} 个响应，{entry['compressed_bytes']} 字节，解压后 {entry['uncompressed_bytes']} 字节")
+    get_connection_warmer().close_idle()
+    connection_stats = dict(get_dns_cache().stats(), **get_connection_warmer().stats())
+    logger.info(f"DNS缓存命中 {connection_stats['dns_hits']} 次，解析 {connection_stats['dns_misses']} 次，"
+                f"预热连接 {connection_stats['connections_warmed']} 个，使用 {connection_stats['connections_reused']} 个")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
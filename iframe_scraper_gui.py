@@ -8,244 +8,19 @@ itch.io游戏iframe提取器GUI
 
 import os
 import sys
-import json
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
-import webbrowser
+from array import array
 from datetime import datetime
-import subprocess
 import time  # 导入time模块
 
-# 设置模块导入的错误处理
+# 导入iframe_scraper模块
+# 打包后的程序中iframe_scraper作为普通的冻结模块被包含，直接导入即可；
+# 日志记录器会在第一次爬取时才创建，启动时不会生成日志文件
 try:
-    # 尝试直接导入内置模块
-    import urllib.request
-    import urllib.error
-    import urllib.parse
-    import re
-    import html
-    import logging
-    import argparse
-    from datetime import datetime
-    
-    # 导入iframe_scraper.py中的函数
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    sys.path.append(script_dir)
-    
-    # 判断程序是否被打包
-    if getattr(sys, 'frozen', False):
-        # 如果是打包后的程序，直接从包含的文件中导入
-        # PyInstaller打包后的文件位置
-        if hasattr(sys, '_MEIPASS'):
-            # 使用PyInstaller的临时目录
-            base_dir = sys._MEIPASS
-        else:
-            # 使用可执行文件所在目录
-            base_dir = os.path.dirname(sys.executable)
-        
-        # 查找iframe_scraper.py
-        iframe_scraper_path = os.path.join(base_dir, 'iframe_scraper.py')
-        
-        # 如果找不到，尝试在当前目录查找
-        if not os.path.exists(iframe_scraper_path):
-            iframe_scraper_path = os.path.join(script_dir, 'iframe_scraper.py')
-        
-        # 如果还是找不到，则尝试从资源中提取
-        if not os.path.exists(iframe_scraper_path):
-            # 将资源文件解压到临时位置
-            import tempfile
-            temp_dir = tempfile.gettempdir()
-            iframe_scraper_path = os.path.join(temp_dir, 'iframe_scraper.py')
-            
-            # 从打包的资源中提取iframe_scraper.py
-            try:
-                with open(os.path.join(base_dir, 'iframe_scraper.py'), 'r') as f:
-                    content = f.read()
-                with open(iframe_scraper_path, 'w') as f:
-                    f.write(content)
-            except Exception as e:
-                print(f"无法提取iframe_scraper.py: {e}")
-        
-        # 手动导入模块
-        import importlib.util
-        spec = importlib.util.spec_from_file_location("iframe_scraper", iframe_scraper_path)
-        if spec:
-            scraper_module = importlib.util.module_from_spec(spec)
-            spec.loader.exec_module(scraper_module)
-        else:
-            # 如果仍然失败，实现基本的爬虫功能
-            class ScrapeModule:
-                def setup_logger(self):
-                    """设置日志记录器"""
-                    # 创建logs目录
-                    if not os.path.exists('logs'):
-                        os.makedirs('logs')
-                    
-                    # 获取当前时间作为日志文件名
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    log_file = f"logs/scraper_log_{timestamp}.txt"
-                    
-                    # 配置日志记录器
-                    logger = logging.getLogger('iframe_scraper')
-                    logger.setLevel(logging.DEBUG)
-                    
-                    # 创建文件处理器
-                    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-                    file_handler.setLevel(logging.DEBUG)
-                    
-                    # 创建控制台处理器
-                    console_handler = logging.StreamHandler()
-                    console_handler.setLevel(logging.INFO)
-                    
-                    # 创建格式化器
-                    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-                    file_handler.setFormatter(formatter)
-                    console_handler.setFormatter(formatter)
-                    
-                    # 添加处理器到记录器
-                    logger.addHandler(file_handler)
-                    logger.addHandler(console_handler)
-                    
-                    return logger
-                
-                def get_game_page_urls(self, url, offset=0):
-                    """获取游戏页面的URL列表和标题"""
-                    if '?' in url:
-                        page_url = f"{url}&offset={offset}"
-                    else:
-                        page_url = f"{url}?offset={offset}"
-                    
-                    headers = {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                    }
-                    
-                    # 创建请求
-                    req = urllib.request.Request(page_url, headers=headers)
-                    
-                    try:
-                        # 发送请求获取网页内容
-                        with urllib.request.urlopen(req) as response:
-                            html_content = response.read().decode('utf-8')
-                            
-                        # 找到所有游戏单元格
-                        game_cells = re.findall(r'<div class="game_cell[^>]*>(.*?)</div>\s*</div>\s*</div>', html_content, re.DOTALL)
-                        
-                        games = []
-                        for cell in game_cells:
-                            # 从game_cell_data中提取游戏标题和链接
-                            cell_data = re.search(r'<div class="game_cell_data">(.*?)</div>', cell, re.DOTALL)
-                            if cell_data:
-                                cell_data_content = cell_data.group(1)
-                                
-                                # 提取游戏标题和链接
-                                title_match = re.search(r'<div class="game_title">\s*<a[^>]*href="([^"]*)"[^>]*>(.*?)</a>', cell_data_content, re.DOTALL)
-                                
-                                if title_match:
-                                    game_url = title_match.group(1)
-                                    game_title = re.sub(r'<[^>]*>', '', title_match.group(2)).strip()
-                                    
-                                    games.append({
-                                        'title': game_title,
-                                        'url': game_url
-                                    })
-                        
-                        # 检查是否有"下一页"按钮，判断是否还有更多游戏
-                        has_more = "Next page" in html_content or "下一页" in html_content
-                        
-                        return games, has_more
-                    
-                    except Exception as e:
-                        print(f"获取页面时出错: {e}")
-                        return [], False
-                
-                def get_iframe_src(self, game_url):
-                    """从游戏页面获取iframe的src属性"""
-                    headers = {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-                    }
-                    
-                    # 创建请求
-                    req = urllib.request.Request(game_url, headers=headers)
-                    
-                    try:
-                        # 发送请求获取网页内容
-                        with urllib.request.urlopen(req) as response:
-                            html_content = response.read().decode('utf-8')
-                        
-                        # 情况1: 查找html_embed元素中的iframe标签的src属性
-                        html_embed_match = re.search(r'<div[^>]*id="html_embed[^"]*"[^>]*>(.*?)</div>', html_content, re.DOTALL)
-                        if html_embed_match:
-                            html_embed_content = html_embed_match.group(1)
-                            
-                            # 情况1.1: 直接从iframe标签中提取src属性
-                            iframe_tag = re.search(r'<iframe[^>]*src="([^"]*)"[^>]*>', html_embed_content)
-                            if iframe_tag:
-                                iframe_src = iframe_tag.group(1)
-                                return iframe_src
-                            
-                            # 情况1.2: 从data-iframe属性中提取src
-                            data_iframe = re.search(r'data-iframe="([^"]*)"', html_embed_content)
-                            if data_iframe:
-                                # 获取data-iframe属性值并解码HTML实体
-                                iframe_data_str = data_iframe.group(1)
-                                iframe_data_str = html.unescape(iframe_data_str)
-                                
-                                # 从iframe标签中提取src属性
-                                iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
-                                if iframe_src_match:
-                                    iframe_src = iframe_src_match.group(1)
-                                    return iframe_src
-                        
-                        # 情况2: 如果在html_embed中找不到，则查找iframe_placeholder中的data-iframe属性
-                        iframe_placeholder = re.search(r'<div[^>]*class="iframe_placeholder"[^>]*data-iframe="([^"]*)"', html_content, re.DOTALL)
-                        if iframe_placeholder:
-                            # 获取data-iframe属性值并解码HTML实体
-                            iframe_data_str = iframe_placeholder.group(1)
-                            iframe_data_str = html.unescape(iframe_data_str)
-                            
-                            # 从iframe标签中提取src属性
-                            iframe_src_match = re.search(r'src="([^"]*)"', iframe_data_str)
-                            if iframe_src_match:
-                                iframe_src = iframe_src_match.group(1)
-                                return iframe_src
-                        
-                        # 如果都没找到，返回None
-                        return None
-                    
-                    except Exception as e:
-                        print(f"获取游戏页面时出错: {e}")
-                        return None
-                
-                def save_results(self, results, output_file):
-                    """保存结果到JSON文件"""
-                    # 确保目录存在
-                    os.makedirs(os.path.dirname(output_file), exist_ok=True)
-                    
-                    # 如果没有找到任何游戏，创建一个空数组的JSON文件
-                    if not results:
-                        results = []
-                    
-                    # 确保结果是UTF-8格式，不使用ensure_ascii
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        json_str = json.dumps(results, ensure_ascii=False, indent=2)
-                        f.write(json_str)
-            
-            scraper_module = ScrapeModule()
-    else:
-        # 如果不是打包程序，使用importlib加载
-        import importlib.util
-        iframe_scraper_path = os.path.join(script_dir, 'iframe_scraper.py')
-        spec = importlib.util.spec_from_file_location("iframe_scraper", iframe_scraper_path)
-        scraper_module = importlib.util.module_from_spec(spec)
-        spec.loader.exec_module(scraper_module)
-    
-    # 导入所需函数
-    get_game_page_urls = scraper_module.get_game_page_urls
-    get_iframe_src = scraper_module.get_iframe_src
-    setup_logger = scraper_module.setup_logger
-    save_results = scraper_module.save_results
-    
+    from iframe_scraper import get_game_page_urls, get_iframe_src, save_results
+    from result_writers import available_formats, format_from_path
 except Exception as import_error:
     # 显示错误信息
     import traceback
@@ -267,8 +42,302 @@ except Exception as import_error:
     # 退出程序
     sys.exit(1)
 
-# 设置日志记录器
-logger = setup_logger()
+# 启动耗时基准测试使用的环境变量，设置后GUI完成首次绘制即退出
+STARTUP_BENCH_ENV = 'IFRAME_EXTRACTOR_STARTUP_BENCH'
+
+class ResultStore:
+    """
+    列式结果存储
+
+    每一列单独保存为一个列表/数组，提取方法使用整数编码，
+    并为标题和游戏链接维护三元组倒排索引，用于大量结果时的快速筛选。
+    可以在爬取线程中追加数据，在主线程中读取。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """清空所有数据和索引"""
+        with self._lock:
+            self.seqs = array('I')
+            self.titles = []
+            self.game_urls = []
+            self.iframe_srcs = []
+            self.method_codes = array('H')
+            # 提取方法编码表
+            self.methods = []
+            self._method_lookup = {}
+            # 提取方法 -> 行号
+            self._method_rows = {}
+            # 三元组 -> 行号
+            self._trigrams = {}
+            # 上一次筛选的缓存，用于增量筛选
+            self._last_filter = None
+
+    def __len__(self):
+        return len(self.titles)
+
+    @staticmethod
+    def _trigrams_of(text):
+        """返回文本(小写)中所有不重复的三元组"""
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def append(self, seq, title, game_url, iframe_src, method=''):
+        """追加一条结果并更新索引，返回行号"""
+        with self._lock:
+            row = len(self.titles)
+            code = self._method_lookup.get(method)
+            if code is None:
+                code = len(self.methods)
+                self.methods.append(method)
+                self._method_lookup[method] = code
+                self._method_rows[code] = array('I')
+
+            self.seqs.append(seq)
+            self.titles.append(title)
+            self.game_urls.append(game_url)
+            self.iframe_srcs.append(iframe_src)
+            self.method_codes.append(code)
+            self._method_rows[code].append(row)
+
+            for trigram in self._trigrams_of(f"{title}\n{game_url}".lower()):
+                postings = self._trigrams.get(trigram)
+                if postings is None:
+                    postings = self._trigrams[trigram] = array('I')
+                postings.append(row)
+            return row
+
+    def record(self, row):
+        """以字典形式返回一行结果"""
+        return {
+            'title': self.titles[row],
+            'game_url': self.game_urls[row],
+            'iframe_src': self.iframe_srcs[row],
+            'extracted_method': self.methods[self.method_codes[row]]
+        }
+
+    def records(self, rows=None):
+        """以字典列表形式返回多行结果，rows为None时返回全部"""
+        if rows is None:
+            rows = range(len(self))
+        return [self.record(row) for row in rows]
+
+    def _matches(self, row, query, method_hits):
+        """检查某一行是否匹配搜索词"""
+        return (self.method_codes[row] in method_hits
+                or query in self.titles[row].lower()
+                or query in self.game_urls[row].lower())
+
+    def filter(self, query='', method=None):
+        """
+        按搜索词和提取方法筛选结果
+
+        Args:
+            query: 搜索词，匹配标题、游戏链接或提取方法名称(不区分大小写)
+            method: 提取方法，为None时不限制
+
+        Returns:
+            array: 按追加顺序排列的匹配行号
+        """
+        query = query.strip().lower()
+        with self._lock:
+            count = len(self.titles)
+
+            if method is not None:
+                code = self._method_lookup.get(method)
+                if code is None:
+                    return array('I')
+                scope = self._method_rows[code]
+            else:
+                scope = None
+
+            if not query:
+                return array('I', scope) if scope is not None else array('I', range(count))
+
+            method_hits = {code for code, name in enumerate(self.methods) if query in name.lower()}
+
+            # 增量筛选: 新的搜索词包含上一次的搜索词时，只需在上次的结果和新增的行中查找
+            last = self._last_filter
+            if last and last[0] and last[1] == method and last[0] in query:
+                _, _, last_count, last_rows = last
+                candidates = list(last_rows)
+                if scope is not None:
+                    candidates.extend(row for row in scope if row >= last_count)
+                else:
+                    candidates.extend(range(last_count, count))
+            elif len(query) >= 3:
+                # 通过三元组倒排索引求交集获得候选行
+                postings = sorted(
+                    (self._trigrams.get(trigram, ()) for trigram in self._trigrams_of(query)),
+                    key=len
+                )
+                candidates = set(postings[0])
+                for posting in postings[1:]:
+                    if not candidates:
+                        break
+                    candidates.intersection_update(posting)
+                for code in method_hits:
+                    candidates.update(self._method_rows[code])
+                if scope is not None:
+                    candidates.intersection_update(scope)
+                candidates = sorted(candidates)
+            else:
+                candidates = scope if scope is not None else range(count)
+
+            rows = array('I', (row for row in candidates if self._matches(row, query, method_hits)))
+            self._last_filter = (query, method, count, rows)
+            return rows
+
+
+class VirtualResultsView:
+    """
+    虚拟化结果表格
+
+    Treeview中只保留当前可见窗口内的行，滚动时根据滚动位置重新填充，
+    因此行数再多也不会影响插入、选择和滚动的速度。
+    """
+
+    def __init__(self, parent, store, columns, on_select=None):
+        self.store = store
+        self.on_select = on_select
+        self.rows = array('I')  # 当前筛选视图中的行号
+        self.top = 0  # 可见窗口第一行在视图中的位置
+        self.visible_count = 20
+        self.selected_row = None
+        self.query = ''
+        self.method = None
+
+        self.tree = ttk.Treeview(parent, columns=columns, show='headings', selectmode='browse')
+        self.scrollbar = ttk.Scrollbar(parent, orient="vertical", command=self._on_scrollbar)
+
+        style = ttk.Style()
+        try:
+            self.row_height = int(style.lookup('Treeview', 'rowheight') or 20)
+        except (ValueError, tk.TclError):
+            self.row_height = 20
+
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<<TreeviewSelect>>', self._on_tree_select)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda event: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll(3))
+        self.tree.bind('<Prior>', lambda event: self._on_key_scroll(-self.visible_count))
+        self.tree.bind('<Next>', lambda event: self._on_key_scroll(self.visible_count))
+        self.tree.bind('<Up>', lambda event: self._on_key_move(-1))
+        self.tree.bind('<Down>', lambda event: self._on_key_move(1))
+
+    def set_filter(self, query='', method=None):
+        """设置筛选条件并回到顶部"""
+        self.query = query
+        self.method = method
+        self.top = 0
+        self.refresh()
+
+    def refresh(self):
+        """重新计算筛选视图并重绘可见窗口"""
+        self.rows = self.store.filter(self.query, self.method)
+        self.render()
+
+    def reset(self):
+        """清空视图"""
+        self.rows = array('I')
+        self.top = 0
+        self.selected_row = None
+        self.render()
+
+    def render(self):
+        """只渲染可见窗口中的行"""
+        total = len(self.rows)
+        self.top = max(0, min(self.top, total - self.visible_count))
+        window = self.rows[self.top:self.top + self.visible_count]
+
+        self.tree.delete(*self.tree.get_children())
+        for row in window:
+            self.tree.insert('', 'end', iid=str(row), values=(
+                self.store.seqs[row],
+                self.store.titles[row],
+                self.store.game_urls[row],
+                self.store.iframe_srcs[row],
+                self.store.methods[self.store.method_codes[row]]
+            ))
+
+        if self.selected_row is not None and self.tree.exists(str(self.selected_row)):
+            self.tree.selection_set(str(self.selected_row))
+
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + self.visible_count) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll(self, delta):
+        """滚动指定行数"""
+        self.top += delta
+        self.render()
+
+    def selected_record(self):
+        """返回当前选中的结果字典"""
+        if self.selected_row is None:
+            return None
+        return self.store.record(self.selected_row)
+
+    def _on_scrollbar(self, *args):
+        total = len(self.rows)
+        if args[0] == 'moveto':
+            self.top = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            step = self.visible_count if args[2] == 'pages' else 1
+            self.top += int(args[1]) * step
+        self.render()
+
+    def _on_configure(self, event):
+        # 表头大约占一行的高度
+        visible_count = max(1, event.height // self.row_height - 1)
+        if visible_count != self.visible_count:
+            self.visible_count = visible_count
+            self.render()
+
+    def _on_mousewheel(self, event):
+        self.scroll(-3 if event.delta > 0 else 3)
+        return 'break'
+
+    def _on_key_scroll(self, delta):
+        self.scroll(delta)
+        return 'break'
+
+    def _on_key_move(self, delta):
+        """键盘上下移动选中行，必要时滚动窗口"""
+        if not self.rows:
+            return 'break'
+        try:
+            position = self.rows.index(self.selected_row) + delta
+        except ValueError:
+            position = self.top
+        position = max(0, min(position, len(self.rows) - 1))
+        self.selected_row = self.rows[position]
+        if position < self.top:
+            self.top = position
+        elif position >= self.top + self.visible_count:
+            self.top = position - self.visible_count + 1
+        self.render()
+        if self.on_select:
+            self.on_select(self.selected_row)
+        return 'break'
+
+    def _on_tree_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected_row = int(selection[0])
+        elif self.selected_row is not None and self.tree.exists(str(self.selected_row)):
+            # 选中行仍在可见窗口内却没有被选中，说明用户取消了选择
+            self.selected_row = None
+        if self.on_select:
+            self.on_select(self.selected_row)
+
 
 class IframeExtractorGUI:
     """itch.io游戏iframe提取器GUI界面"""
@@ -283,7 +352,12 @@ class IframeExtractorGUI:
         self.max_games = tk.IntVar(value=5)
         self.offset = tk.IntVar(value=0)
         self.delay = tk.DoubleVar(value=2.0)
-        self.results = []
+        self.results = ResultStore()
+        self.search_var = tk.StringVar()
+        self.method_var = tk.StringVar(value="全部")
+        self.filter_count_var = tk.StringVar(value="0 / 0")
+        self._refresh_pending = False
+        self._filter_job = None
         self.scraping_thread = None
         self.stop_scraping = False
         
@@ -354,9 +428,30 @@ class IframeExtractorGUI:
         results_frame = ttk.Frame(notebook)
         notebook.add(results_frame, text="结果")
         
-        # 创建结果表格
-        columns = ('序号', '标题', '游戏链接', 'iframe源')
-        self.results_tree = ttk.Treeview(results_frame, columns=columns, show='headings')
+        # 筛选区域
+        filter_frame = ttk.Frame(results_frame)
+        filter_frame.pack(fill=tk.X, pady=(5, 0))
+        
+        ttk.Label(filter_frame, text="搜索:").pack(side=tk.LEFT, padx=5)
+        search_entry = ttk.Entry(filter_frame, textvariable=self.search_var, width=30)
+        search_entry.pack(side=tk.LEFT, padx=5)
+        self.search_var.trace_add('write', lambda *args: self.schedule_filter())
+        
+        ttk.Label(filter_frame, text="提取方法:").pack(side=tk.LEFT, padx=5)
+        self.method_combo = ttk.Combobox(filter_frame, textvariable=self.method_var, values=["全部"], state='readonly', width=22)
+        self.method_combo.pack(side=tk.LEFT, padx=5)
+        self.method_combo.bind('<<ComboboxSelected>>', lambda event: self.apply_filter())
+        
+        ttk.Button(filter_frame, text="导出筛选结果", command=self.export_filtered_results).pack(side=tk.RIGHT, padx=5)
+        ttk.Label(filter_frame, textvariable=self.filter_count_var).pack(side=tk.RIGHT, padx=5)
+        
+        # 创建结果表格，只渲染可见窗口中的行
+        table_frame = ttk.Frame(results_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True)
+        
+        columns = ('序号', '标题', '游戏链接', 'iframe源', '提取方法')
+        self.results_view = VirtualResultsView(table_frame, self.results, columns, on_select=self.on_result_selected)
+        self.results_tree = self.results_view.tree
         
         # 设置列标题
         for col in columns:
@@ -366,18 +461,8 @@ class IframeExtractorGUI:
         self.results_tree.column('序号', width=50, stretch=False)
         self.results_tree.column('标题', width=150)
         self.results_tree.column('游戏链接', width=200)
-        self.results_tree.column('iframe源', width=400)
-        
-        # 添加滚动条
-        tree_scrollbar = ttk.Scrollbar(results_frame, orient="vertical", command=self.results_tree.yview)
-        self.results_tree.configure(yscrollcommand=tree_scrollbar.set)
-        
-        # 打包组件
-        self.results_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # 绑定表格选择事件
-        self.results_tree.bind('<<TreeviewSelect>>', self.on_result_selected)
+        self.results_tree.column('iframe源', width=300)
+        self.results_tree.column('提取方法', width=120)
     
     def log(self, message, level='info'):
         """向日志文本框添加消息"""
@@ -424,9 +509,10 @@ class IframeExtractorGUI:
         self.stop_button.config(state=tk.NORMAL)
         
         # 清空结果
-        self.results = []
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
+        self.results.clear()
+        self.results_view.reset()
+        self.method_combo.config(values=["全部"])
+        self.update_filter_count()
         
         # 重置进度条
         self.progress_var.set(0)
@@ -480,7 +566,7 @@ class IframeExtractorGUI:
                     self.log(f"处理游戏 {total_processed+1}/{max_games}: {game['title']}")
                     
                     # 获取iframe src
-                    iframe_src = get_iframe_src(game['url'])
+                    iframe_src, extraction_method = get_iframe_src(game['url'], return_method=True)
                     
                     if iframe_src:
                         self.log(f"成功找到iframe源: {iframe_src}", 'success')
@@ -488,14 +574,9 @@ class IframeExtractorGUI:
                             total_processed + 1, 
                             game['title'], 
                             game['url'], 
-                            iframe_src
+                            iframe_src,
+                            extraction_method
                         )
-                        
-                        self.results.append({
-                            'title': game['title'],
-                            'game_url': game['url'],
-                            'iframe_src': iframe_src
-                        })
                         successful_processed += 1
                     else:
                         self.log(f"未找到iframe源", 'warning')
@@ -540,9 +621,9 @@ class IframeExtractorGUI:
                         time.sleep(0.5)
             
             # 保存最终结果
-            if self.results:
+            if len(self.results):
                 output_file = f"results/game_iframes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-                save_results(self.results, output_file)
+                save_results(self.results.records(), output_file)
                 self.log(f"结果已保存到: {output_file}", 'success')
             
             self.log("==== 爬取完成 ====", 'success')
@@ -570,36 +651,79 @@ class IframeExtractorGUI:
         self.stop_scraping = True
         self.log("正在停止爬取过程...", 'warning')
     
-    def update_results_table(self, index, title, game_url, iframe_src):
-        """更新结果表格"""
-        def _update():
-            """在主线程中更新UI"""
-            self.results_tree.insert('', 'end', values=(index, title, game_url, iframe_src))
-        
-        # 在主线程中调用UI更新
-        self.root.after(0, _update)
+    def update_results_table(self, index, title, game_url, iframe_src, extraction_method=''):
+        """添加一条结果并安排刷新结果表格"""
+        self.results.append(index, title, game_url, iframe_src, extraction_method)
+        
+        # 合并同一时间内的多次刷新，避免每条结果都重绘表格
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.root.after(100, self._refresh_results_view)
+    
+    def _refresh_results_view(self):
+        """在主线程中刷新结果表格"""
+        self._refresh_pending = False
+        self.method_combo.config(values=["全部"] + [m or "未知" for m in self.results.methods])
+        self.results_view.refresh()
+        self.update_filter_count()
+    
+    def schedule_filter(self):
+        """输入搜索词后稍作延迟再筛选，避免每次按键都重新筛选"""
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(150, self.apply_filter)
+    
+    def apply_filter(self):
+        """根据搜索词和提取方法筛选结果表格"""
+        self._filter_job = None
+        method = self.method_var.get()
+        if method == "全部":
+            method = None
+        elif method == "未知":
+            method = ""
+        self.results_view.set_filter(self.search_var.get(), method)
+        self.update_filter_count()
     
-    def on_result_selected(self, event):
+    def update_filter_count(self):
+        """更新筛选结果数量"""
+        self.filter_count_var.set(f"{len(self.results_view.rows)} / {len(self.results)}")
+    
+    def export_filtered_results(self):
+        """将当前筛选视图中的结果导出，格式由文件扩展名决定(JSON/CSV/NDJSON/列式)"""
+        rows = self.results_view.rows
+        if not rows:
+            messagebox.showinfo("提示", "当前没有可导出的结果")
+            return
+        
+        output_file = filedialog.asksaveasfilename(
+            title="导出筛选结果",
+            initialdir=os.path.abspath("results"),
+            initialfile=f"game_iframes_filtered_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            defaultextension=".json",
+            filetypes=[("JSON文件", "*.json"), ("CSV表格", "*.csv"), ("压缩NDJSON", "*.ndjson.gz"),
+                       ("列式格式", "*.ifcol")] + ([("Parquet", "*.parquet")] if 'parquet' in available_formats() else [])
+        )
+        if not output_file:
+            return
+        
+        save_results(self.results.records(rows), output_file, format_from_path(output_file))
+        self.log(f"已导出 {len(rows)} 条筛选结果到: {output_file}", 'success')
+    
+    def on_result_selected(self, row):
         """当结果表格中的项目被选中时调用"""
-        selection = self.results_tree.selection()
-        if selection:
+        if row is not None:
             self.test_iframe_button.config(state=tk.NORMAL)
         else:
             self.test_iframe_button.config(state=tk.DISABLED)
     
     def test_iframe(self):
         """测试选中的iframe"""
-        selection = self.results_tree.selection()
-        if not selection:
+        record = self.results_view.selected_record()
+        if not record:
             return
         
-        selected_item = self.results_tree.item(selection[0])
-        values = selected_item['values']
-        
-        if len(values) >= 4:
-            iframe_src = values[3]
-            if iframe_src:
-                self.create_html_viewer(iframe_src, values[1])
+        if record['iframe_src']:
+            self.create_html_viewer(record['iframe_src'], record['title'])
     
     def create_html_viewer(self, iframe_src, title):
         """创建HTML页面来显示iframe"""
@@ -722,6 +846,7 @@ class IframeExtractorGUI:
             f.write(html_content)
         
         # 在浏览器中打开HTML文件
+        import webbrowser
         html_file_url = "file://" + os.path.abspath(html_file)
         webbrowser.open(html_file_url)
         
@@ -734,6 +859,7 @@ class IframeExtractorGUI:
             os.makedirs(results_dir)
         
         # 在文件浏览器中打开结果目录
+        import subprocess
         if sys.platform == 'win32':
             os.startfile(results_dir)
         elif sys.platform == 'darwin':  # macOS
@@ -758,6 +884,10 @@ def main():
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
     
+    # 启动耗时基准测试: 界面完成首次绘制后立即退出
+    if os.environ.get(STARTUP_BENCH_ENV):
+        root.after_idle(lambda: root.after(0, root.destroy))
+    
     # 运行主循环
     root.mainloop()
 
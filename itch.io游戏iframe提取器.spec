@@ -5,8 +5,8 @@ a = Analysis(
     ['iframe_scraper_gui.py'],
     pathex=[],
     binaries=[],
-    datas=[('iframe_scraper.py', '.')],
-    hiddenimports=['urllib.request', 'urllib.error', 'urllib.parse', 'html.parser', 'json', 'os', 'time', 're', 'logging'],
+    datas=[],
+    hiddenimports=['iframe_scraper', 'urllib.request', 'urllib.error', 'urllib.parse', 'html.parser', 'json', 'os', 'time', 're', 'logging'],
     hookspath=['hooks'],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+爬取任务调度器
+
+- 按优先级分为 high / normal / low 三个队列，总是先调度高优先级队列
+- 同一优先级内按提交者轮转，一个提交者的大量任务不会挤占其他提交者
+- 限制全局同时运行的爬取数量
+- 任务按分片运行，每个分片结束后重新排队，大任务会在分片边界让出位置给小任务
+"""
+
+import time
+import threading
+from collections import OrderedDict, deque
+
+PRIORITIES = ('high', 'normal', 'low')
+
+class JobScheduler:
+    """带优先级和提交者公平轮转的任务调度器"""
+
+    def __init__(self, runner, max_concurrent=2, slice_size=50):
+        """
+        初始化调度器
+
+        Args:
+            runner: 运行一个任务分片的函数 runner(job_id, slice_size)，
+                    任务全部完成时返回True，还有剩余部分时返回False
+            max_concurrent: 全局最多同时运行的分片数
+            slice_size: 每个分片最多处理的游戏数量，为None时不分片
+        """
+        self.runner = runner
+        self.max_concurrent = max_concurrent
+        self.slice_size = slice_size
+        self._cond = threading.Condition()
+        # 优先级 -> OrderedDict(提交者 -> deque(任务ID))，提交者的顺序即轮转顺序
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._entries = {}  # 排队中的任务ID -> (优先级, 提交者)
+        self._running = {}  # 运行中的任务ID -> (优先级, 提交者)
+        self._inline_running = 0
+        self._slice_seconds = None  # 分片耗时的指数移动平均
+        self._thread = None
+
+    def submit(self, job_id, submitter, priority='normal'):
+        """
+        提交任务到队列
+
+        Args:
+            job_id: 任务ID
+            submitter: 提交者标识，用于公平轮转
+            priority: 优先级，high / normal / low
+        """
+        if priority not in PRIORITIES:
+            priority = 'normal'
+        with self._cond:
+            if job_id in self._entries or job_id in self._running:
+                return
+            self._enqueue(job_id, submitter, priority)
+            self._cond.notify_all()
+        self._ensure_dispatcher()
+
+    def remove(self, job_id):
+        """
+        从队列中移除尚未运行的任务
+
+        Returns:
+            bool: 任务是否在队列中
+        """
+        with self._cond:
+            entry = self._entries.pop(job_id, None)
+            if entry is None:
+                return False
+            priority, submitter = entry
+            submitter_jobs = self._queues[priority][submitter]
+            submitter_jobs.remove(job_id)
+            if not submitter_jobs:
+                del self._queues[priority][submitter]
+            return True
+
+    def is_running(self, job_id):
+        """任务的某个分片是否正在运行"""
+        with self._cond:
+            return job_id in self._running
+
+    def queue_info(self, job_id):
+        """
+        获取任务的排队位置和预计开始时间
+
+        Returns:
+            dict: queue_position(前面还有几个分片)和estimated_start_seconds，
+                  任务不在队列中时返回None
+        """
+        return self.snapshot().get(job_id)
+
+    def snapshot(self):
+        """
+        获取所有排队任务的排队位置和预计开始时间
+
+        Returns:
+            dict: 任务ID -> {'queue_position', 'estimated_start_seconds'}
+        """
+        with self._cond:
+            # 在队列副本上模拟调度顺序
+            queues = {
+                priority: OrderedDict((submitter, deque(job_ids)) for submitter, job_ids in submitters.items())
+                for priority, submitters in self._queues.items()
+            }
+            slice_seconds = self._slice_seconds or 30.0
+            free_slots = max(0, self.max_concurrent - len(self._running) - self._inline_running)
+
+            infos = {}
+            position = 0
+            while True:
+                job_id = self._pick(queues)
+                if job_id is None:
+                    break
+                if position < free_slots:
+                    estimated = 0.0
+                else:
+                    # 每一轮可以同时运行max_concurrent个分片
+                    rounds = (position - free_slots) // max(1, self.max_concurrent) + 1
+                    estimated = rounds * slice_seconds
+                infos[job_id] = {
+                    'queue_position': position,
+                    'estimated_start_seconds': round(estimated, 1)
+                }
+                position += 1
+            return infos
+
+    def try_acquire_inline(self):
+        """
+        为在请求中同步运行的任务申请一个运行名额（准入控制）
+
+        Returns:
+            bool: 是否获得名额，获得后必须调用release_inline()
+        """
+        with self._cond:
+            if len(self._running) + self._inline_running >= self.max_concurrent:
+                return False
+            self._inline_running += 1
+            return True
+
+    def release_inline(self):
+        """释放try_acquire_inline()获得的名额"""
+        with self._cond:
+            self._inline_running = max(0, self._inline_running - 1)
+            self._cond.notify_all()
+
+    def _enqueue(self, job_id, submitter, priority):
+        self._queues[priority].setdefault(submitter, deque()).append(job_id)
+        self._entries[job_id] = (priority, submitter)
+
+    def _pick(self, queues):
+        """从最高优先级的非空队列中轮转选出下一个任务，会修改传入的队列"""
+        for priority in PRIORITIES:
+            submitters = queues[priority]
+            if not submitters:
+                continue
+            submitter, submitter_jobs = next(iter(submitters.items()))
+            job_id = submitter_jobs.popleft()
+            # 这个提交者移到轮转顺序的末尾
+            del submitters[submitter]
+            if submitter_jobs:
+                submitters[submitter] = submitter_jobs
+            return job_id
+        return None
+
+    def _ensure_dispatcher(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._dispatch_loop, name='job-scheduler', daemon=True)
+                self._thread.start()
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._entries or len(self._running) + self._inline_running >= self.max_concurrent:
+                    self._cond.wait()
+                job_id = self._pick(self._queues)
+                entry = self._entries.pop(job_id)
+                self._running[job_id] = entry
+            threading.Thread(target=self._run_slice, args=(job_id,), daemon=True).start()
+
+    def _run_slice(self, job_id):
+        started = time.time()
+        try:
+            finished = self.runner(job_id, self.slice_size)
+        except Exception as e:
+            print(f"任务 {job_id} 分片运行失败: {e}")
+            finished = True
+        elapsed = time.time() - started
+
+        with self._cond:
+            priority, submitter = self._running.pop(job_id)
+            if self._slice_seconds is None:
+                self._slice_seconds = elapsed
+            else:
+                self._slice_seconds = 0.8 * self._slice_seconds + 0.2 * elapsed
+            if not finished:
+                # 未完成的任务重新排到提交者队列的末尾，让其他任务先运行
+                self._enqueue(job_id, submitter, priority)
+            self._cond.notify_all()
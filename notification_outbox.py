@@ -0,0 +1,524 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+任务完成通知的发件箱
+
+任务结束时只把通知事件写入SQLite发件箱(很快，不会阻塞爬取)，由后台发送线程投递：
+同一收件人的多个事件合并成一封摘要邮件或一个webhook请求，SMTP连接在多次发送之间复用，
+发送失败时按指数退避重试，超过最多次数后放弃。服务器重启后未发送的通知会继续发送。
+
+传输方式:
+    email   - SMTP (环境变量SMTP_HOST、SMTP_PORT、SMTP_USER、SMTP_PASSWORD、SMTP_STARTTLS、SMTP_SSL、NOTIFY_FROM)
+    webhook - 向收件人URL发送JSON POST请求。只允许解析到公网地址的主机(不能是内网、本机、
+              链路本地或云平台元数据地址)，不跟随重定向；NOTIFY_WEBHOOK_HOSTS设置为逗号分隔的
+              主机名时只允许这些主机
+
+本地测试可以用调试SMTP服务器代替真实的邮件服务器:
+    python -m aiosmtpd -n -l localhost:8025       (或Python 3.11及以下: python -m smtpd -n -c DebuggingServer localhost:8025)
+    SMTP_HOST=localhost SMTP_PORT=8025 python server.py
+"""
+
+import os
+import json
+import time
+import random
+import socket
+import smtplib
+import sqlite3
+import ipaddress
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+if 'VERCEL' in os.environ:
+    DEFAULT_OUTBOX_PATH = '/tmp/outbox/notifications.sqlite3'
+else:
+    DEFAULT_OUTBOX_PATH = os.path.join('outbox', 'notifications.sqlite3')
+
+# 结果文件不超过这个大小时作为邮件附件发送
+ATTACHMENT_MAX_BYTES = int(os.environ.get('NOTIFY_ATTACHMENT_MAX_BYTES', str(1024 * 1024)))
+
+# 有截止时间时剩余时间少于这个值(秒)就不再尝试发送
+MIN_SEND_SECONDS = 1.0
+
+class PermanentDeliveryError(Exception):
+    """重试也不会成功的发送错误(如收件人地址被拒绝)"""
+
+class NotificationOutbox:
+    """保存在SQLite中的待发送通知"""
+
+    def __init__(self, path=DEFAULT_OUTBOX_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        if path != ':memory:':
+            # 多个进程(web和worker角色)共用发件箱
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                event TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                claim_token TEXT,
+                claimed_until REAL,
+                created_at REAL NOT NULL,
+                sent_at REAL,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS notifications_due ON notifications (status, next_attempt_at);
+        """)
+        self._conn.commit()
+
+    def enqueue(self, channel, recipient, event, delay=0):
+        """
+        添加一条通知
+
+        Args:
+            channel: 传输方式('email'或'webhook')
+            recipient: 邮件地址或webhook URL
+            event: 通知内容(可以序列化为JSON的字典)
+            delay: 最早发送时间距离现在的秒数，同一收件人在这段时间内的通知会合并发送
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO notifications (channel, recipient, event, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (channel, recipient, json.dumps(event, ensure_ascii=False), now + delay, now)
+            )
+            self._conn.commit()
+
+    def claim_due(self, limit=100, claim_seconds=300):
+        """
+        领取到期的通知，以及这些收件人其他待发送的通知(合并成一次发送)
+
+        领取的通知在claim_seconds秒内不会被其他进程领取，发送线程崩溃时到期后重新发送
+
+        Returns:
+            list: 通知字典(id、channel、recipient、event、attempts)，按创建顺序排列
+        """
+        now = time.time()
+        token = f"{os.getpid()}-{threading.get_ident()}-{now}"
+        with self._lock:
+            # BEGIN IMMEDIATE保证多个进程不会领取同一条通知
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("""
+                    UPDATE notifications SET status = 'sending', claim_token = ?, claimed_until = ?
+                    WHERE id IN (
+                        SELECT id FROM notifications
+                        WHERE (status = 'pending' AND channel || ' ' || recipient IN (
+                                   SELECT channel || ' ' || recipient FROM notifications
+                                   WHERE status = 'pending' AND next_attempt_at <= ?))
+                           OR (status = 'sending' AND claimed_until < ?)
+                        ORDER BY id LIMIT ?
+                    )
+                """, (token, now + claim_seconds, now, now, limit))
+                rows = self._conn.execute(
+                    "SELECT id, channel, recipient, event, attempts FROM notifications WHERE claim_token = ? AND status = 'sending' ORDER BY id",
+                    (token,)
+                ).fetchall()
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return [
+            {'id': row[0], 'channel': row[1], 'recipient': row[2], 'event': json.loads(row[3]), 'attempts': row[4]}
+            for row in rows
+        ]
+
+    def mark_sent(self, ids):
+        self._update(ids, "status = 'sent', sent_at = ?, claim_token = NULL, last_error = NULL", (time.time(),))
+
+    def mark_retry(self, ids, error, retry_at):
+        """发送失败，retry_at之后重试"""
+        self._update(
+            ids,
+            "status = 'pending', attempts = attempts + 1, next_attempt_at = ?, claim_token = NULL, last_error = ?",
+            (retry_at, str(error)[:500])
+        )
+
+    def release(self, ids):
+        """没有尝试发送就放回待发送状态(不计入发送次数)"""
+        self._update(ids, "status = 'pending', claim_token = NULL", ())
+
+    def mark_dead(self, ids, error):
+        """放弃发送"""
+        self._update(
+            ids,
+            "status = 'dead', attempts = attempts + 1, claim_token = NULL, last_error = ?",
+            (str(error)[:500],)
+        )
+
+    def purge_finished_older_than(self, seconds):
+        """删除早于seconds秒前创建的已发送和已放弃的通知，返回删除的数量"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM notifications WHERE status IN ('sent', 'dead') AND created_at < ?",
+                (time.time() - seconds,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def stats(self):
+        """各状态的通知数量"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM notifications GROUP BY status").fetchall()
+        summary = {'pending': 0, 'sending': 0, 'sent': 0, 'dead': 0}
+        summary.update(dict(rows))
+        return summary
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _update(self, ids, assignments, params):
+        if not ids:
+            return
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE notifications SET {assignments} WHERE id IN ({','.join('?' * len(ids))})",
+                tuple(params) + tuple(ids)
+            )
+            self._conn.commit()
+
+def describe_event(event):
+    """一个事件的文字说明"""
+    lines = [f"任务 {event['job_id']}: {event['status']}"]
+    if event['status'] == 'completed':
+        lines.append(f"  结果数量: {event.get('result_count') or 0}")
+        if event.get('download_url'):
+            lines.append(f"  下载地址: {event['download_url']}")
+    elif event.get('error'):
+        lines.append(f"  错误: {event['error']}")
+    return '\n'.join(lines)
+
+def build_digest_message(sender, recipient, events):
+    """
+    把同一收件人的事件合并成一封邮件，结果文件不大时作为附件
+
+    Args:
+        sender: 发件人地址
+        recipient: 收件人地址
+        events: 事件列表
+    """
+    message = MIMEMultipart()
+    message['From'] = sender
+    message['To'] = recipient
+    if len(events) == 1:
+        event = events[0]
+        if event['status'] == 'completed':
+            message['Subject'] = f"itch.io iframe提取完成: {event.get('result_count') or 0} 个结果"
+        else:
+            message['Subject'] = f"itch.io iframe提取任务{event['status']}"
+    else:
+        message['Subject'] = f"itch.io iframe提取: {len(events)} 个任务已结束"
+    message.attach(MIMEText('\n\n'.join(describe_event(event) for event in events), 'plain', 'utf-8'))
+
+    for event in events:
+        result_file = event.get('result_file')
+        if event['status'] != 'completed' or not result_file or not os.path.exists(result_file):
+            continue
+        if os.path.getsize(result_file) > ATTACHMENT_MAX_BYTES:
+            continue
+        with open(result_file, 'rb') as f:
+            attachment = MIMEApplication(f.read(), Name=f"job_{event['job_id']}.json")
+        attachment['Content-Disposition'] = f'attachment; filename="job_{event["job_id"]}.json"'
+        message.attach(attachment)
+    return message
+
+class SmtpTransport:
+    """通过SMTP发送摘要邮件，连接在多次发送之间复用"""
+
+    channel = 'email'
+
+    def __init__(self, host, port=25, username=None, password=None, starttls=False, use_ssl=False,
+                 sender='noreply@localhost', timeout=30, idle_seconds=60):
+        """
+        Args:
+            idle_seconds: 连接空闲超过这个时间后关闭
+        """
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.use_ssl = use_ssl
+        self.sender = sender
+        self.timeout = timeout
+        self.idle_seconds = idle_seconds
+        self._smtp = None
+        self._last_used = 0
+
+    @classmethod
+    def from_env(cls):
+        """按环境变量创建，没有设置SMTP_HOST时返回None"""
+        host = os.environ.get('SMTP_HOST')
+        if not host:
+            return None
+        use_ssl = os.environ.get('SMTP_SSL', '').lower() in ('1', 'true', 'yes')
+        return cls(
+            host,
+            port=int(os.environ.get('SMTP_PORT', '465' if use_ssl else '25')),
+            username=os.environ.get('SMTP_USER'),
+            password=os.environ.get('SMTP_PASSWORD'),
+            starttls=os.environ.get('SMTP_STARTTLS', '').lower() in ('1', 'true', 'yes'),
+            use_ssl=use_ssl,
+            sender=os.environ.get('NOTIFY_FROM', 'noreply@localhost')
+        )
+
+    def send(self, recipient, events, timeout=None):
+        """发送一封摘要邮件，timeout为这次发送的超时时间(秒)，默认为self.timeout"""
+        message = build_digest_message(self.sender, recipient, events)
+        for attempt in range(2):
+            smtp = self._connection(timeout or self.timeout)
+            try:
+                smtp.sendmail(self.sender, [recipient], message.as_string())
+                self._last_used = time.time()
+                return
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentDeliveryError(f"收件人被拒绝: {recipient}") from e
+            except smtplib.SMTPServerDisconnected:
+                # 复用的连接已被服务器关闭，重新连接一次
+                self.close()
+                if attempt:
+                    raise
+
+    def close_idle(self):
+        if self._smtp is not None and time.time() - self._last_used > self.idle_seconds:
+            self.close()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _connection(self, timeout):
+        if self._smtp is not None and self._smtp.sock is not None:
+            self._smtp.sock.settimeout(timeout)
+        if self._smtp is None:
+            if self.use_ssl:
+                smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=timeout)
+            else:
+                smtp = smtplib.SMTP(self.host, self.port, timeout=timeout)
+                if self.starttls:
+                    smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or '')
+            self._smtp = smtp
+        return self._smtp
+
+def check_webhook_url(url, allowed_hosts=None):
+    """
+    检查webhook URL，避免服务器被用来访问内网或本机的服务
+
+    Args:
+        url: webhook URL
+        allowed_hosts: 允许的主机名集合，默认读取NOTIFY_WEBHOOK_HOSTS，为空时允许所有公网主机
+
+    Raises:
+        ValueError: URL不是http(s)、主机不在允许列表中、无法解析，或解析到非公网地址
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError('webhook_url must be an http or https URL')
+    host = parts.hostname.lower()
+    if allowed_hosts is None:
+        allowed_hosts = {
+            name.strip().lower() for name in os.environ.get('NOTIFY_WEBHOOK_HOSTS', '').split(',') if name.strip()
+        }
+    if allowed_hosts and host not in allowed_hosts:
+        raise ValueError(f'webhook host {host} is not allowed')
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f'webhook host {host} cannot be resolved') from e
+    for address in addresses:
+        # 去掉IPv6地址的区域后缀(如fe80::1%eth0)
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f'webhook host {host} resolves to a non-public address')
+
+class _NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """不跟随重定向，3xx响应作为HTTPError返回"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class WebhookTransport:
+    """向收件人URL发送JSON POST请求，内容为 {"events": [...]}"""
+
+    channel = 'webhook'
+
+    def __init__(self, timeout=15):
+        self.timeout = timeout
+        self._opener = urllib.request.build_opener(_NoRedirectHandler)
+
+    def send(self, recipient, events, timeout=None):
+        """发送一次webhook请求，timeout为这次发送的超时时间(秒)，默认为self.timeout"""
+        # 发送前再检查一次，域名的解析结果可能在提交任务后改变
+        try:
+            check_webhook_url(recipient)
+        except ValueError as e:
+            raise PermanentDeliveryError(str(e)) from e
+        body = json.dumps({
+            'events': [{key: value for key, value in event.items() if key != 'result_file'} for event in events]
+        }, ensure_ascii=False).encode('utf-8')
+        req = urllib.request.Request(
+            recipient,
+            data=body,
+            headers={'Content-Type': 'application/json', 'User-Agent': 'iframe-extractor-notifier'},
+            method='POST'
+        )
+        try:
+            with self._opener.open(req, timeout=timeout or self.timeout) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            # 重定向和4xx(429除外)重试也不会成功
+            if 300 <= e.code < 500 and e.code != 429:
+                raise PermanentDeliveryError(f"webhook返回 {e.code}") from e
+            raise
+
+    def close_idle(self):
+        pass
+
+    def close(self):
+        pass
+
+class NotificationSender:
+    """后台发送线程：定期领取到期的通知，按收件人合并发送"""
+
+    def __init__(self, outbox, transports, poll_interval=5, max_attempts=8, base_backoff=30, max_backoff=3600):
+        """
+        Args:
+            outbox: NotificationOutbox
+            transports: 传输方式列表(SmtpTransport、WebhookTransport等，按channel区分)
+            poll_interval: 检查到期通知的间隔(秒)
+            max_attempts: 最多发送次数，超过后放弃
+            base_backoff: 第一次重试的等待时间(秒)，之后每次翻倍
+            max_backoff: 重试等待时间上限(秒)
+        """
+        self.outbox = outbox
+        self.transports = {transport.channel: transport for transport in transports}
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._wake = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """启动发送线程(只启动一次)"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name='notification-sender')
+                self._thread.start()
+
+    def wake(self):
+        """有新的通知时提前检查"""
+        self._wake.set()
+
+    def backoff(self, attempts):
+        """第attempts次失败后的重试等待时间，加入随机抖动避免同时重试"""
+        return min(self.max_backoff, self.base_backoff * 2 ** attempts) * random.uniform(0.8, 1.2)
+
+    def deliver_due(self, deadline=None):
+        """
+        发送所有到期的通知
+
+        Args:
+            deadline: 发送必须结束的时间(time.time()的时间戳)，每次发送的超时时间不超过剩余时间；
+                      剩余时间不够时其余通知放回发件箱，之后再发送。为None时不限制
+
+        Returns:
+            dict: sent、retried、dead、deferred 为各结果的通知数量
+        """
+        summary = {'sent': 0, 'retried': 0, 'dead': 0, 'deferred': 0}
+        groups = {}
+        # 有截止时间时领取到截止时间为止，进程在截止时间被终止后这些通知可以马上被重新领取
+        claim_seconds = 300 if deadline is None else max(1, deadline - time.time())
+        for notification in self.outbox.claim_due(claim_seconds=claim_seconds):
+            groups.setdefault((notification['channel'], notification['recipient']), []).append(notification)
+
+        for (channel, recipient), notifications in groups.items():
+            ids = [notification['id'] for notification in notifications]
+            transport = self.transports.get(channel)
+            if transport is None:
+                self.outbox.mark_dead(ids, f"没有配置{channel}传输方式")
+                summary['dead'] += len(ids)
+                continue
+            timeout = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining < MIN_SEND_SECONDS:
+                    self.outbox.release(ids)
+                    summary['deferred'] += len(ids)
+                    continue
+                timeout = min(transport.timeout, remaining)
+            try:
+                transport.send(recipient, [notification['event'] for notification in notifications], timeout)
+            except PermanentDeliveryError as e:
+                self.outbox.mark_dead(ids, e)
+                summary['dead'] += len(ids)
+                continue
+            except Exception as e:
+                attempts = max(notification['attempts'] for notification in notifications) + 1
+                if attempts >= self.max_attempts:
+                    self.outbox.mark_dead(ids, e)
+                    summary['dead'] += len(ids)
+                else:
+                    self.outbox.mark_retry(ids, e, time.time() + self.backoff(attempts - 1))
+                    summary['retried'] += len(ids)
+                print(f"发送通知到 {recipient} 失败(第{attempts}次): {e}")
+                continue
+            self.outbox.mark_sent(ids)
+            summary['sent'] += len(ids)
+        return summary
+
+    def _run(self):
+        while True:
+            try:
+                summary = self.deliver_due()
+                if any(summary.values()):
+                    print(f"通知发送: {summary}")
+                for transport in self.transports.values():
+                    transport.close_idle()
+            except Exception as e:
+                print(f"通知发送线程出错: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+# 进程内共享的发件箱和发送线程
+_default_sender = None
+_default_sender_lock = threading.Lock()
+
+def get_notification_sender():
+    """获取进程内共享的发送线程(按环境变量配置传输方式)，第一次调用时才打开发件箱"""
+    global _default_sender
+    with _default_sender_lock:
+        if _default_sender is None:
+            outbox = NotificationOutbox(os.environ.get('NOTIFY_OUTBOX_PATH', DEFAULT_OUTBOX_PATH))
+            transports = [WebhookTransport()]
+            smtp = SmtpTransport.from_env()
+            if smtp is not None:
+                transports.append(smtp)
+            _default_sender = NotificationSender(
+                outbox,
+                transports,
+                max_attempts=int(os.environ.get('NOTIFY_MAX_ATTEMPTS', '8'))
+            )
+        return _default_sender
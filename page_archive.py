@@ -0,0 +1,528 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+原始页面归档
+
+爬取时把游戏页面的原始响应(URL、响应头、解压后的响应体、获取时间)追加写入WARC格式的归档文件，
+之后修改了提取规则时可以用reextract命令离线重新提取，不需要重新爬取。
+
+文件结构:
+    archive/pages-<时间>-<进程ID>-<序号>.warc.gz   每条记录是一个单独的gzip成员(与.warc.gz相同)，可以按偏移量单独解压
+    archive/pages-<时间>-<进程ID>-<序号>.cdxj      偏移索引，每行为 "URL 时间 {"offset": ..., "length": ..., ...}"
+
+每个进程写自己的文件，多个爬虫进程同时运行时不需要加锁；文件超过segment_bytes后换一个新文件。
+只追加写入，已有的记录不会被修改。写入中的文件带有排他的文件锁(flock)，index命令跳过这些文件。
+
+命令行:
+    python page_archive.py reextract [--workers N] [--output 文件] [--include_info tags,rating] [--update_cache]
+    python page_archive.py index     重新生成缺失或不完整的索引(如爬虫进程在写入索引前退出)，跳过正在写入的文件
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import uuid
+import zlib
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from extraction_cache import content_hash, page_content_hash
+
+# 默认归档目录，Vercel上只有/tmp可写
+if 'VERCEL' in os.environ:
+    DEFAULT_ARCHIVE_DIR = '/tmp/archive'
+else:
+    DEFAULT_ARCHIVE_DIR = 'archive'
+
+ARCHIVE_SUFFIX = '.warc.gz'
+INDEX_SUFFIX = '.cdxj'
+
+# 单个归档文件的大小上限
+DEFAULT_SEGMENT_BYTES = 256 * 1024 * 1024
+
+# 响应体已经解压，这些响应头不再适用
+SKIPPED_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length', 'connection')
+
+HTTP_REASONS = {200: 'OK', 301: 'Moved Permanently', 302: 'Found', 304: 'Not Modified', 404: 'Not Found'}
+
+# 重新提取时每个任务包含的记录数
+REEXTRACT_CHUNK_SIZE = 64
+
+# 没有文件锁(Windows)时，这段时间(秒)内修改过的归档文件视为正在写入
+ACTIVE_SEGMENT_SECONDS = 60
+
+OG_TITLE_PATTERN = re.compile(r'<meta[^>]*property="og:title"[^>]*content="([^"]*)"')
+
+def warc_date(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def index_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y%m%d%H%M%S')
+
+def build_record(url, body, status=200, headers=(), fetched_at=None):
+    """
+    生成一条WARC response记录(未压缩)
+
+    WARC-Payload-Digest为响应体的SHA-1(与提取结果缓存的页面哈希相同)
+
+    Args:
+        url: 页面URL
+        body: 解压后的响应体(bytes)
+        status: HTTP状态码
+        headers: 响应头的(名称, 值)列表
+        fetched_at: 获取时间(time.time()的时间戳)
+
+    Returns:
+        bytes: 记录内容
+    """
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    http_head = [f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}".rstrip()]
+    for name, value in headers:
+        if name.lower() not in SKIPPED_HEADERS:
+            http_head.append(f"{name}: {' '.join(str(value).split())}")
+    http_head.append(f"Content-Length: {len(body)}")
+    block = ('\r\n'.join(http_head) + '\r\n\r\n').encode('utf-8') + body
+    warc_head = [
+        'WARC/1.1',
+        'WARC-Type: response',
+        f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>',
+        f'WARC-Date: {warc_date(fetched_at)}',
+        f'WARC-Target-URI: {url}',
+        f'WARC-Payload-Digest: sha1:{content_hash(body)}',
+        'Content-Type: application/http;msgtype=response',
+        f'Content-Length: {len(block)}'
+    ]
+    return ('\r\n'.join(warc_head) + '\r\n\r\n').encode('utf-8') + block + b'\r\n\r\n'
+
+def parse_headers(lines):
+    headers = []
+    for line in lines:
+        name, _, value = line.partition(':')
+        headers.append((name.strip(), value.strip()))
+    return headers
+
+def parse_record(data):
+    """
+    解析一条未压缩的WARC记录
+
+    Returns:
+        dict: url、fetched_at、status、headers(响应头列表)、body(bytes)和digest
+    """
+    warc_end = data.index(b'\r\n\r\n')
+    warc_headers = dict(
+        (name.lower(), value)
+        for name, value in parse_headers(data[:warc_end].decode('utf-8').split('\r\n')[1:])
+    )
+    block_start = warc_end + 4
+    block = data[block_start:block_start + int(warc_headers['content-length'])]
+    http_end = block.index(b'\r\n\r\n')
+    http_lines = block[:http_end].decode('utf-8', 'replace').split('\r\n')
+    fetched_at = datetime.strptime(warc_headers['warc-date'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp()
+    return {
+        'url': warc_headers['warc-target-uri'],
+        'fetched_at': fetched_at,
+        'status': int(http_lines[0].split(' ')[1]),
+        'headers': parse_headers(http_lines[1:]),
+        'body': block[http_end + 4:],
+        'digest': warc_headers.get('warc-payload-digest', '').split(':', 1)[-1]
+    }
+
+def index_line(url, fetched_at, offset, length, status, digest):
+    entry = {'offset': offset, 'length': length, 'status': status, 'digest': digest}
+    return f"{url} {index_timestamp(fetched_at)} {json.dumps(entry, separators=(',', ':'))}\n"
+
+class PageArchive:
+    """
+    追加写入的页面归档，可以在多个线程中共享
+
+    用法:
+        archive = PageArchive('archive')
+        archive.append(url, body, response.status, response.headers.items())
+    """
+
+    def __init__(self, directory=DEFAULT_ARCHIVE_DIR, segment_bytes=DEFAULT_SEGMENT_BYTES, compresslevel=6):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.compresslevel = compresslevel
+        self.records = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._index = None
+        self._segment_count = 0
+        self.path = None
+
+    def append(self, url, body, status=200, headers=(), fetched_at=None):
+        """
+        追加一条响应记录
+
+        Returns:
+            tuple: (归档文件路径, 记录偏移量, 压缩后的长度)
+        """
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        record = build_record(url, body, status, headers, fetched_at)
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, 31)
+        member = compressor.compress(record) + compressor.flush()
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.segment_bytes:
+                self._open_segment()
+            offset = self._file.tell()
+            self._file.write(member)
+            self._file.flush()
+            # 索引在记录之后写入，进程在两者之间退出时可以用index命令重新生成
+            self._index.write(index_line(url, fetched_at, offset, len(member), status, content_hash(body)))
+            self._index.flush()
+            self.records += 1
+            return self.path, offset, len(member)
+
+    def open_files(self):
+        """正在写入的文件名，清理产物时不删除"""
+        with self._lock:
+            if self.path is None:
+                return set()
+            return {os.path.basename(self.path), os.path.basename(self.path)[:-len(ARCHIVE_SUFFIX)] + INDEX_SUFFIX}
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+    def _open_segment(self):
+        self._close_segment()
+        os.makedirs(self.directory, exist_ok=True)
+        self._segment_count += 1
+        name = f"pages-{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{self._segment_count}"
+        self.path = os.path.join(self.directory, name + ARCHIVE_SUFFIX)
+        self._file = open(self.path, 'ab')
+        if fcntl is not None:
+            # 关闭文件时释放，见segment_in_use
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        self._index = open(os.path.join(self.directory, name + INDEX_SUFFIX), 'a', encoding='utf-8')
+
+    def _close_segment(self):
+        if self._file is not None:
+            self._file.close()
+            self._index.close()
+            self._file = None
+            self._index = None
+
+def list_segments(directory=DEFAULT_ARCHIVE_DIR):
+    """目录中的归档文件路径，按文件名(即创建时间)排序"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith(ARCHIVE_SUFFIX)
+    )
+
+def segment_in_use(segment_path):
+    """归档文件是否还有爬虫进程在写入(最后一条记录可能还不完整)"""
+    if fcntl is None:
+        try:
+            return time.time() - os.path.getmtime(segment_path) < ACTIVE_SEGMENT_SECONDS
+        except OSError:
+            return False
+    with open(segment_path, 'rb') as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    return False
+
+def index_path(segment_path):
+    return segment_path[:-len(ARCHIVE_SUFFIX)] + INDEX_SUFFIX
+
+def read_index(segment_path):
+    """
+    读取归档文件的索引
+
+    Returns:
+        list: (URL, 获取时间字符串, 索引字典)，索引文件不存在时为空
+    """
+    entries = []
+    path = index_path(segment_path)
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split(' ', 2)
+            if len(parts) != 3:
+                continue
+            try:
+                entries.append((parts[0], parts[1], json.loads(parts[2])))
+            except ValueError:
+                # 写入中断的最后一行
+                continue
+    return entries
+
+def scan_segment(segment_path, chunk_size=65536):
+    """
+    按顺序读取归档文件中的每个gzip成员，不依赖索引
+
+    Yields:
+        tuple: (偏移量, 压缩后的长度, 记录dict)
+    """
+    with open(segment_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset < size:
+                decompressor = zlib.decompressobj(31)
+                parts = []
+                position = offset
+                while not decompressor.eof and position < size:
+                    chunk = data[position:position + chunk_size]
+                    parts.append(decompressor.decompress(chunk))
+                    position += len(chunk)
+                if not decompressor.eof:
+                    # 文件末尾不完整的记录
+                    return
+                length = position - offset - len(decompressor.unused_data)
+                yield offset, length, parse_record(b''.join(parts))
+                offset += length
+
+def rebuild_index(segment_path):
+    """
+    按归档文件的内容重新生成索引
+
+    Returns:
+        int: 记录数
+    """
+    count = 0
+    temp_path = index_path(segment_path) + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        for offset, length, record in scan_segment(segment_path):
+            f.write(index_line(record['url'], record['fetched_at'], offset, length, record['status'], record['digest']))
+            count += 1
+    os.replace(temp_path, index_path(segment_path))
+    return count
+
+def archive_entries(directory=DEFAULT_ARCHIVE_DIR, latest_only=True):
+    """
+    归档目录中所有记录的位置
+
+    Args:
+        latest_only: 同一个URL只保留最新获取的记录
+
+    Returns:
+        list: (归档文件路径, 偏移量, 长度)，按文件和偏移量排序以便顺序读取
+    """
+    latest = {}
+    entries = []
+    for segment_path in list_segments(directory):
+        for url, fetched, entry in read_index(segment_path):
+            if entry.get('status', 200) != 200:
+                continue
+            location = (segment_path, entry['offset'], entry['length'])
+            if not latest_only:
+                entries.append(location)
+            elif url not in latest or fetched >= latest[url][0]:
+                latest[url] = (fetched, location)
+    if latest_only:
+        entries = [location for _, location in latest.values()]
+    return sorted(entries)
+
+class ArchiveReader:
+    """通过内存映射读取归档记录，同一个文件只映射一次"""
+
+    def __init__(self):
+        self._maps = {}
+
+    def read(self, segment_path, offset, length):
+        data = self._maps.get(segment_path)
+        if data is None:
+            with open(segment_path, 'rb') as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[segment_path] = data
+        return parse_record(zlib.decompress(data[offset:offset + length], 31))
+
+    def close(self):
+        for data in self._maps.values():
+            data.close()
+        self._maps.clear()
+
+# 重新提取的工作进程中的读取器
+_worker_reader = None
+
+def _reextract_chunk(task):
+    """工作进程：重新提取一组记录"""
+    global _worker_reader
+    from iframe_scraper import extract_iframe_src
+    from page_metadata import extract_page_metadata
+    if _worker_reader is None:
+        _worker_reader = ArchiveReader()
+    locations, include_info = task
+    extracted = []
+    for segment_path, offset, length in locations:
+        try:
+            record = _worker_reader.read(segment_path, offset, length)
+            page = record['body'].decode('utf-8', 'replace')
+            iframe_src, extraction_method = extract_iframe_src(page)
+        except Exception as e:
+            extracted.append({'error': f"{segment_path}@{offset}: {e}"})
+            continue
+        result = {
+            'url': record['url'],
+            'page_hash': page_content_hash(page),
+            'fetched_at': record['fetched_at'],
+            'iframe_src': iframe_src,
+            'extracted_method': extraction_method
+        }
+        if iframe_src:
+            title = OG_TITLE_PATTERN.search(page)
+            if title:
+                result['title'] = title.group(1)
+            if include_info:
+                result.update(extract_page_metadata(page, include_info))
+        extracted.append(result)
+    return extracted
+
+def reextract(directory=DEFAULT_ARCHIVE_DIR, output=None, format_name='json', workers=None, include_info=(),
+              update_cache=False, latest_only=True):
+    """
+    用当前的提取规则重新提取归档中的所有页面
+
+    归档文件通过内存映射读取(多个工作进程共享系统的页缓存)，记录按REEXTRACT_CHUNK_SIZE条一组
+    分给进程池，不产生任何网络请求。
+
+    Args:
+        directory: 归档目录
+        output: 结果文件路径，为None时不写结果文件
+        format_name: 结果文件格式(result_writers中的名称)
+        workers: 进程数，默认为CPU核数
+        include_info: 同时提取的附加信息(见page_metadata.INFO_FIELDS)
+        update_cache: 把提取结果写入提取结果缓存，之后爬到内容相同的页面时直接使用
+        latest_only: 同一个URL只处理最新的记录
+
+    Returns:
+        dict: 统计信息
+    """
+    from page_metadata import info_fields
+    from result_writers import get_writer
+
+    started = time.time()
+    include_info = sorted(include_info or ())
+    locations = archive_entries(directory, latest_only)
+    tasks = [
+        (locations[i:i + REEXTRACT_CHUNK_SIZE], include_info)
+        for i in range(0, len(locations), REEXTRACT_CHUNK_SIZE)
+    ]
+    stats = {'records': len(locations), 'found': 0, 'missing': 0, 'errors': 0}
+
+    cache = None
+    extractor_version = None
+    if update_cache:
+        from extraction_cache import get_default_cache
+        from iframe_scraper import EXTRACTOR_VERSION as extractor_version
+        cache = get_default_cache(extractor_version)
+
+    writer = get_writer(format_name, output) if output else None
+    workers = workers or os.cpu_count() or 1
+    try:
+        with multiprocessing.Pool(workers) as pool:
+            for chunk in pool.imap_unordered(_reextract_chunk, tasks):
+                for result in chunk:
+                    if 'error' in result:
+                        stats['errors'] += 1
+                        print(f"读取记录失败: {result['error']}", file=sys.stderr)
+                        continue
+                    if cache is not None:
+                        cached = {key: value for key, value in result.items()
+                                  if key in ('iframe_src', 'extracted_method') or key in info_fields(include_info)}
+                        cached['include_info'] = include_info
+                        cache.put(result['url'], result['page_hash'], extractor_version, cached)
+                    if not result['iframe_src']:
+                        stats['missing'] += 1
+                        continue
+                    stats['found'] += 1
+                    if writer is not None:
+                        item = {'title': result.get('title'), 'game_url': result['url'], 'iframe_src': result['iframe_src'],
+                                'extracted_method': result['extracted_method'],
+                                'fetched_at': datetime.fromtimestamp(result['fetched_at']).isoformat()}
+                        item.update({field: result[field] for field in info_fields(include_info) if field in result})
+                        writer.write({key: value for key, value in item.items() if value is not None})
+    finally:
+        if writer is not None:
+            writer.close({'source': 'reextract', 'archive': directory, 'timestamp': datetime.now().isoformat()})
+    stats['workers'] = workers
+    stats['elapsed'] = round(time.time() - started, 2)
+    return stats
+
+# 进程内共享的默认归档
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+def archive_enabled():
+    """PAGE_ARCHIVE=0时不归档，Vercel上默认不归档"""
+    default = '0' if 'VERCEL' in os.environ else '1'
+    return os.environ.get('PAGE_ARCHIVE', default).lower() not in ('0', 'false', 'no', '')
+
+def get_default_archive():
+    """
+    获取进程内共享的默认归档(目录为PAGE_ARCHIVE_DIR，默认为archive)
+
+    Returns:
+        PageArchive: 归档被禁用时返回None
+    """
+    global _default_archive
+    if not archive_enabled():
+        return None
+    with _default_archive_lock:
+        if _default_archive is None:
+            _default_archive = PageArchive(os.environ.get('PAGE_ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR))
+        return _default_archive
+
+def main():
+    """重新提取归档或重新生成索引"""
+    from page_metadata import INFO_FIELDS, normalize_include_info
+    from result_writers import RESULT_FORMATS, output_path_for_format
+
+    parser = argparse.ArgumentParser(description='离线处理原始页面归档')
+    parser.add_argument('command', choices=['reextract', 'index'],
+                        help='reextract: 用当前的提取规则重新提取所有页面; index: 重新生成缺失或不完整的索引')
+    parser.add_argument('--archive', type=str, default=DEFAULT_ARCHIVE_DIR, help=f'归档目录，默认为{DEFAULT_ARCHIVE_DIR}')
+    parser.add_argument('--workers', type=int, default=None, help='进程数，默认为CPU核数')
+    parser.add_argument('--output', type=str, default=None, help='结果文件路径，默认为results/reextracted加上格式对应的扩展名')
+    parser.add_argument('--format', type=str, default='json', choices=list(RESULT_FORMATS), help='输出格式，默认为json')
+    parser.add_argument('--include_info', type=str, default=None,
+                        help=f"逗号分隔的附加信息（{','.join(INFO_FIELDS)}），默认不提取")
+    parser.add_argument('--update_cache', action='store_true', help='把提取结果写入提取结果缓存')
+    parser.add_argument('--all_records', action='store_true', help='处理同一URL的所有记录，默认只处理最新的一条')
+    args = parser.parse_args()
+
+    if args.command == 'index':
+        for segment_path in list_segments(args.archive):
+            if segment_in_use(segment_path):
+                print(f"{segment_path}: 正在写入，跳过")
+                continue
+            indexed = len(read_index(segment_path))
+            count = rebuild_index(segment_path)
+            print(f"{segment_path}: {count} 条记录{'' if count == indexed else f'（原索引 {indexed} 条）'}")
+        return
+
+    output = args.output or output_path_for_format(os.path.join('results', 'reextracted.json'), args.format)
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    stats = reextract(
+        args.archive, output, args.format, args.workers,
+        normalize_include_info(args.include_info, default=()), args.update_cache, not args.all_records
+    )
+    print(f"{stats['records']} 条记录，找到iframe源 {stats['found']} 个，未找到 {stats['missing']} 个，"
+          f"读取失败 {stats['errors']} 个；{stats['workers']} 个进程，耗时 {stats['elapsed']}秒")
+    print(f"结果已保存到 {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+游戏页面的附加信息提取
+
+从已经下载的游戏页面中一次遍历提取简介、缩略图、作者、标签、评分、嵌入尺寸、
+全屏/移动端标记和游戏信息面板(game_info_panel_widget)，不需要再次请求页面。
+
+需要提取的信息由include_info指定，只遍历到所需的信息都找到为止:
+    game_description - description
+    thumbnail_url    - thumbnail_url
+    author_info      - author, author_url
+    tags             - tags(列表)
+    rating           - rating(平均评分), rating_count(评分人数)
+    embed_info       - embed_width, embed_height, fullscreen, mobile_friendly
+    game_info        - game_info(信息面板的全部行，字典)
+"""
+
+import re
+import html
+
+INFO_FIELDS = {
+    'game_description': ('description',),
+    'thumbnail_url': ('thumbnail_url',),
+    'author_info': ('author', 'author_url'),
+    'tags': ('tags',),
+    'rating': ('rating', 'rating_count'),
+    'embed_info': ('embed_width', 'embed_height', 'fullscreen', 'mobile_friendly'),
+    'game_info': ('game_info',)
+}
+
+# 没有指定include_info时提取的信息(与之前的输出相同)
+DEFAULT_INCLUDE_INFO = ('game_description', 'thumbnail_url')
+
+# 需要信息面板才能得到的信息，移动端标记也参考面板中的平台和输入方式
+PANEL_INFO = ('author_info', 'tags', 'rating', 'game_info')
+PANEL_SCAN_INFO = PANEL_INFO + ('embed_info',)
+
+TAG_PATTERN = re.compile(r'<(/?)([a-zA-Z][a-zA-Z0-9]*)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>')
+ATTR_PATTERN = re.compile(r'([a-zA-Z_:][-a-zA-Z0-9_:.]*)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+)))?')
+STYLE_SIZE_PATTERN = re.compile(r'\b(width|height)\s*:\s*(\d+)px')
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+# 包含这些内容的标签才需要解析属性(在信息面板和简介之外)
+INTERESTING_ATTRS = re.compile(
+    r'game_description|game_thumb|og:image|html_embed|data-iframe|fullscreen_btn|mobile|game_info_panel_widget|itemprop'
+)
+
+# 内容不需要解析的元素
+RAW_TEXT_TAGS = ('script', 'style', 'textarea')
+RAW_TEXT_END = {tag: re.compile(f'</{tag}\\s*>', re.IGNORECASE) for tag in RAW_TEXT_TAGS}
+VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'))
+# 结束时在简介文字中换行的元素
+BLOCK_TAGS = frozenset(('p', 'div', 'br', 'li', 'tr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote', 'pre'))
+
+# 判断支持移动端的关键词(平台、输入方式和标签)
+MOBILE_KEYWORDS = ('android', 'ios', 'mobile', 'touchscreen', 'smartphone')
+
+def normalize_include_info(values, default=DEFAULT_INCLUDE_INFO):
+    """
+    把请求中的include_info(列表或逗号分隔的字符串)转换为排序后的信息名称列表
+
+    忽略不支持的名称；values为None时返回default
+    """
+    if values is None:
+        return sorted(default)
+    if isinstance(values, str):
+        values = values.split(',')
+    names = set()
+    for value in values:
+        name = str(value).strip().lower()
+        if name in INFO_FIELDS:
+            names.add(name)
+    return sorted(names)
+
+def info_fields(include_info):
+    """include_info对应的结果字段"""
+    return [field for name in include_info for field in INFO_FIELDS.get(name, ())]
+
+def parse_attrs(text):
+    """解析标签属性，属性名为小写，值已解码HTML实体；没有值的属性为空字符串"""
+    attrs = {}
+    for match in ATTR_PATTERN.finditer(text):
+        name = match.group(1).lower()
+        if name in attrs:
+            continue
+        value = match.group(2)
+        if value is None:
+            value = match.group(3)
+        if value is None:
+            value = match.group(4)
+        attrs[name] = html.unescape(value) if value else ''
+    return attrs
+
+def class_names(attrs):
+    return attrs.get('class', '').split()
+
+def parse_number(text, kind=float):
+    match = NUMBER_PATTERN.search(text or '')
+    if not match:
+        return None
+    try:
+        return kind(float(match.group(0)))
+    except ValueError:
+        return None
+
+def clean_text(parts):
+    """合并文字片段：解码实体，合并每行内的空白并去掉空行"""
+    text = html.unescape(''.join(parts))
+    lines = (' '.join(line.split()) for line in text.split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+def iframe_attrs(data_iframe):
+    """data-iframe属性中iframe标签的属性"""
+    match = re.search(r'<iframe\b([^>]*)>', data_iframe or '', re.IGNORECASE)
+    return parse_attrs(match.group(1)) if match else {}
+
+class _Capture:
+    """正在收集文字的元素"""
+
+    __slots__ = ('name', 'tag', 'depth', 'parts', 'links')
+
+    def __init__(self, name, tag):
+        self.name = name
+        self.tag = tag
+        self.depth = 1
+        self.parts = []
+        # (链接地址, 链接开始时parts的长度)
+        self.links = []
+
+class PageMetadataExtractor:
+    """
+    一次遍历页面中的标签提取附加信息
+
+    用法:
+        PageMetadataExtractor(['tags', 'rating']).extract(page_html)
+    """
+
+    def __init__(self, include_info=DEFAULT_INCLUDE_INFO):
+        self.include_info = frozenset(name for name in include_info if name in INFO_FIELDS)
+
+    def extract(self, page_html):
+        """
+        Returns:
+            dict: 找到的字段，没有找到的字段不包含在内
+        """
+        wanted = self.include_info
+        if not wanted or not page_html:
+            return {}
+        self._reset(wanted)
+        pos = 0
+        length = len(page_html)
+        text_start = 0
+        while pos < length and not self._complete():
+            match = TAG_PATTERN.search(page_html, pos)
+            if not match:
+                break
+            if self._captures and match.start() > text_start:
+                self._text(page_html[text_start:match.start()])
+            pos = text_start = match.end()
+            closing, tag, attr_text = match.group(1), match.group(2).lower(), match.group(3)
+            if closing:
+                self._end(tag)
+                continue
+            self._start(tag, attr_text)
+            if tag in RAW_TEXT_TAGS:
+                # 跳过脚本和样式的内容
+                end = RAW_TEXT_END[tag].search(page_html, pos)
+                pos = text_start = end.start() if end else length
+        return self._result()
+
+    def _reset(self, wanted):
+        self._pending = set(wanted)
+        self._fields = {}
+        self._captures = []
+        self._embed_seen = False
+        self._in_panel = False
+        self._panel_depth = 0
+        self._panel_rows = {}
+        self._row_cells = None
+        self._mobile_hints = []
+
+    def _complete(self):
+        """所需的信息都已找到"""
+        return not self._pending and not self._captures
+
+    def _done(self, name):
+        self._pending.discard(name)
+
+    # 标签处理
+
+    def _start(self, tag, attr_text):
+        if not self._captures and not self._in_panel and not INTERESTING_ATTRS.search(attr_text):
+            # 大部分标签与所需信息无关，不解析属性
+            return
+        attrs = parse_attrs(attr_text) if attr_text.strip() else {}
+        classes = class_names(attrs)
+        void = tag in VOID_TAGS or attr_text.rstrip().endswith('/')
+
+        for capture in self._captures:
+            if capture.tag == tag and not void:
+                capture.depth += 1
+            if tag == 'a' and 'href' in attrs:
+                capture.links.append((attrs['href'], len(capture.parts)))
+            if tag == 'br':
+                capture.parts.append('\n')
+
+        if 'game_description' in self._pending and tag == 'div' and 'game_description' in classes:
+            self._captures.append(_Capture('description', tag))
+
+        if 'thumbnail_url' in self._pending and tag == 'img' and 'game_thumb' in classes and attrs.get('src'):
+            self._fields['thumbnail_url'] = attrs['src']
+            self._done('thumbnail_url')
+        elif tag == 'meta' and attrs.get('property') == 'og:image' and attrs.get('content'):
+            # 没有game_thumb图片时使用og:image
+            self._fields.setdefault('og_image', attrs['content'])
+
+        if 'embed_info' in self._pending:
+            self._embed_start(tag, attrs, classes)
+
+        if self._in_panel or not self._pending.isdisjoint(PANEL_SCAN_INFO):
+            self._panel_start(tag, attrs, classes, void)
+
+    def _end(self, tag):
+        if tag in BLOCK_TAGS:
+            for capture in self._captures:
+                capture.parts.append('\n')
+        for capture in list(self._captures):
+            if capture.tag != tag:
+                continue
+            capture.depth -= 1
+            if capture.depth == 0:
+                self._captures.remove(capture)
+                self._finish_capture(capture)
+
+        if self._in_panel and tag == 'div':
+            self._panel_depth -= 1
+            if self._panel_depth == 0:
+                self._finish_panel()
+        elif self._in_panel and tag == 'tr' and self._row_cells is not None:
+            self._finish_row()
+
+    def _text(self, text):
+        for capture in self._captures:
+            capture.parts.append(text)
+
+    def _finish_capture(self, capture):
+        if capture.name == 'description':
+            description = clean_text(capture.parts)
+            if description:
+                self._fields['description'] = description
+            self._done('game_description')
+        elif capture.name == 'cell' and self._row_cells is not None:
+            self._row_cells.append({'text': clean_text(capture.parts), 'links': self._link_texts(capture)})
+        elif capture.name == 'rating_count':
+            count = parse_number(clean_text(capture.parts).replace(',', ''), int)
+            if count is not None:
+                self._fields['rating_count'] = count
+
+    @staticmethod
+    def _link_texts(capture):
+        """单元格中各链接的文字和地址，链接的文字到下一个链接开始或换行为止"""
+        links = capture.links
+        result = []
+        for position, (href, index) in enumerate(links):
+            end = links[position + 1][1] if position + 1 < len(links) else len(capture.parts)
+            text = clean_text(capture.parts[index:end]).split('\n')[0].rstrip(', ')
+            result.append({'text': text, 'href': href})
+        return result
+
+    # 嵌入信息
+
+    def _embed_start(self, tag, attrs, classes):
+        fields = self._fields
+        if tag == 'div' and (attrs.get('id', '').startswith('html_embed') or 'html_embed_widget' in classes):
+            for name, value in STYLE_SIZE_PATTERN.findall(attrs.get('style', '')):
+                fields.setdefault(f'embed_{name}', int(value))
+        if 'data-iframe' in attrs and not self._embed_seen:
+            self._embed_seen = True
+            frame = iframe_attrs(attrs['data-iframe'])
+            for name in ('width', 'height'):
+                value = parse_number(attrs.get(f'data-{name}') or frame.get(name), int)
+                if value:
+                    fields[f'embed_{name}'] = value
+            if 'allowfullscreen' in frame or 'webkitallowfullscreen' in frame or 'mozallowfullscreen' in frame:
+                fields['fullscreen'] = True
+        if 'fullscreen_btn' in classes:
+            fields['fullscreen'] = True
+        if 'mobile_friendly' in classes or 'data-mobile' in attrs or attrs.get('name') == 'itch:mobile-friendly':
+            fields['mobile_friendly'] = True
+
+    # 信息面板
+
+    def _panel_start(self, tag, attrs, classes, void):
+        if not self._in_panel:
+            if tag == 'div' and 'game_info_panel_widget' in classes:
+                self._in_panel = True
+                self._panel_depth = 1
+            return
+        if tag == 'div' and not void:
+            self._panel_depth += 1
+        if tag == 'tr':
+            self._row_cells = []
+        elif tag == 'td' and self._row_cells is not None:
+            self._captures.append(_Capture('cell', tag))
+        elif 'aggregate_rating' in classes:
+            rating = parse_number(attrs.get('title') or attrs.get('data-rating'))
+            if rating is not None:
+                self._fields['rating'] = rating
+        elif 'rating_count' in classes and not void:
+            self._captures.append(_Capture('rating_count', tag))
+        elif tag == 'meta' and attrs.get('itemprop') in ('ratingValue', 'ratingCount') and attrs.get('content'):
+            field = 'rating' if attrs['itemprop'] == 'ratingValue' else 'rating_count'
+            self._fields.setdefault(field, parse_number(attrs['content'], float if field == 'rating' else int))
+
+    def _finish_row(self):
+        cells = self._row_cells
+        self._row_cells = None
+        if len(cells) < 2:
+            return
+        label = cells[0]['text']
+        if label:
+            self._panel_rows[label] = cells[1]
+
+    def _finish_panel(self):
+        self._in_panel = False
+        rows = self._panel_rows
+        fields = self._fields
+        for label, cell in rows.items():
+            key = label.lower()
+            if key in ('author', 'authors'):
+                if cell['links']:
+                    fields['author'] = ', '.join(link['text'] for link in cell['links'] if link['text'])
+                    fields['author_url'] = cell['links'][0]['href']
+                elif cell['text']:
+                    fields['author'] = cell['text']
+            elif key == 'tags':
+                fields['tags'] = [link['text'] for link in cell['links'] if link['text']] or \
+                    [tag.strip() for tag in cell['text'].split(',') if tag.strip()]
+            elif key == 'rating':
+                if 'rating' not in fields:
+                    fields['rating'] = parse_number(cell['text'])
+                count = re.search(r'\((\d[\d,]*)\s', cell['text'])
+                if count:
+                    fields['rating_count'] = int(count.group(1).replace(',', ''))
+            if key in ('platforms', 'inputs', 'tags') and any(word in cell['text'].lower() for word in MOBILE_KEYWORDS):
+                self._mobile_hints.append(label)
+        fields['game_info'] = {label: cell['text'] for label, cell in rows.items()}
+        # 信息面板在嵌入区域之后，面板结束时嵌入信息也已经找到
+        for name in PANEL_SCAN_INFO:
+            self._done(name)
+
+    def _result(self):
+        fields = self._fields
+        wanted = self.include_info
+        if 'thumbnail_url' in wanted and 'thumbnail_url' not in fields and fields.get('og_image'):
+            fields['thumbnail_url'] = fields['og_image']
+        if 'embed_info' in wanted:
+            if self._mobile_hints:
+                fields['mobile_friendly'] = True
+            if fields.get('embed_width') or fields.get('embed_height') or self._embed_seen:
+                fields.setdefault('fullscreen', False)
+                fields.setdefault('mobile_friendly', False)
+        allowed = info_fields(sorted(wanted))
+        return {name: fields[name] for name in allowed if fields.get(name) not in (None, '', [], {})}
+
+def extract_page_metadata(page_html, include_info=DEFAULT_INCLUDE_INFO):
+    """从游戏页面中提取include_info指定的信息"""
+    return PageMetadataExtractor(include_info).extract(page_html)
@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+解析进程池
+
+爬虫的I/O线程获取页面后，把页面内容交给进程池解析(iframe源的正则匹配、html.unescape、
+附加信息提取和列表页解析)，解析不再与I/O线程争用GIL，多核机器上可以同时使用所有CPU核。
+
+页面内容通过预先分配的共享内存槽传给解析进程，避免pickle大字符串；没有空闲的槽、
+页面超过槽大小或系统不支持共享内存时改为直接传递。
+
+解析进程运行的函数必须是可以导入的模块级函数(本文件和iframe_scraper.py中的解析函数)，
+不能依赖server.py。
+
+进程数由PARSE_WORKERS设置，默认为可用的CPU核数；只有一个核或PARSE_WORKERS=0时不使用进程池，
+Vercel上默认不使用(没有/dev/shm)。命令行爬虫(iframe_scraper.py)用--parse_workers设置，
+服务器启动的爬虫子进程平分这些进程。
+"""
+
+import os
+import re
+import atexit
+import html
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from page_metadata import PageMetadataExtractor, extract_page_metadata
+
+# 每个共享内存槽的大小，超过的页面直接传递
+SHARED_SLOT_BYTES = 2 * 1024 * 1024
+
+def find_iframe_src(game_page_html, game_url):
+    """
+    从游戏页面中提取iframe源
+    
+    Args:
+        game_page_html: 游戏页面HTML内容
+        game_url: 游戏URL，用于日志
+        
+    Returns:
+        tuple: (iframe源URL, 提取方法)，没有找到时iframe源为None
+    """
+    iframe_src = None
+    extraction_method = ""
+    
+    print("------------------------------")
+    print(f"开始提取iframe源 - {game_url}")
+    
+    # 方法1: 检查html_embed区域中的iframe标签
+    if not iframe_src:
+        try:
+            print("尝试方法1: html_embed > iframe")
+            match = re.search(r'<div[^>]*id=["\'](html_embed_content|html_embed)["\']\s*[^>]*>[\s\S]*?<iframe[^>]*src=["\'](.*?)["\']', game_page_html, re.DOTALL)
+            if match:
+                iframe_src = html.unescape(match.group(2))
+                extraction_method = "html_embed_iframe"
+                print(f"方法1成功: {iframe_src}")
+            else:
+                print("方法1未找到匹配")
+        except Exception as e:
+            print(f"方法1出错: {e}")
+    
+    # 方法2: 检查html_embed区域中的data-iframe属性
+    if not iframe_src:
+        try:
+            print("尝试方法2: html_embed > data-iframe")
+            match = re.search(r'<div[^>]*id=["\'](html_embed_content|html_embed)["\']\s*[^>]*data-iframe=["\']([^"\']+)["\']', game_page_html)
+            if match:
+                iframe_src = html.unescape(match.group(2))
+                extraction_method = "html_embed_data_iframe"
+                print(f"方法2成功: {iframe_src}")
+            else:
+                print("方法2未找到匹配")
+        except Exception as e:
+            print(f"方法2出错: {e}")
+    
+    # 方法3: 检查iframe_placeholder元素
+    if not iframe_src:
+        try:
+            print("尝试方法3: iframe_placeholder")
+            match = re.search(r'<div[^>]*class=["\'](iframe_placeholder)["\']\s*[^>]*data-iframe=["\']([^"\']+)["\']', game_page_html)
+            if match:
+                iframe_src = html.unescape(match.group(2))
+                extraction_method = "iframe_placeholder"
+                print(f"方法3成功: {iframe_src}")
+            else:
+                print("方法3未找到匹配")
+        except Exception as e:
+            print(f"方法3出错: {e}")
+    
+    # 方法4: 查找包含id="game_drop"的区域
+    if not iframe_src:
+        try:
+            print("尝试方法4: game_drop区域")
+            match = re.search(r'<div[^>]*id=["\'](game_drop)["\']\s*[^>]*>[\s\S]*?data-iframe=["\'](.*?)["\']', game_page_html, re.DOTALL)
+            if match:
+                iframe_src = html.unescape(match.group(2))
+                extraction_method = "game_drop"
+                print(f"方法4成功: {iframe_src}")
+            else:
+                print("方法4未找到匹配")
+        except Exception as e:
+            print(f"方法4出错: {e}")
+    
+    # 方法5: 直接搜索data-iframe属性，不限制元素类型
+    if not iframe_src:
+        try:
+            print("尝试方法5: 全局data-iframe搜索")
+            match = re.search(r'data-iframe=["\']([^"\']+)["\']', game_page_html)
+            if match:
+                iframe_src = html.unescape(match.group(1))
+                extraction_method = "global_data_iframe"
+                print(f"方法5成功: {iframe_src}")
+            else:
+                print("方法5未找到匹配")
+        except Exception as e:
+            print(f"方法5出错: {e}")
+    
+    # 方法6: 搜索嵌入式iframe
+    if not iframe_src:
+        try:
+            print("尝试方法6: 嵌入式iframe")
+            match = re.search(r'<iframe[^>]*src=["\']([^"\']+)["\'][^>]*class=["\'](game_frame)["\']', game_page_html)
+            if match:
+                iframe_src = html.unescape(match.group(1))
+                extraction_method = "embedded_iframe"
+                print(f"方法6成功: {iframe_src}")
+            else:
+                print("方法6未找到匹配")
+        except Exception as e:
+            print(f"方法6出错: {e}")
+    
+    # 尝试清理和验证提取的URL
+    if iframe_src:
+        # 移除可能的换行符和多余空格
+        iframe_src = iframe_src.strip().replace('\n', '').replace('\r', '')
+        
+        # 如果iframe源不是URL格式，但包含完整的iframe标签，则尝试从中提取src
+        if '<iframe' in iframe_src and 'src=' in iframe_src:
+            try:
+                print("从完整iframe标签中提取src")
+                tag_match = re.search(r'src=["\']([^"\']+)["\']', iframe_src)
+                if tag_match:
+                    iframe_src = html.unescape(tag_match.group(1))
+                    print(f"从标签中提取成功: {iframe_src}")
+            except Exception as e:
+                print(f"从标签提取失败: {e}")
+
+        # 检查提取的URL是否有效
+        is_valid = iframe_src.startswith(('http://', 'https://', '//', '/')) and len(iframe_src) > 10
+        print(f"URL验证: {'有效' if is_valid else '无效'} - {iframe_src}")
+        
+        if not is_valid:
+            iframe_src = None
+            extraction_method = ""
+            print("提取的URL无效，设置为None")
+    
+    if iframe_src:
+        print(f"成功提取iframe源: {iframe_src}")
+        print(f"提取方法: {extraction_method}")
+    else:
+        print("所有方法均未找到iframe源")
+        
+    print("------------------------------")
+    
+    return iframe_src, extraction_method
+
+
+def parse_game_page(game_page_html, game_url, include_info):
+    """
+    从游戏页面中提取iframe源和include_info指定的附加信息
+
+    附加信息(简介、缩略图、作者、标签、评分、嵌入尺寸等)在一次遍历中提取，
+    不需要为了这些信息再次请求页面。
+
+    Args:
+        game_page_html: 游戏页面HTML内容
+        game_url: 游戏URL，用于日志
+        include_info: 需要提取的附加信息(见page_metadata.INFO_FIELDS)
+
+    Returns:
+        dict: 提取结果，没有找到iframe源时iframe_src为None；include_info记录提取了哪些附加信息
+    """
+    iframe_src, extraction_method = find_iframe_src(game_page_html, game_url)
+    extracted = {
+        "iframe_src": iframe_src,
+        "extracted_method": extraction_method,
+        "include_info": list(include_info)
+    }
+    if not iframe_src:
+        return extracted
+
+    try:
+        extracted.update(PageMetadataExtractor(include_info).extract(game_page_html))
+    except Exception as e:
+        print(f"提取附加信息失败: {e}")
+
+    return extracted
+
+def parse_scraper_page(html_content, include_info):
+    """
+    命令行爬虫(iframe_scraper.py)的解析函数：iframe_scraper.extract_iframe_src和附加信息
+
+    Returns:
+        dict: 与iframe_scraper.extract_game_page相同的提取结果
+    """
+    # iframe_scraper导入了本模块，在函数中导入避免循环导入
+    from iframe_scraper import extract_iframe_src
+    iframe_src, extraction_method = extract_iframe_src(html_content)
+    extracted = {
+        'iframe_src': iframe_src,
+        'extracted_method': extraction_method,
+        'include_info': list(include_info)
+    }
+    if iframe_src and include_info:
+        extracted.update(extract_page_metadata(html_content, include_info))
+    return extracted
+
+# 解析进程中已经连接的共享内存槽
+_attached_slots = {}
+
+def _attach_slot(name):
+    slot = _attached_slots.get(name)
+    if slot is None:
+        try:
+            # 由主进程负责删除共享内存，解析进程不登记到resource_tracker(Python 3.13+)
+            slot = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            slot = shared_memory.SharedMemory(name=name)
+        _attached_slots[name] = slot
+    return slot
+
+def _run_shared(func, slot_name, size, args):
+    """解析进程：从共享内存槽读取页面后调用func"""
+    page = bytes(_attach_slot(slot_name).buf[:size]).decode('utf-8')
+    return func(page, *args)
+
+def _run_direct(func, data, args):
+    """解析进程：页面直接随任务传递"""
+    return func(data.decode('utf-8'), *args)
+
+def completed_future(value):
+    """已经完成的Future，用于不需要解析的结果(如命中缓存)"""
+    future = Future()
+    future.set_result(value)
+    return future
+
+def available_cpus():
+    """当前进程可以使用的CPU核数(容器中可能少于os.cpu_count())"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+def process_context():
+    """
+    创建解析进程的方式
+
+    支持forkserver时使用forkserver：服务器是多线程进程，直接fork可能死锁。
+    forkserver预先导入解析模块，解析进程从它fork，不需要各自导入；
+    不预先导入主模块，避免在forkserver中执行server.py的模块级初始化
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['parse_pool', 'iframe_scraper'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+class ParsePool:
+    """
+    解析进程池
+
+    用法:
+        pool = ParsePool(4)
+        future = pool.submit(parse_game_page, page_html, game_url, include_info)
+        extracted = future.result()
+    """
+
+    def __init__(self, workers=None, slot_bytes=SHARED_SLOT_BYTES, slots=None):
+        """
+        Args:
+            workers: 解析进程数，默认为可用的CPU核数
+            slot_bytes: 每个共享内存槽的大小
+            slots: 共享内存槽的数量，默认为进程数的两倍(每个进程解析一个页面的同时准备下一个)
+        """
+        self.workers = workers or available_cpus()
+        self.slot_bytes = slot_bytes
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=process_context())
+        self._free_slots = queue.Queue()
+        self._all_slots = []
+        self._stats_lock = threading.Lock()
+        self._stats = {'tasks': 0, 'shared_memory': 0, 'direct': 0, 'bytes': 0}
+        for _ in range(slots or self.workers * 2):
+            try:
+                slot = shared_memory.SharedMemory(create=True, size=slot_bytes)
+            except OSError as e:
+                print(f"无法创建共享内存，页面改为直接传给解析进程: {e}")
+                break
+            self._all_slots.append(slot)
+            self._free_slots.put(slot)
+
+    def submit(self, func, page, *args):
+        """
+        在解析进程中调用func(page, *args)
+
+        Args:
+            func: 模块级的解析函数
+            page: 页面内容(str或bytes)
+
+        Returns:
+            Future: 解析结果
+        """
+        data = page.encode('utf-8') if isinstance(page, str) else page
+        slot = None
+        if len(data) <= self.slot_bytes:
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                slot = None
+        with self._stats_lock:
+            self._stats['tasks'] += 1
+            self._stats['bytes'] += len(data)
+            self._stats['shared_memory' if slot is not None else 'direct'] += 1
+        if slot is None:
+            return self._executor.submit(_run_direct, func, data, args)
+
+        slot.buf[:len(data)] = data
+        try:
+            future = self._executor.submit(_run_shared, func, slot.name, len(data), args)
+        except Exception:
+            self._free_slots.put(slot)
+            raise
+        # 解析进程读取完成后槽才能再次使用
+        future.add_done_callback(lambda _: self._free_slots.put(slot))
+        return future
+
+    def parse(self, func, page, *args):
+        """在解析进程中调用func并等待结果"""
+        return self.submit(func, page, *args).result()
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, workers=self.workers, slots=len(self._all_slots))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        for slot in self._all_slots:
+            slot.close()
+            try:
+                slot.unlink()
+            except FileNotFoundError:
+                pass
+        self._all_slots = []
+
+def run_parser(pool, func, page, *args):
+    """
+    有进程池时在解析进程中调用func，否则在当前线程中调用
+
+    Returns:
+        Future: 解析结果(没有进程池时已经完成)
+    """
+    if pool is None:
+        return completed_future(func(page, *args))
+    return pool.submit(func, page, *args)
+
+# 进程内共享的默认进程池
+_default_pool = None
+_default_pool_failed = False
+_default_pool_lock = threading.Lock()
+
+def configured_workers():
+    """PARSE_WORKERS设置的进程数，默认为可用的CPU核数，Vercel上默认为0(没有/dev/shm)"""
+    default = '0' if 'VERCEL' in os.environ else str(available_cpus())
+    try:
+        return max(0, int(os.environ.get('PARSE_WORKERS', default)))
+    except ValueError:
+        return 0
+
+def get_parse_pool(workers=None):
+    """
+    获取进程内共享的解析进程池，第一次调用时才启动解析进程
+
+    Args:
+        workers: 解析进程数，默认为configured_workers()
+
+    Returns:
+        ParsePool: 进程数少于2或无法启动时返回None，调用方在当前线程中解析
+    """
+    global _default_pool, _default_pool_failed
+    workers = configured_workers() if workers is None else workers
+    if workers < 2:
+        return None
+    with _default_pool_lock:
+        if _default_pool is None and not _default_pool_failed:
+            try:
+                _default_pool = ParsePool(workers)
+            except Exception as e:
+                print(f"无法启动解析进程池，改为在当前线程中解析: {e}")
+                _default_pool_failed = True
+                return None
+            # 退出时结束解析进程并删除共享内存
+            atexit.register(_default_pool.shutdown)
+        return _default_pool
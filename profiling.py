@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+性能分析
+
+三种模式:
+    sample   - 采样分析(默认)：后台线程定期记录所有线程的调用栈，开销很小，
+               可以看到爬虫线程的时间花在正则匹配、html.unescape、JSON序列化还是等待网络上
+    cprofile - cProfile确定性分析：只记录调用start()的线程，保存.prof文件(可用snakeviz等工具查看)和文字摘要
+    memory   - tracemalloc内存快照：按分配位置的调用栈统计仍在使用的内存
+
+sample和memory模式生成折叠栈格式(collapsed stacks)的文件，每行为"栈帧;栈帧;... 数值"，
+可以直接交给flamegraph.pl或speedscope生成火焰图。
+"""
+
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+
+PROFILE_MODES = ('sample', 'cprofile', 'memory')
+
+# 默认采样间隔(秒)
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+def normalize_profile_mode(value):
+    """把请求中的profile参数转换为分析模式，True表示sample，不需要分析时返回None"""
+    if value is True:
+        return 'sample'
+    if isinstance(value, str) and value.strip().lower() in PROFILE_MODES:
+        return value.strip().lower()
+    return None
+
+def profile_paths(prefix, mode):
+    """分析模式生成的文件"""
+    if mode == 'cprofile':
+        return [f"{prefix}.cprofile.prof", f"{prefix}.cprofile.txt"]
+    return [f"{prefix}.{mode}.collapsed", f"{prefix}.{mode}.txt"]
+
+def short_filename(filename):
+    """文件名，包的__init__.py带上包名(如re/__init__.py)"""
+    name = os.path.basename(filename)
+    if name == '__init__.py':
+        return os.path.basename(os.path.dirname(filename)) + '/' + name
+    return name
+
+def frame_label(code):
+    """栈帧的名称，如 extract_iframe_src (iframe_scraper.py:140)"""
+    return f"{code.co_name} ({short_filename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """定期记录所有线程的调用栈"""
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True, name='profiler-sampler')
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def collapsed(self):
+        """
+        Returns:
+            dict: 折叠栈 -> 采样次数
+        """
+        return dict(self._stacks)
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(thread_id, f"thread-{thread_id}"))
+                stack = ';'.join(reversed(labels))
+                self._stacks[stack] = self._stacks.get(stack, 0) + 1
+            self.samples += 1
+
+class Profiler:
+    """
+    按模式运行一次性能分析，stop()时把结果写入 <prefix>.<mode>.* 文件
+
+    用法:
+        profiler = Profiler('sample', 'results/job_xxx')
+        profiler.start()
+        ...
+        files = profiler.stop()
+    """
+
+    def __init__(self, mode='sample', prefix=None, interval=DEFAULT_SAMPLE_INTERVAL):
+        """
+        Args:
+            mode: 'sample'、'cprofile' 或 'memory'
+            prefix: 输出文件的路径前缀，为None时不写文件(只通过collapsed_text()获取结果)
+            interval: sample模式的采样间隔(秒)
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的分析模式: {mode}")
+        self.mode = mode
+        self.prefix = prefix
+        self.interval = interval
+        self.started_at = None
+        self.elapsed = 0
+        self._sampler = None
+        self._cprofile = None
+        self._started_tracemalloc = False
+        self._baseline = None
+        self._collapsed = {}
+        self._summary = ''
+
+    def start(self):
+        self.started_at = time.time()
+        if self.mode == 'sample':
+            self._sampler = SamplingProfiler(self.interval)
+            self._sampler.start()
+        elif self.mode == 'cprofile':
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(25)
+                self._started_tracemalloc = True
+            self._baseline = tracemalloc.take_snapshot()
+        return self
+
+    def stop(self):
+        """
+        结束分析并写入结果文件
+
+        Returns:
+            list: 写入的文件路径
+        """
+        self.elapsed = time.time() - self.started_at
+        if self.mode == 'sample':
+            self._sampler.stop()
+            self._collapsed = self._sampler.collapsed()
+            self._summary = self._top_frames_summary()
+        elif self.mode == 'cprofile':
+            self._cprofile.disable()
+        else:
+            self._stop_memory()
+
+        if self.prefix is None:
+            return []
+        directory = os.path.dirname(self.prefix)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        paths = profile_paths(self.prefix, self.mode)
+        if self.mode == 'cprofile':
+            self._cprofile.dump_stats(paths[0])
+            with open(paths[1], 'w', encoding='utf-8') as f:
+                stats = pstats.Stats(self._cprofile, stream=f)
+                f.write(f"耗时 {self.elapsed:.2f}秒 (只包含调用start()的线程)\n\n")
+                stats.sort_stats('cumulative').print_stats(60)
+                stats.sort_stats('tottime').print_stats(30)
+        else:
+            with open(paths[0], 'w', encoding='utf-8') as f:
+                f.write(self.collapsed_text())
+            with open(paths[1], 'w', encoding='utf-8') as f:
+                f.write(self._summary)
+        return paths
+
+    def collapsed_text(self):
+        """折叠栈格式的结果(cprofile模式为空)"""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self._collapsed.items()))
+
+    def summary(self):
+        """文字摘要"""
+        return self._summary
+
+    def _top_frames_summary(self, limit=40):
+        """采样中出现在栈顶(自身耗时)和出现在栈中(累计耗时)最多的函数"""
+        total = sum(self._collapsed.values()) or 1
+        own = {}
+        cumulative = {}
+        for stack, count in self._collapsed.items():
+            frames = stack.split(';')[1:]
+            if not frames:
+                continue
+            own[frames[-1]] = own.get(frames[-1], 0) + count
+            for frame in set(frames):
+                cumulative[frame] = cumulative.get(frame, 0) + count
+        lines = [f"耗时 {self.elapsed:.2f}秒，采样 {self._sampler.samples} 次，间隔 {self.interval}秒", "", "自身耗时:"]
+        for frame, count in sorted(own.items(), key=lambda item: -item[1])[:limit]:
+            lines.append(f"  {count / total * 100:6.2f}%  {frame}")
+        lines.extend(["", "累计耗时:"])
+        for frame, count in sorted(cumulative.items(), key=lambda item: -item[1])[:limit]:
+            lines.append(f"  {count / total * 100:6.2f}%  {frame}")
+        return '\n'.join(lines) + '\n'
+
+    def _stop_memory(self, limit=40):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>')
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        # 按分配位置的完整调用栈统计，数值为字节数
+        for stat in snapshot.statistics('traceback'):
+            stack = ';'.join(f"{short_filename(frame.filename)}:{frame.lineno}" for frame in stat.traceback)
+            self._collapsed[stack] = self._collapsed.get(stack, 0) + stat.size
+
+        lines = [
+            f"耗时 {self.elapsed:.2f}秒，当前跟踪的内存 {current / 1024:.1f} KB，峰值 {peak / 1024:.1f} KB",
+            "",
+            "按分配位置(当前占用):"
+        ]
+        for stat in snapshot.statistics('lineno')[:limit]:
+            lines.append(f"  {stat.size / 1024:10.1f} KB  {stat.count:8d} 个  {stat.traceback[0]}")
+        lines.extend(["", "分析期间的增长:"])
+        for stat in snapshot.compare_to(self._baseline, 'lineno')[:limit]:
+            lines.append(f"  {stat.size_diff / 1024:+10.1f} KB  {stat.count_diff:+8d} 个  {stat.traceback[0]}")
+        self._summary = '\n'.join(lines) + '\n'
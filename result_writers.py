@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+结果文件格式
+
+支持的格式:
+- json      JSON数组(默认，与之前的输出相同)
+- ndjson    gzip压缩的NDJSON，每行一个结果
+- csv       CSV表格(UTF-8 BOM，可以直接用Excel打开)
+- columnar  仅依赖标准库的列式二进制格式，每列单独压缩，可以只读取需要的列
+- parquet   Parquet列式格式，需要安装可选依赖pyarrow
+"""
+
+import csv
+import json
+import gzip
+import zlib
+import struct
+import importlib.util
+
+# 常见字段在CSV等表格格式中的列顺序，其余字段排在后面
+RESULT_FIELDS = [
+    'position', 'title', 'url', 'game_url', 'game_id', 'iframe_src',
+    'extracted_method', 'timestamp', 'description', 'thumbnail_url', 'author', 'author_url',
+    'tags', 'rating', 'rating_count', 'embed_width', 'embed_height', 'fullscreen', 'mobile_friendly'
+]
+
+COLUMNAR_MAGIC = b'IFCOL\x01'
+
+def normalize_result(result, url_field='game_url'):
+    """
+    把结果的游戏URL字段统一为url_field
+
+    服务器在Vercel上爬取的结果使用url字段，命令行和工作节点的结果使用game_url字段，
+    合并不同来源的结果时先统一字段名。
+    """
+    other = 'url' if url_field == 'game_url' else 'game_url'
+    if other not in result:
+        return result
+    result = dict(result)
+    value = result.pop(other)
+    result.setdefault(url_field, value)
+    return result
+
+class ResultWriter:
+    """结果写入器基类，逐个写入结果字典，close时写入元数据"""
+
+    name = None
+    extension = None
+    mimetype = 'application/octet-stream'
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+
+    def write(self, result):
+        """写入一个结果字典"""
+        raise NotImplementedError
+
+    def close(self, metadata=None):
+        """结束写入，metadata为可选的元数据字典(不是所有格式都会保存)"""
+        raise NotImplementedError
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class JsonResultWriter(ResultWriter):
+    """JSON数组，输出与json.dumps(results, indent=2)相同"""
+
+    name = 'json'
+    extension = '.json'
+    mimetype = 'application/json'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write('[')
+
+    def write(self, result):
+        item = json.dumps(result, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+        self._file.write((',\n  ' if self.count else '\n  ') + item)
+        self.count += 1
+
+    def close(self, metadata=None):
+        if self._file.closed:
+            return
+        self._file.write('\n]' if self.count else ']')
+        self._file.close()
+
+class NdjsonGzipResultWriter(ResultWriter):
+    """gzip压缩的NDJSON"""
+
+    name = 'ndjson'
+    extension = '.ndjson.gz'
+    mimetype = 'application/gzip'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._file = gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+
+    def write(self, result):
+        self._file.write(json.dumps(result, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self.count += 1
+
+    def close(self, metadata=None):
+        if not self._file.closed:
+            self._file.close()
+
+class CsvResultWriter(ResultWriter):
+    """
+    CSV表格，列为所有结果中出现过的字段，列表和字典类型的值保存为JSON字符串
+
+    只在后面的结果中出现的字段(如简介、附加信息)也要有列，所以结果先缓存，close时写入表头和所有行
+    """
+
+    name = 'csv'
+    extension = '.csv'
+    mimetype = 'text/csv'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._rows = []
+        self._keys = {}
+        self._closed = False
+
+    def write(self, result):
+        self._keys.update(dict.fromkeys(result))
+        self._rows.append({
+            key: json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else value
+            for key, value in result.items()
+        })
+        self.count += 1
+
+    def close(self, metadata=None):
+        if self._closed:
+            return
+        self._closed = True
+        columns = [field for field in RESULT_FIELDS if field in self._keys]
+        columns += [key for key in self._keys if key not in columns]
+        with open(self.path, 'w', encoding='utf-8-sig', newline='') as f:
+            # 没有结果时只写空文件，与之前相同
+            if columns:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(self._rows)
+        self._rows = []
+
+class ColumnarResultWriter(ResultWriter):
+    """
+    仅依赖标准库的列式格式
+
+    文件结构: 魔数 b'IFCOL\\x01'，4字节头部长度(大端)，JSON头部，然后是各列的数据块。
+    头部记录行数、元数据以及每列数据块的偏移和长度；每个数据块是zlib压缩的JSON数组。
+    """
+
+    name = 'columnar'
+    extension = '.ifcol'
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._columns = {}
+        self._closed = False
+
+    def write(self, result):
+        for key in result:
+            if key not in self._columns:
+                # 之前的行没有这个字段，用None补齐
+                self._columns[key] = [None] * self.count
+        for key, values in self._columns.items():
+            values.append(result.get(key))
+        self.count += 1
+
+    def close(self, metadata=None):
+        if self._closed:
+            return
+        self._closed = True
+
+        names = [field for field in RESULT_FIELDS if field in self._columns]
+        names += [name for name in self._columns if name not in names]
+        blocks = []
+        columns = []
+        offset = 0
+        for name in names:
+            block = zlib.compress(json.dumps(self._columns[name], ensure_ascii=False).encode('utf-8'), 6)
+            columns.append({'name': name, 'offset': offset, 'length': len(block)})
+            blocks.append(block)
+            offset += len(block)
+
+        header = json.dumps({
+            'rows': self.count,
+            'columns': columns,
+            'metadata': metadata or {}
+        }, ensure_ascii=False).encode('utf-8')
+        with open(self.path, 'wb') as f:
+            f.write(COLUMNAR_MAGIC)
+            f.write(struct.pack('>I', len(header)))
+            f.write(header)
+            for block in blocks:
+                f.write(block)
+
+class ParquetResultWriter(ResultWriter):
+    """Parquet格式，需要pyarrow"""
+
+    name = 'parquet'
+    extension = '.parquet'
+
+    def __init__(self, path):
+        if not parquet_available():
+            raise ValueError("parquet格式需要安装pyarrow: pip install pyarrow")
+        super().__init__(path)
+        self._rows = []
+        self._closed = False
+
+    def write(self, result):
+        # 列表和字典保存为JSON字符串，保证每列类型一致
+        self._rows.append({
+            key: json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else value
+            for key, value in result.items()
+        })
+        self.count += 1
+
+    def close(self, metadata=None):
+        if self._closed:
+            return
+        self._closed = True
+
+        import pyarrow
+        import pyarrow.parquet
+
+        table = pyarrow.Table.from_pylist(self._rows)
+        if metadata:
+            table = table.replace_schema_metadata({'metadata': json.dumps(metadata, ensure_ascii=False)})
+        pyarrow.parquet.write_table(table, self.path, compression='zstd')
+
+RESULT_FORMATS = {
+    writer.name: writer
+    for writer in (JsonResultWriter, NdjsonGzipResultWriter, CsvResultWriter, ColumnarResultWriter, ParquetResultWriter)
+}
+
+def parquet_available():
+    """是否安装了pyarrow(只检查，不导入)"""
+    return importlib.util.find_spec('pyarrow') is not None
+
+def available_formats():
+    """当前环境可以使用的格式名称"""
+    return [name for name in RESULT_FORMATS if name != 'parquet' or parquet_available()]
+
+def get_writer(format_name, path):
+    """
+    创建指定格式的写入器
+
+    Raises:
+        ValueError: 格式未知或缺少依赖
+    """
+    if format_name not in RESULT_FORMATS:
+        raise ValueError(f"未知的结果格式: {format_name}，可用格式: {', '.join(available_formats())}")
+    return RESULT_FORMATS[format_name](path)
+
+def format_from_path(path, default='json'):
+    """根据文件扩展名判断格式"""
+    for name, writer in RESULT_FORMATS.items():
+        if path.lower().endswith(writer.extension):
+            return name
+    return default
+
+def output_path_for_format(path, format_name):
+    """把输出文件路径的扩展名换成指定格式的扩展名"""
+    current = RESULT_FORMATS[format_from_path(path)].extension
+    if path.lower().endswith(current):
+        path = path[:-len(current)]
+    return path + RESULT_FORMATS[format_name].extension
+
+def write_results(results, path, format_name='json', metadata=None):
+    """
+    以指定格式写入结果列表
+
+    Returns:
+        int: 写入的结果数量
+    """
+    writer = get_writer(format_name, path)
+    try:
+        for result in results:
+            writer.write(result)
+    finally:
+        writer.close(metadata)
+    return writer.count
+
+def read_columnar(path, columns=None):
+    """
+    读取列式格式文件
+
+    Args:
+        path: 文件路径
+        columns: 只读取这些列，为None时读取全部
+
+    Returns:
+        tuple: (列名 -> 值列表的字典, 元数据)
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"不是列式结果文件: {path}")
+        header_length = struct.unpack('>I', f.read(4))[0]
+        header = json.loads(f.read(header_length).decode('utf-8'))
+        data_start = f.tell()
+
+        data = {}
+        for column in header['columns']:
+            if columns is not None and column['name'] not in columns:
+                continue
+            f.seek(data_start + column['offset'])
+            data[column['name']] = json.loads(zlib.decompress(f.read(column['length'])).decode('utf-8'))
+    return data, header.get('metadata', {})
+
+def read_results(path, format_name=None):
+    """
+    读取任意支持格式的结果文件
+
+    Returns:
+        list: 结果字典列表，CSV中的值都是字符串
+    """
+    format_name = format_name or format_from_path(path)
+    if format_name == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('results', []) if isinstance(data, dict) else data
+    if format_name == 'ndjson':
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    if format_name == 'csv':
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            return [dict(row) for row in csv.DictReader(f)]
+    if format_name == 'columnar':
+        data, _ = read_columnar(path)
+        names = list(data)
+        rows = len(data[names[0]]) if names else 0
+        return [
+            {name: data[name][i] for name in names if data[name][i] is not None}
+            for i in range(rows)
+        ]
+    if format_name == 'parquet':
+        import pyarrow.parquet
+        return pyarrow.parquet.read_table(path).to_pylist()
+    raise ValueError(f"未知的结果格式: {format_name}")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+产物保留策略
+
+任务记录、结果文件、日志和调试HTML按各自的保留期限(TTL)过期删除，
+每个目录还有总大小上限，超出时从最旧的文件开始删除。
+正在使用的文件(如进行中任务的结果和日志)可以通过protect回调排除。
+"""
+
+import os
+import time
+
+DAY = 24 * 60 * 60
+MB = 1024 * 1024
+
+class RetentionPolicy:
+    """一类产物的保留策略"""
+
+    def __init__(self, name, directory, ttl_seconds, max_bytes):
+        """
+        Args:
+            name: 产物类型名称，用于环境变量和统计
+            directory: 产物所在目录
+            ttl_seconds: 文件最后修改后保留的秒数，为None时不按时间删除
+            max_bytes: 目录总大小上限，为None时不限制
+        """
+        self.name = name
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls, name, directory, default_ttl_days, default_max_mb):
+        """
+        按环境变量 RETENTION_<NAME>_DAYS 和 RETENTION_<NAME>_MAX_MB 创建策略，
+        值为0时表示不限制
+        """
+        prefix = f"RETENTION_{name.upper()}"
+        ttl_days = float(os.environ.get(f"{prefix}_DAYS", default_ttl_days))
+        max_mb = float(os.environ.get(f"{prefix}_MAX_MB", default_max_mb))
+        return cls(
+            name,
+            directory,
+            ttl_days * DAY if ttl_days > 0 else None,
+            int(max_mb * MB) if max_mb > 0 else None
+        )
+
+def sweep_directory(policy, protect=None, now=None):
+    """
+    按保留策略清理一个目录
+
+    Args:
+        policy: RetentionPolicy
+        protect: 接收文件名、返回True时不删除该文件的函数
+        now: 当前时间戳，默认为time.time()
+
+    Returns:
+        dict: 删除的文件数(deleted)、释放的字节数(freed_bytes)、剩余大小(remaining_bytes)
+              以及被删除的文件名列表(deleted_files)
+    """
+    now = time.time() if now is None else now
+    stats = {'deleted': 0, 'freed_bytes': 0, 'remaining_bytes': 0, 'deleted_files': []}
+    if not os.path.isdir(policy.directory):
+        return stats
+
+    files = []
+    with os.scandir(policy.directory) as entries:
+        for entry in entries:
+            try:
+                if not entry.is_file():
+                    continue
+                info = entry.stat()
+            except OSError:
+                continue
+            files.append((info.st_mtime, info.st_size, entry.name))
+
+    def delete(name, size):
+        try:
+            os.remove(os.path.join(policy.directory, name))
+        except OSError:
+            return False
+        stats['deleted'] += 1
+        stats['freed_bytes'] += size
+        stats['deleted_files'].append(name)
+        return True
+
+    kept = []
+    for mtime, size, name in files:
+        protected = protect is not None and protect(name)
+        if not protected and policy.ttl_seconds is not None and now - mtime > policy.ttl_seconds:
+            if delete(name, size):
+                continue
+        kept.append((mtime, size, name, protected))
+
+    total = sum(size for _, size, _, _ in kept)
+    if policy.max_bytes is not None and total > policy.max_bytes:
+        # 超出大小上限时从最旧的文件开始删除
+        for mtime, size, name, protected in sorted(kept):
+            if total <= policy.max_bytes:
+                break
+            if not protected and delete(name, size):
+                total -= size
+
+    stats['remaining_bytes'] = total
+    return stats
@@ -0,0 +1,405 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+按变化频率安排游戏重新检查
+
+每次爬取到游戏页面时记录一次检查，iframe源和上一次检查时不同就记为一次变化，
+变化历史保存在SQLite中。根据检查次数、变化次数和检查间隔估计每个游戏的变化率
+(泊松过程，使用Cho和Garcia-Molina的偏差修正估计，检查次数少时向先验变化率收缩)，
+再按"现在检查能让结果在接下来一段时间内多保持多少新鲜度"排序，
+在每天固定的请求预算内生成重新检查的队列，不再定期完整地重新爬取所有游戏。
+
+用法:
+    python revisit_scheduler.py import results/*.json    # 用已有的结果文件记录检查
+    python revisit_scheduler.py plan --budget 2000 --output refresh.txt
+    python iframe_scraper.py --urls refresh.txt          # 或直接 --refresh 2000
+    python revisit_scheduler.py stats
+"""
+
+import os
+import math
+import time
+import heapq
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+from result_writers import read_results
+from retention import DAY
+
+if 'VERCEL' in os.environ:
+    DEFAULT_REVISIT_PATH = '/tmp/index/revisit.sqlite3'
+else:
+    DEFAULT_REVISIT_PATH = os.path.join('index', 'revisit.sqlite3')
+
+# 没有检查历史时假设的变化率(每天)，默认约一个月变化一次
+PRIOR_RATE = float(os.environ.get('REVISIT_PRIOR_RATE', 1 / 30))
+
+# 先验相当于观察了多少天，观察时间越长估计越接近观察到的变化率
+PRIOR_DAYS = 7
+
+# 变化率下限(每天)，从未变化的游戏也会偶尔检查一次
+MIN_RATE = 1 / 365
+
+# 每天的请求预算，命令行和服务器未指定时使用
+DEFAULT_DAILY_BUDGET = int(os.environ.get('REVISIT_DAILY_BUDGET', 2000))
+
+def estimate_change_rate(checks, changes, observed_seconds, prior_rate=PRIOR_RATE):
+    """
+    估计游戏每天的变化率
+
+    只知道相邻两次检查之间是否变化，不知道变化了几次，直接用变化次数除以时间会低估
+    经常变化的游戏；这里使用 r = -ln((n - X + 0.5) / (n + 0.5)) / 平均检查间隔，
+    X = n(每次检查都变化)时也有有限值。观察时间短时按PRIOR_DAYS向先验变化率收缩。
+
+    Args:
+        checks: 有上一次结果可以比较的检查次数
+        changes: 其中发现变化的次数
+        observed_seconds: 这些检查的间隔总时长(秒)
+        prior_rate: 先验变化率(每天)
+
+    Returns:
+        float: 每天的变化率
+    """
+    if checks <= 0 or observed_seconds <= 0:
+        return max(prior_rate, MIN_RATE)
+    observed_days = observed_seconds / DAY
+    estimate = -math.log((checks - changes + 0.5) / (checks + 0.5)) * checks / observed_days
+    rate = (observed_days * estimate + PRIOR_DAYS * prior_rate) / (observed_days + PRIOR_DAYS)
+    return max(rate, MIN_RATE)
+
+def refresh_gain(rate, age_days, horizon_days):
+    """
+    现在检查一个游戏在接下来horizon_days天内平均多得到的新鲜度
+
+    变化按泊松过程发生时，距上次检查age天的结果仍然新鲜的概率是exp(-rate*age)。
+    现在检查后结果在[0, H]内平均新鲜的概率是(1 - exp(-rate*H)) / (rate*H)，
+    不检查时还要再乘以exp(-rate*age)，两者之差就是这次请求的收益。
+    """
+    stale = -math.expm1(-rate * max(age_days, 0))
+    exposure = rate * horizon_days
+    keep = -math.expm1(-exposure) / exposure if exposure > 0 else 1.0
+    return stale * keep
+
+class RevisitScheduler:
+    """记录游戏的检查和变化历史，按变化率生成重新检查队列"""
+
+    def __init__(self, path=DEFAULT_REVISIT_PATH):
+        """
+        初始化调度器
+
+        Args:
+            path: SQLite文件路径，为':memory:'时只保存在内存中
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        # 多个线程共用一个连接，由self._lock保证串行访问
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS revisits (
+                url TEXT PRIMARY KEY,
+                game_id TEXT,
+                title TEXT,
+                signature TEXT,
+                first_checked REAL NOT NULL,
+                last_checked REAL NOT NULL,
+                last_changed REAL,
+                checks INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0,
+                observed_seconds REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS revisits_last_checked ON revisits (last_checked);
+            CREATE TABLE IF NOT EXISTS revisit_changes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                observed_at REAL NOT NULL,
+                previous TEXT,
+                current TEXT
+            );
+            CREATE INDEX IF NOT EXISTS revisit_changes_url ON revisit_changes (url, observed_at);
+        """)
+        self._conn.commit()
+
+    def observe(self, url, iframe_src, checked_at=None, title=None, game_id=None):
+        """
+        记录一次检查
+
+        Args:
+            url: 游戏页面URL
+            iframe_src: 这次检查到的iframe源，页面中没有iframe时为None(也算一种状态)
+            checked_at: 检查时间戳，默认为当前时间
+            title: 游戏标题
+            game_id: itch.io游戏ID
+
+        Returns:
+            bool: 与上一次检查相比是否变化(第一次检查时为False)；比已记录的检查更早时为None
+        """
+        with self._lock:
+            changed = self._observe(url, iframe_src or '', checked_at or time.time(), title, game_id)
+            self._conn.commit()
+        return changed
+
+    def observe_results(self, results, checked_at=None):
+        """
+        用一批结果记录检查，结果中的timestamp字段优先于checked_at
+
+        Args:
+            results: 结果字典列表(服务器结果使用url字段，命令行结果使用game_url字段)
+            checked_at: 没有timestamp字段的结果的检查时间，默认为当前时间
+
+        Returns:
+            dict: 记录的检查数和发现的变化数
+        """
+        checked_at = checked_at or time.time()
+        summary = {'checks': 0, 'changes': 0}
+        with self._lock:
+            for result in results:
+                url = result.get('url') or result.get('game_url')
+                if not url or result.get('error'):
+                    continue
+                changed = self._observe(
+                    url, result.get('iframe_src') or '', result_time(result, checked_at),
+                    result.get('title'), result.get('game_id')
+                )
+                if changed is not None:
+                    summary['checks'] += 1
+                    summary['changes'] += int(changed)
+            self._conn.commit()
+        return summary
+
+    def change_rate(self, url):
+        """游戏每天的估计变化率，没有记录时为None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT checks, changes, observed_seconds FROM revisits WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return estimate_change_rate(row['checks'], row['changes'], row['observed_seconds'])
+
+    def history(self, url):
+        """
+        游戏的检查统计和变化历史
+
+        Returns:
+            dict: 检查统计、估计变化率和changes列表(从早到晚)，没有记录时为None
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM revisits WHERE url = ?", (url,)).fetchone()
+            changes = self._conn.execute(
+                "SELECT observed_at, previous, current FROM revisit_changes WHERE url = ? ORDER BY observed_at",
+                (url,)
+            ).fetchall()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['rate_per_day'] = estimate_change_rate(row['checks'], row['changes'], row['observed_seconds'])
+        entry['changes_history'] = [dict(change) for change in changes]
+        return entry
+
+    def checked_since(self, since):
+        """这个时间之后检查过的游戏数量"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM revisits WHERE last_checked >= ?", (since,)
+            ).fetchone()[0]
+
+    def remaining_budget(self, daily_budget, now=None):
+        """每天的请求预算减去最近24小时内已经检查过的游戏数"""
+        now = now or time.time()
+        return max(0, int(daily_budget) - self.checked_since(now - DAY))
+
+    def plan(self, budget, now=None, horizon_seconds=DAY):
+        """
+        生成重新检查队列
+
+        Args:
+            budget: 这次最多检查的游戏数
+            now: 当前时间戳
+            horizon_seconds: 到下一次生成队列的时间，收益按这段时间内的平均新鲜度计算
+
+        Returns:
+            list: 按收益从高到低排列的队列，每项包含url、title、game_id、rate_per_day、
+                  age_days、stale_probability和priority
+        """
+        now = now or time.time()
+        budget = int(budget)
+        if budget <= 0:
+            return []
+        horizon_days = horizon_seconds / DAY
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url, title, game_id, last_checked, checks, changes, observed_seconds FROM revisits"
+            ).fetchall()
+
+        def candidates():
+            for row in rows:
+                rate = estimate_change_rate(row['checks'], row['changes'], row['observed_seconds'])
+                age_days = (now - row['last_checked']) / DAY
+                yield refresh_gain(rate, age_days, horizon_days), row, rate, age_days
+
+        queue = []
+        for gain, row, rate, age_days in heapq.nlargest(budget, candidates(), key=lambda item: item[0]):
+            if gain <= 0:
+                break
+            queue.append({
+                'url': row['url'],
+                'title': row['title'],
+                'game_id': row['game_id'],
+                'rate_per_day': rate,
+                'age_days': age_days,
+                'stale_probability': -math.expm1(-rate * max(age_days, 0)),
+                'priority': gain
+            })
+        return queue
+
+    def stats(self, now=None):
+        """
+        记录的游戏数、检查数、变化数，以及按估计变化率计算的预期新鲜游戏比例
+        """
+        now = now or time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT last_checked, checks, changes, observed_seconds FROM revisits"
+            ).fetchall()
+            changes = self._conn.execute("SELECT COUNT(*) FROM revisit_changes").fetchone()[0]
+        fresh = 0.0
+        for row in rows:
+            rate = estimate_change_rate(row['checks'], row['changes'], row['observed_seconds'])
+            fresh += math.exp(-rate * max(now - row['last_checked'], 0) / DAY)
+        return {
+            'games': len(rows),
+            'checks': sum(row['checks'] for row in rows),
+            'changes': changes,
+            'checked_last_day': sum(1 for row in rows if row['last_checked'] >= now - DAY),
+            'expected_fresh': fresh / len(rows) if rows else 1.0,
+            'expected_stale_games': round(len(rows) - fresh, 1)
+        }
+
+    def close(self):
+        """关闭SQLite连接"""
+        with self._lock:
+            self._conn.close()
+
+    def _observe(self, url, signature, checked_at, title, game_id):
+        """记录一次检查，调用时需要持有self._lock"""
+        row = self._conn.execute(
+            "SELECT signature, last_checked FROM revisits WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            self._conn.execute("""
+                INSERT INTO revisits (url, game_id, title, signature, first_checked, last_checked)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (url, game_id, title, signature, checked_at, checked_at))
+            return False
+        if checked_at <= row['last_checked']:
+            # 重复使用的旧结果，不是新的检查
+            return None
+
+        changed = signature != row['signature']
+        self._conn.execute("""
+            UPDATE revisits SET
+                game_id = COALESCE(?, game_id),
+                title = COALESCE(?, title),
+                signature = ?,
+                last_checked = ?,
+                last_changed = CASE WHEN ? THEN ? ELSE last_changed END,
+                checks = checks + 1,
+                changes = changes + ?,
+                observed_seconds = observed_seconds + ?
+            WHERE url = ?
+        """, (game_id, title, signature, checked_at, changed, checked_at, int(changed),
+              checked_at - row['last_checked'], url))
+        if changed:
+            self._conn.execute(
+                "INSERT INTO revisit_changes (url, observed_at, previous, current) VALUES (?, ?, ?, ?)",
+                (url, checked_at, row['signature'] or None, signature or None)
+            )
+        return changed
+
+def result_time(result, default):
+    """结果的timestamp字段(ISO格式)转换为时间戳，没有或无法解析时返回default"""
+    timestamp = result.get('timestamp')
+    if timestamp:
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return default
+
+def write_queue(queue, path):
+    """把队列写成iframe_scraper.py --urls使用的文件，每行为URL和标题，以制表符分隔"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in queue:
+            f.write(f"{entry['url']}\t{entry['title'] or ''}\n")
+
+# 进程内共享的默认调度器
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+def get_revisit_scheduler():
+    """获取进程内共享的默认调度器，第一次调用时才打开文件"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = RevisitScheduler(os.environ.get('REVISIT_DB_PATH', DEFAULT_REVISIT_PATH))
+        return _default_scheduler
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='按变化频率安排游戏重新检查')
+    subparsers = parser.add_subparsers(dest='command')
+
+    import_parser = subparsers.add_parser('import', help='用结果文件记录检查，没有timestamp字段时使用文件的修改时间')
+    import_parser.add_argument('paths', nargs='+', help='结果文件')
+
+    plan_parser = subparsers.add_parser('plan', help='生成重新检查队列')
+    plan_parser.add_argument('--budget', type=int, default=DEFAULT_DAILY_BUDGET,
+                             help=f'每天的请求预算，减去最近24小时内已检查的游戏数，默认为{DEFAULT_DAILY_BUDGET}')
+    plan_parser.add_argument('--horizon_hours', type=float, default=24, help='到下一次生成队列的小时数，默认为24')
+    plan_parser.add_argument('--output', type=str, default=None, help='写入这个文件供iframe_scraper.py --urls使用，默认打印队列')
+
+    subparsers.add_parser('stats', help='显示检查统计和预期新鲜度')
+    args = parser.parse_args()
+
+    scheduler = get_revisit_scheduler()
+    if args.command == 'import':
+        for path in args.paths:
+            try:
+                summary = scheduler.observe_results(read_results(path), checked_at=os.path.getmtime(path))
+                print(f"{path}: 记录 {summary['checks']} 次检查，发现 {summary['changes']} 次变化")
+            except Exception as e:
+                print(f"{path}: 导入失败: {e}")
+    elif args.command == 'plan':
+        budget = scheduler.remaining_budget(args.budget)
+        queue = scheduler.plan(budget, horizon_seconds=args.horizon_hours * 3600)
+        if args.output:
+            write_queue(queue, args.output)
+            print(f"{len(queue)} 个游戏已写入 {args.output}")
+        else:
+            for entry in queue:
+                print(f"{entry['priority']:.4f}\t{entry['rate_per_day']:.4f}/天\t{entry['age_days']:.1f}天\t{entry['url']}")
+        expected = sum(entry['stale_probability'] for entry in queue)
+        print(f"剩余预算 {budget}，队列 {len(queue)} 个游戏，预计发现 {expected:.1f} 个变化")
+    elif args.command == 'stats':
+        stats = scheduler.stats()
+        print(f"游戏 {stats['games']} 个，检查 {stats['checks']} 次，变化 {stats['changes']} 次，"
+              f"最近24小时检查 {stats['checked_last_day']} 个")
+        print(f"预期新鲜比例 {stats['expected_fresh']:.1%}，预期过时 {stats['expected_stale_games']} 个")
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -6,27 +6,63 @@ A simple Flask server for the itch.io Game Iframe Extractor
 Handles extraction requests and allows downloading results
 """
 
-from flask import Flask, request, jsonify, send_from_directory, render_template, send_file
+from flask import Flask, request, jsonify, render_template, send_file
 import os
 import sys
 import json
-import smtplib
 import threading
 import subprocess
 import time
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.application import MIMEApplication
+import contextlib
+from collections import deque
 from datetime import datetime
 import uuid
 import urllib.request
 import urllib.error
+import urllib.parse
 import re
 import html
 import random
+import hashlib
+import hmac
+import shutil
+import ipaddress
+
+try:
+    import fcntl
+except ImportError:
+    # Windows没有fcntl，只在单进程模式下使用
+    fcntl = None
+
+from extraction_cache import page_content_hash, get_default_cache
+from job_scheduler import JobScheduler, PRIORITIES
+from retention import DAY, RetentionPolicy, sweep_directory
+from result_writers import RESULT_FORMATS, available_formats, get_writer, normalize_result, read_results
+from game_index import get_game_index
+from revisit_scheduler import DEFAULT_DAILY_BUDGET, get_revisit_scheduler
+from embed_checker import EMBED_HOSTS, EmbedChecker, check_results, get_default_check_cache, is_embed_host, normalize_embed_url
+from hedged_fetch import DeadlineExceeded, get_latency_tracker, hedged_fetch
+from transfer_encoding import ACCEPT_ENCODING, TransferStats
+from dns_cache import build_opener, get_connection_warmer, get_dns_cache
+from iframe_scraper import (
+    LISTING_PAGE_SIZE, build_listing_feed_url, parse_listing_feed, parse_game_cells,
+    CategoryDiscovery, category_listing_url, normalize_categories
+)
+from notification_outbox import check_webhook_url, get_notification_sender
+from static_assets import DEFAULT_DIST_DIR, asset_response, get_asset_bundle
+from profiling import PROFILE_MODES, Profiler, normalize_profile_mode, profile_paths
+from page_metadata import info_fields, normalize_include_info
+from parse_pool import completed_future, configured_workers, find_iframe_src, get_parse_pool, parse_game_page, run_parser
+from page_archive import DEFAULT_ARCHIVE_DIR, archive_enabled, get_default_archive
+from work_leases import (
+    UNIT_DONE, UNIT_FAILED, UNIT_LEASED, covered_until, expire_leases, grant_lease,
+    has_leased_units, lease_matches, next_pending_unit, parse_lease_id, release_unit,
+    split_units, unit_summary, units_finished, validate_unit_results
+)
 
 # Vercel requires us to create our app at the global scope
-app = Flask(__name__, static_url_path='')
+# (no static folder: pages and assets are served by catch_all from the static_assets allow-list)
+app = Flask(__name__, static_folder=None)
 
 # File paths - for Vercel we need to use writable directories
 if 'VERCEL' in os.environ:
@@ -42,21 +78,188 @@ else:
     LOGS_DIR = 'logs'
     DEBUG_HTML_DIR = 'debug_html'
 
+# 原始页面归档目录(见page_archive.py)，PAGE_ARCHIVE=0时不归档
+ARCHIVE_DIR = os.environ.get('PAGE_ARCHIVE_DIR', DEFAULT_ARCHIVE_DIR)
+
+# 服务器角色:
+#   all    - 默认，单进程同时处理HTTP请求和爬取任务
+#   web    - 只处理HTTP请求(可用gunicorn启动多个进程)，任务通过队列目录交给爬取工作进程
+#   worker - 爬取工作进程 (python server.py --worker)，不处理HTTP请求
+#   coordinator - 协调节点 (python server.py --coordinator)，把任务拆分成工作单元，
+#            由其他机器上的工作节点 (python iframe_scraper.py --worker <URL>) 领取租约后爬取
+# web和worker角色通过任务目录中的文件共享任务状态
+SERVER_ROLE = os.environ.get('SERVER_ROLE', 'all')
+
+# 启动时只预加载最近这段时间(秒)内修改过的任务记录，更早的任务在按ID访问时才加载。
+# 未结束的任务(排队、运行或暂停)不论多早都会加载，以便继续运行且产物不被清理
+JOB_PRELOAD_SECONDS = int(os.environ.get('JOB_PRELOAD_SECONDS', str(24 * 60 * 60)))
+
+# 未结束的任务状态
+ACTIVE_JOB_STATUSES = ('queued', 'processing', 'paused')
+
+# 任务ID只能是UUID字符，避免通过任务ID访问任务目录之外的文件
+JOB_ID_PATTERN = re.compile(r'^[0-9a-fA-F-]{1,64}$')
+
+class JobStore(dict):
+    """In-memory job records, loading older jobs from their files on demand"""
+    
+    def __init__(self, directory, shared=False):
+        """
+        Args:
+            directory: Directory holding one <job_id>.json file per job
+            shared: Other processes update the files too, so re-read a record
+                    whenever its file has changed since it was loaded
+        """
+        super().__init__()
+        self.directory = directory
+        self.shared = shared
+        self._mtimes = {}
+    
+    def job_file(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+    
+    def _load(self, job_id):
+        """Load one job record from disk, returns True if it exists"""
+        if not isinstance(job_id, str) or not JOB_ID_PATTERN.match(job_id):
+            return False
+        job_file = self.job_file(job_id)
+        try:
+            mtime = os.stat(job_file).st_mtime_ns
+            with open(job_file, 'r', encoding='utf-8') as f:
+                dict.__setitem__(self, job_id, json.load(f))
+            self._mtimes[job_id] = mtime
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"Error loading job {job_id}: {e}")
+            return False
+    
+    def refresh(self, job_id):
+        """Re-read a cached record if another process has rewritten its file"""
+        try:
+            mtime = os.stat(self.job_file(job_id)).st_mtime_ns
+        except OSError:
+            return
+        if mtime != self._mtimes.get(job_id):
+            self._load(job_id)
+    
+    def mark_saved(self, job_id):
+        """Remember the file version this process just wrote"""
+        try:
+            self._mtimes[job_id] = os.stat(self.job_file(job_id)).st_mtime_ns
+        except OSError:
+            pass
+    
+    def __getitem__(self, job_id):
+        if self.shared and dict.__contains__(self, job_id):
+            self.refresh(job_id)
+        return dict.__getitem__(self, job_id)
+    
+    def __missing__(self, job_id):
+        if self._load(job_id):
+            return dict.__getitem__(self, job_id)
+        raise KeyError(job_id)
+    
+    def __contains__(self, job_id):
+        return dict.__contains__(self, job_id) or self._load(job_id)
+    
+    def get(self, job_id, default=None):
+        try:
+            return self[job_id]
+        except KeyError:
+            return default
+    
+    def preload(self, max_age_seconds):
+        """Load the job records modified within max_age_seconds, and every unfinished job"""
+        if not os.path.exists(self.directory):
+            return
+        cutoff = time.time() - max_age_seconds
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json'):
+                    continue
+                job_id = entry.name[:-len('.json')]
+                if not self._load(job_id) or entry.stat().st_mtime >= cutoff:
+                    continue
+                # Older records stay on disk unless they are still active
+                if dict.__getitem__(self, job_id).get('status') not in ACTIVE_JOB_STATUSES:
+                    dict.__delitem__(self, job_id)
+                    self._mtimes.pop(job_id, None)
+    
+    def scan(self, max_age_seconds=None):
+        """
+        List (job_id, job) pairs for a scan over all jobs
+        
+        When shared, first re-read records other processes have rewritten, drop records
+        whose file is gone and load new files modified within max_age_seconds
+        (default JOB_PRELOAD_SECONDS), so the scan doesn't see stale statuses.
+        """
+        if self.shared and os.path.exists(self.directory):
+            cutoff = time.time() - (JOB_PRELOAD_SECONDS if max_age_seconds is None else max_age_seconds)
+            on_disk = set()
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.json'):
+                        continue
+                    job_id = entry.name[:-len('.json')]
+                    on_disk.add(job_id)
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if dict.__contains__(self, job_id):
+                        if stat.st_mtime_ns != self._mtimes.get(job_id):
+                            self._load(job_id)
+                    elif stat.st_mtime >= cutoff:
+                        self._load(job_id)
+            for job_id in list(dict.keys(self)):
+                if job_id not in on_disk:
+                    dict.pop(self, job_id, None)
+                    self._mtimes.pop(job_id, None)
+        return list(dict.items(self))
+    
+    def evict_idle(self, max_age_seconds):
+        """Drop finished jobs older than max_age_seconds from memory, keeping their files"""
+        cutoff = datetime.now().timestamp() - max_age_seconds
+        evicted = 0
+        for job_id, job in self.scan(max_age_seconds):
+            if job.get('status') in ACTIVE_JOB_STATUSES:
+                continue
+            try:
+                finished_at = datetime.fromisoformat(job.get('completed_at') or job.get('created_at')).timestamp()
+            except (TypeError, ValueError):
+                finished_at = 0
+            if finished_at < cutoff:
+                self.pop(job_id, None)
+                self._mtimes.pop(job_id, None)
+                evicted += 1
+        return evicted
+
 # Job storage
-jobs = {}
+jobs = JobStore(JOBS_DATA_DIR, shared=SERVER_ROLE in ('web', 'worker'))
 
-# Load jobs from files
+# 任务记录的读-改-写过程在进程内用线程锁保护，多进程共享时再加文件锁
+_job_update_lock = threading.RLock()
+
+@contextlib.contextmanager
+def job_update_lock():
+    """Serialize job record updates across threads and, when shared, across processes"""
+    with _job_update_lock:
+        if not jobs.shared or fcntl is None:
+            yield
+            return
+        os.makedirs(JOBS_DATA_DIR, exist_ok=True)
+        with open(os.path.join(JOBS_DATA_DIR, '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+# Load recent jobs from files
 def load_jobs():
-    global jobs
-    if os.path.exists(JOBS_DATA_DIR):
-        for filename in os.listdir(JOBS_DATA_DIR):
-            if filename.endswith('.json'):
-                job_id = filename.split('.')[0]
-                try:
-                    with open(os.path.join(JOBS_DATA_DIR, filename), 'r', encoding='utf-8') as f:
-                        jobs[job_id] = json.load(f)
-                except Exception as e:
-                    print(f"Error loading job {job_id}: {e}")
+    jobs.preload(JOB_PRELOAD_SECONDS)
 
 # Save job to file
 def save_job(job_id):
@@ -64,9 +267,13 @@ def save_job(job_id):
         if not os.path.exists(JOBS_DATA_DIR):
             os.makedirs(JOBS_DATA_DIR)
         
+        # Write to a temporary file first so readers never see a half-written record
         job_file = os.path.join(JOBS_DATA_DIR, f"{job_id}.json")
-        with open(job_file, 'w', encoding='utf-8') as f:
-            json.dump(jobs[job_id], f)
+        tmp_file = f"{job_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(dict.__getitem__(jobs, job_id), f)
+        os.replace(tmp_file, job_file)
+        jobs.mark_saved(job_id)
     except Exception as e:
         print(f"Error saving job {job_id}: {e}")
 
@@ -81,10 +288,262 @@ def setup_result_directories():
 
 # Add a job update function
 def update_job(job_id, updates):
-    if job_id in jobs:
-        for key, value in updates.items():
-            jobs[job_id][key] = value
-        save_job(job_id)
+    finished = False
+    with job_update_lock():
+        # In shared mode jobs[job_id] re-reads the file, so updates from other processes are kept
+        if job_id in jobs:
+            job = jobs[job_id]
+            finished = updates.get('status') in NOTIFY_STATUSES and job.get('status') != updates['status']
+            for key, value in updates.items():
+                job[key] = value
+            save_job(job_id)
+    # Queue notifications outside the lock so other job updates don't wait on them
+    if finished:
+        notify_job_finished(job_id)
+
+# 任务进入这些状态时通知提交者
+NOTIFY_STATUSES = ('completed', 'failed')
+
+# 同一收件人在这段时间(秒)内结束的任务合并成一条通知
+NOTIFY_DIGEST_SECONDS = float(os.environ.get('NOTIFY_DIGEST_SECONDS', '30'))
+
+# 通知中下载链接的地址前缀
+PUBLIC_BASE_URL = os.environ.get('PUBLIC_BASE_URL', 'http://127.0.0.1:5000').rstrip('/')
+
+def notify_job_finished(job_id):
+    """
+    把任务结束事件写入通知发件箱，由后台线程发送给任务的邮箱和webhook
+
+    只写入本地SQLite，不等待邮件或webhook发送，不影响爬取。
+    Vercel上请求返回后后台线程不再运行，由run_inline_job在任务结束后立即发送
+    """
+    job = jobs[job_id]
+    emails = [job.get('email')] + job.get('notify_emails', [])
+    webhooks = [job.get('webhook_url')] + job.get('notify_webhooks', [])
+    recipients = [('email', email) for email in dict.fromkeys(emails) if email]
+    recipients += [('webhook', url) for url in dict.fromkeys(webhooks) if url]
+    if not recipients:
+        return
+    
+    event = {
+        'job_id': job_id,
+        'status': job['status'],
+        'result_count': job.get('result_count'),
+        'error': job.get('error'),
+        'finished_at': job.get('completed_at') or datetime.now().isoformat(),
+        'download_url': f"{PUBLIC_BASE_URL}/api/download/{job_id}" if job['status'] == 'completed' else None,
+        'result_file': job.get('result_file')
+    }
+    try:
+        sender = get_notification_sender()
+        inline = 'VERCEL' in os.environ
+        for channel, recipient in recipients:
+            sender.outbox.enqueue(channel, recipient, event, delay=0 if inline else NOTIFY_DIGEST_SECONDS)
+        if not inline:
+            sender.start()
+    except Exception as e:
+        print(f"Error queueing notifications for job {job_id}: {e}")
+
+# 请求合并: 已完成任务的结果在这个时间窗口(秒)内可以被相同或重叠的请求直接复用
+JOB_REUSE_WINDOW_SECONDS = int(os.environ.get('JOB_REUSE_WINDOW_SECONDS', '300'))
+
+# 保护"查找相同任务 - 创建新任务"的过程，避免同时到达的相同请求各自启动爬取
+jobs_lock = threading.Lock()
+
+def job_request_key(params):
+    """相同请求的键，参数完全相同的请求会得到相同的结果"""
+    return json.dumps({
+        'max_games': params.get('max_games'),
+        'offset': params.get('offset'),
+        'delay': params.get('delay'),
+        'categories': sorted(params.get('categories') or []),
+        'include_info': sorted(params.get('include_info') or [])
+    }, sort_keys=True)
+
+# 默认的游戏列表，按偏移量拼接复用的结果必须来自同一个列表
+DEFAULT_LISTING_URL = 'https://itch.io/games/free/platform-web'
+
+def job_listing_source(params):
+    """
+    任务结果的列表位置所对应的列表
+
+    多个类别交错合并时各类别的起点由每段的起始偏移量决定，不同的分段方式得到不同的顺序，
+    这样的结果不能按偏移量拼接，返回None
+    """
+    if normalize_categories(params.get('categories')):
+        return None
+    return DEFAULT_LISTING_URL
+
+def copy_result_file(source_file, job_id):
+    """
+    为复用其他任务结果的任务复制一份结果文件，原任务的结果被清理或改写时不受影响
+
+    Returns:
+        str: 新结果文件的路径，原文件不存在或无法复制时返回None
+    """
+    if not source_file or not os.path.exists(source_file):
+        return None
+    directory, name = os.path.split(source_file)
+    result_file = os.path.join(directory, f"job_{job_id}{os.path.splitext(name)[1]}")
+    try:
+        shutil.copyfile(source_file, result_file)
+    except OSError as e:
+        print(f"Error copying result file {source_file}: {e}")
+        return None
+    return result_file
+
+def job_range_key(params):
+    """只有偏移量范围和延迟不同的请求可以互相复用重叠部分的结果"""
+    return json.dumps({
+        'categories': sorted(params.get('categories') or []),
+        'include_info': sorted(params.get('include_info') or [])
+    }, sort_keys=True)
+
+def is_fresh_job(job):
+    """检查任务是否已完成、结果文件存在且仍在复用时间窗口内"""
+    if job.get('status') != 'completed' or not job.get('completed_at'):
+        return False
+    # 复用其他任务结果的任务不延长原结果的有效期
+    if job.get('reused_from'):
+        return False
+    result_file = job.get('result_file')
+    if not result_file or not os.path.exists(result_file):
+        return False
+    try:
+        age = (datetime.now() - datetime.fromisoformat(job['completed_at'])).total_seconds()
+    except ValueError:
+        return False
+    return age <= JOB_REUSE_WINDOW_SECONDS
+
+def find_identical_job(params):
+    """
+    查找参数完全相同的进行中任务或新鲜的已完成任务
+
+    Returns:
+        tuple: (任务ID, 'running' 或 'completed')，没有时返回 (None, None)
+    """
+    key = job_request_key(params)
+    fresh_job_id = None
+    for job_id, job in jobs.scan():
+        if job.get('request_key') != key:
+            continue
+        if job.get('status') in ('queued', 'processing'):
+            return job_id, 'running'
+        if is_fresh_job(job):
+            if fresh_job_id is None or job['completed_at'] > jobs[fresh_job_id]['completed_at']:
+                fresh_job_id = job_id
+    if fresh_job_id:
+        return fresh_job_id, 'completed'
+    return None, None
+
+def plan_job_segments(params, start, end):
+    """
+    规划任务需要处理的偏移量范围
+
+    新鲜的已完成任务已经覆盖的部分直接复用它们的结果，其余部分需要爬取
+
+    Args:
+        params: 任务参数
+        start: 起始偏移量
+        end: 结束偏移量(不含)
+
+    Returns:
+        list: 按偏移量排列的 (类型, 起始, 结束, 来源任务ID)，类型为'reuse'或'scrape'
+    """
+    # 性能分析的任务需要实际爬取，不复用其他任务的结果；
+    # 结果不能按偏移量拼接的任务(多个类别)也不复用
+    listing_source = job_listing_source(params)
+    if params.get('profile') or listing_source is None:
+        return [('scrape', start, end, None)] if start < end else []
+    range_key = job_range_key(params)
+    covered = []
+    for job_id, job in jobs.scan():
+        covered_range = job.get('covered_range')
+        if not covered_range or not is_fresh_job(job) or job_range_key(job.get('params', {})) != range_key:
+            continue
+        # 列表回退到其他来源(如排名最高的游戏)时，相同偏移量上是不同的游戏
+        if job.get('listing_source') != listing_source:
+            continue
+        covered_start, covered_end = max(covered_range[0], start), min(covered_range[1], end)
+        if covered_start < covered_end:
+            covered.append((covered_start, covered_end, job_id))
+
+    segments = []
+    cursor = start
+    # 起点相同时优先使用覆盖范围更大的任务
+    for covered_start, covered_end, job_id in sorted(covered, key=lambda item: (item[0], -item[1])):
+        if covered_end <= cursor:
+            continue
+        covered_start = max(covered_start, cursor)
+        if covered_start > cursor:
+            segments.append(('scrape', cursor, covered_start, None))
+        segments.append(('reuse', covered_start, covered_end, job_id))
+        cursor = covered_end
+    if cursor < end:
+        segments.append(('scrape', cursor, end, None))
+    return segments
+
+def load_job_results(job_id, start, end, url_field='game_url'):
+    """
+    读取已完成任务中列表位置在 [start, end) 范围内的结果
+
+    Args:
+        job_id: 任务ID
+        start: 起始偏移量
+        end: 结束偏移量(不含)
+        url_field: 结果中游戏URL使用的字段名(见result_writers.normalize_result)
+
+    Returns:
+        list: 结果字典列表，没有timestamp的结果(较早的命令行结果)使用来源任务的完成时间
+    """
+    job = jobs[job_id]
+    with open(job['result_file'], 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('results', [])
+    results = []
+    for result in data:
+        if not isinstance(result.get('position'), int) or not start <= result['position'] < end:
+            continue
+        result = normalize_result(result, url_field)
+        if not result.get('timestamp') and job.get('completed_at'):
+            result['timestamp'] = job['completed_at']
+        results.append(result)
+    return results
+
+# 任务调度: 全局最多同时运行的爬取数，以及大任务每个分片处理的游戏数
+MAX_CONCURRENT_SCRAPES = int(os.environ.get('MAX_CONCURRENT_SCRAPES', '2'))
+JOB_SLICE_SIZE = int(os.environ.get('JOB_SLICE_SIZE', '50'))
+
+# 不超过这个数量的任务默认为高优先级，超过BULK_JOB_MIN_GAMES的为低优先级
+SMALL_JOB_MAX_GAMES = 50
+BULK_JOB_MIN_GAMES = 500
+
+def job_priority(params, requested=None):
+    """
+    确定任务的优先级
+
+    请求可以指定priority，但只有小任务可以使用high优先级
+    """
+    max_games = params.get('max_games') or 10
+    if requested in PRIORITIES and (requested != 'high' or max_games <= SMALL_JOB_MAX_GAMES):
+        return requested
+    if max_games <= SMALL_JOB_MAX_GAMES:
+        return 'high'
+    if max_games < BULK_JOB_MIN_GAMES:
+        return 'normal'
+    return 'low'
+
+def job_submitter(data):
+    """提交者标识，优先使用API key，其次是邮箱，最后是客户端IP"""
+    api_key = data.get('api_key')
+    if api_key:
+        # 只保存API key的哈希，避免把密钥写入任务文件
+        return 'key:' + hashlib.sha1(str(api_key).encode('utf-8')).hexdigest()[:12]
+    email = (data.get('email') or '').strip().lower()
+    if email:
+        return 'email:' + email
+    return 'ip:' + (request.remote_addr or 'unknown')
 
 # User-Agent列表，用于模拟不同浏览器
 USER_AGENTS = [
@@ -94,10 +553,86 @@ USER_AGENTS = [
     'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.107 Safari/537.36'
 ]
 
+# 爬虫请求使用DNS缓存和预热的连接
+url_opener = build_opener()
+
+# 处理当前游戏时提前解析并连接接下来几个游戏的主机
+WARM_AHEAD_GAMES = 3
+
+class GameResult:
+    """单个游戏的提取结果，使用__slots__减少大量结果时的内存占用"""
+    
+    # include_info中其他的附加信息(见page_metadata.INFO_FIELDS)
+    INFO_SLOTS = ('author', 'author_url', 'tags', 'rating', 'rating_count', 'embed_width', 'embed_height', 'fullscreen',
+                  'mobile_friendly', 'game_info')
+    
+    __slots__ = ('title', 'url', 'iframe_src', 'extracted_method', 'timestamp', 'game_id', 'position', 'description', 'thumbnail_url') + INFO_SLOTS
+    
+    def __init__(self, title, url, iframe_src, extracted_method="", timestamp=None, game_id=None, position=None, description=None, thumbnail_url=None,
+                 **info):
+        self.title = title
+        self.url = url
+        self.iframe_src = iframe_src
+        self.extracted_method = extracted_method
+        self.timestamp = timestamp
+        self.game_id = game_id
+        # 游戏在列表中的位置(偏移量)，用于复用已完成任务中重叠范围的结果
+        self.position = position
+        self.description = description
+        self.thumbnail_url = thumbnail_url
+        for name in self.INFO_SLOTS:
+            setattr(self, name, info.get(name))
+    
+    def to_dict(self):
+        """转换为结果字典，省略没有提取到的可选字段"""
+        return {name: getattr(self, name) for name in self.__slots__ if getattr(self, name) is not None}
+
+
+class StreamingResultWriter:
+    """
+    增量写入结果文件
+    
+    每个结果到达时立即写入并刷新到磁盘，元数据在结束时写在结果数组之后，
+    生成的文件与一次性写入的 {"metadata": ..., "results": [...]} 结构相同。
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write('{\n  "results": [')
+    
+    def write(self, result):
+        """写入一个结果(字典或GameResult)"""
+        if isinstance(result, GameResult):
+            result = result.to_dict()
+        item = json.dumps(result, indent=2, ensure_ascii=False).replace('\n', '\n    ')
+        self._file.write(('\n    ' if self.count == 0 else ',\n    ') + item)
+        self._file.flush()
+        self.count += 1
+    
+    def close(self, metadata):
+        """写入元数据并关闭文件"""
+        metadata = json.dumps(metadata, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+        self._file.write(('\n  ' if self.count else '') + '],\n  "metadata": ' + metadata + '\n}')
+        self._file.close()
+
+
+class ShortResponse(Exception):
+    """页面内容过短，可能是错误页面"""
+    
+    def __init__(self, content):
+        super().__init__(f"内容过短 ({len(content)} 字符)")
+        self.content = content
+
 class FastItchIoScraper:
     """快速itch.io游戏iframe源爬取器"""
     
-    def __init__(self, max_games=5, start_offset=0, delay=0.5, concurrent=True):
+    # 提取器版本，修改get_iframe_src或extract_page的提取逻辑后需要提升版本号，使旧的缓存结果失效
+    EXTRACTOR_VERSION = "fast_scraper/2"
+    
+    def __init__(self, max_games=5, start_offset=0, delay=0.5, concurrent=True, use_cache=True, categories=None,
+                 deadline=None, include_info=None):
         """
         初始化爬取器
         
@@ -106,203 +641,264 @@ class FastItchIoScraper:
             start_offset: 起始偏移量
             delay: 请求间隔时间(秒)
             concurrent: 是否并发爬取
+            use_cache: 是否使用跨任务共享的提取结果缓存
+            categories: 游戏类别列表，多个类别并发获取并交错合并；为空时使用默认列表页
+            deadline: 任务的截止时间(time.time()的时间戳)，所有请求都不会超过这个时间
+            include_info: 需要提取的附加信息(见page_metadata.INFO_FIELDS)，为None时提取简介和缩略图
         """
         self.max_games = max_games
         self.start_offset = start_offset
+        self.categories = normalize_categories(categories)
         self.delay = delay
         self.concurrent = concurrent
         self.results = []
         self.processed_count = 0
         self.successful_count = 0
         self.start_time = datetime.now()
+        self.stats = {}
+        self.discovery_stats = {}  # 多类别发现的耗时和各类别的游戏数量，合并到最终统计中
         self.debug_save_html = True  # 保存HTML用于调试
+        self.include_info = normalize_include_info(include_info)
+        # 并发爬取时页面在解析进程池中解析(PARSE_WORKERS，少于2个CPU核时为None)
+        self.parse_pool = get_parse_pool() if concurrent else None
+        self.cache = get_default_cache(self.EXTRACTOR_VERSION) if use_cache else None
+        self.archive = get_default_archive()  # 原始页面归档，PAGE_ARCHIVE=0时为None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.attempted_count = 0  # 已尝试处理的列表游戏数量
+        self.listing_source = None  # 游戏实际来自的列表页URL，多个类别交错合并时为None
+        self.should_stop = None  # 返回True时在处理下一个游戏前停止（用于取消和暂停任务）
+        self.deadline = deadline
+        self.fetch_stats = {}  # 请求数、对冲请求数、对冲请求先返回的次数和重试次数
+        self.transfer_stats = TransferStats()  # 按主机统计的压缩传输字节数和解压后的字节数
     
     def get_random_user_agent(self):
         """随机获取一个User-Agent"""
         return random.choice(USER_AGENTS)
     
-    def fetch_url(self, url):
+    def fetch_url(self, url, accept=None, min_length=0, archive=False):
         """
-        获取URL内容，增加重试机制
+        获取URL内容
+        
+        超时时间根据该主机最近的耗时自适应，超过p95耗时还没有返回时发送对冲请求，
+        失败时立即重新发送；所有请求都不会超过任务的截止时间(self.deadline)。
         
         Args:
             url: 要获取的URL
+            accept: 可选的Accept请求头，默认为HTML
+            min_length: 内容短于这个长度时视为失败并重新请求(可能是错误页面)
+            archive: 把最终采用的响应写入原始页面归档(启用了PAGE_ARCHIVE时)，
+                     重试和对冲请求中失败或被放弃的响应不写入
             
         Returns:
-            str: 页面HTML内容
+            str: 页面HTML内容，失败时返回空字符串
         """
-        max_retries = 3
-        retry_count = 0
+        def fetch_once(attempt):
+            headers = {
+                'User-Agent': self.get_random_user_agent(),
+                'Accept': accept or 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+                'Accept-Language': 'en-US,en;q=0.5',
+                'Accept-Encoding': ACCEPT_ENCODING,
+                'Connection': 'keep-alive',
+                'Upgrade-Insecure-Requests': '1',
+                'Cache-Control': 'max-age=0',
+                'TE': 'Trailers'
+            }
+            req = urllib.request.Request(url, headers=headers)
+            with url_opener.open(req, timeout=attempt.timeout) as response:
+                body = attempt.read(response)
+                status, response_headers = response.status, response.headers.items()
+            self.transfer_stats.record(url, attempt.wire_bytes, len(body))
+            content = body.decode('utf-8')
+            if len(content) < min_length:
+                raise ShortResponse(content)
+            return content, body, status, response_headers
+        
+        print(f"正在获取URL: {url} (超时 {get_latency_tracker().timeout_for(urllib.parse.urlsplit(url).netloc):.1f}秒)")
+        try:
+            html_content, body, status, response_headers = hedged_fetch(
+                fetch_once, url, deadline=self.deadline, stats=self.fetch_stats
+            )
+            if archive and self.archive is not None:
+                self.archive.append(url, body, status, response_headers)
+        except ShortResponse as e:
+            print(f"页面内容过短 ({len(e.content)} 字符): {url}")
+            html_content = e.content
+        except DeadlineExceeded:
+            print(f"超过任务截止时间，放弃获取URL: {url}")
+            return ""
+        except urllib.error.HTTPError as e:
+            print(f"HTTP错误: {e.code} - {e.reason}, URL: {url}")
+            return ""
+        except urllib.error.URLError as e:
+            print(f"URL错误: {e.reason}, URL: {url}")
+            return ""
+        except Exception as e:
+            print(f"获取URL {url} 失败: {e}")
+            return ""
         
-        while retry_count < max_retries:
+        # 保存HTML用于调试（JSON接口的响应不保存）
+        if self.debug_save_html and accept is None and html_content:
             try:
-                headers = {
-                    'User-Agent': self.get_random_user_agent(),
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-                    'Accept-Language': 'en-US,en;q=0.5',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Cache-Control': 'max-age=0',
-                    'TE': 'Trailers'
-                }
+                if not os.path.exists(DEBUG_HTML_DIR):
+                    os.makedirs(DEBUG_HTML_DIR)
                 
-                print(f"正在获取URL: {url} (尝试 {retry_count+1}/{max_retries})")
-                print(f"使用User-Agent: {headers['User-Agent']}")
+                # 从URL中提取游戏名称用作文件名
+                game_name = url.split('/')[-1]
+                debug_file = os.path.join(DEBUG_HTML_DIR, f"{game_name}.html")
                 
-                req = urllib.request.Request(url, headers=headers)
-                with urllib.request.urlopen(req, timeout=15) as response:  # 增加超时时间
-                    html_content = response.read().decode('utf-8')
-                    
-                    # 保存HTML用于调试
-                    if self.debug_save_html:
-                        try:
-                            if not os.path.exists(DEBUG_HTML_DIR):
-                                os.makedirs(DEBUG_HTML_DIR)
-                            
-                            # 从URL中提取游戏名称用作文件名
-                            game_name = url.split('/')[-1]
-                            debug_file = os.path.join(DEBUG_HTML_DIR, f"{game_name}.html")
-                            
-                            with open(debug_file, 'w', encoding='utf-8') as f:
-                                f.write(html_content)
-                                
-                            print(f"已保存HTML到 {debug_file}")
-                        except Exception as e:
-                            print(f"保存HTML失败: {e}")
+                with open(debug_file, 'w', encoding='utf-8') as f:
+                    f.write(html_content)
                     
-                    return html_content
-            except urllib.error.HTTPError as e:
-                print(f"HTTP错误: {e.code} - {e.reason}, URL: {url}")
-                retry_count += 1
-                if retry_count < max_retries:
-                    wait_time = retry_count * 2  # 逐渐增加等待时间
-                    print(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"达到最大重试次数，放弃获取URL: {url}")
-                    return ""
-            except urllib.error.URLError as e:
-                print(f"URL错误: {e.reason}, URL: {url}")
-                retry_count += 1
-                if retry_count < max_retries:
-                    wait_time = retry_count * 2
-                    print(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"达到最大重试次数，放弃获取URL: {url}")
-                    return ""
+                print(f"已保存HTML到 {debug_file}")
             except Exception as e:
-                print(f"获取URL {url} 失败: {e}")
-                retry_count += 1
-                if retry_count < max_retries:
-                    wait_time = retry_count * 2
-                    print(f"等待 {wait_time} 秒后重试...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"达到最大重试次数，放弃获取URL: {url}")
-                    return ""
+                print(f"保存HTML失败: {e}")
+        
+        return html_content
+    
+    def fetch_listing_feed(self, base_url, offset):
+        """
+        通过列表页的JSON内容片段接口获取游戏
+        
+        Args:
+            base_url: 列表页URL（不含分页参数）
+            offset: 分页偏移量
+            
+        Returns:
+            list: (游戏URL, 标题, 游戏ID)列表；接口不可用时返回None
+        """
+        feed_url = build_listing_feed_url(base_url, offset)
+        feed_text = self.fetch_url(feed_url, accept='application/json')
+        if not feed_text:
+            return None
+        
+        parsed = run_parser(self.parse_pool, parse_listing_feed, feed_text).result()
+        if parsed is None:
+            print(f"JSON接口返回的不是有效的内容片段: {feed_url}")
+            return None
+        
+        games, _ = parsed
+        # 偏移量不在页首时跳过本页前面的游戏
+        games = games[offset % LISTING_PAGE_SIZE:]
+        print(f"从JSON接口解析到 {len(games)} 个游戏 ({len(feed_text)} 字符)")
+        return [(game['url'], game['title'], game['game_id']) for game in games]
+    
+    def fetch_listing_page(self, base_url, description, offset):
+        """
+        获取列表页从偏移量开始的一页游戏，JSON接口不可用时回退到完整HTML页面
+        
+        Returns:
+            list: (游戏URL, 标题, 游戏ID)列表
+        """
+        feed_games = self.fetch_listing_feed(base_url, offset)
+        if feed_games:
+            return feed_games
+        
+        print(f"{description} JSON接口不可用，回退到HTML页面")
+        games = []
+        self.extract_games_from_html(
+            f"{base_url}?offset={offset}", description, offset, LISTING_PAGE_SIZE, games,
+            lambda game_url, game_title, game_id: games.append((game_url, game_title, game_id))
+        )
+        return games
+    
+    def get_category_game_urls(self, max_to_fetch):
+        """
+        从多个类别的列表页获取游戏
         
-        return ""
+        各类别独立分页并发请求，结果按类别轮流交错合并并去重
+        
+        Args:
+            max_to_fetch: 最多获取的游戏数量
+            
+        Returns:
+            list: (游戏URL, 标题, 游戏ID)列表
+        """
+        def fetch_page(category, offset):
+            page = self.fetch_listing_page(category_listing_url(category), f"{category}类别", offset)
+            return [{'url': game_url, 'title': game_title, 'game_id': game_id} for game_url, game_title, game_id in page]
+        
+        started = time.time()
+        discovery = CategoryDiscovery(fetch_page, self.categories, self.start_offset)
+        games = discovery.next_batch(max_to_fetch)
+        self.discovery_stats['discovery_seconds'] = round(time.time() - started, 2)
+        self.discovery_stats['discovery_page_requests'] = discovery.page_requests
+        
+        category_counts = {}
+        for game in games:
+            category_counts[game['category']] = category_counts.get(game['category'], 0) + 1
+            print(f"添加游戏: {game['title']} ({game['url']}) [{game['category']}]")
+        self.discovery_stats['category_counts'] = category_counts
+        self.processed_count += len(games)
+        
+        print(f"从 {len(self.categories)} 个类别获取了 {len(games)} 个游戏，"
+              f"请求 {discovery.page_requests} 个列表页，耗时 {self.discovery_stats['discovery_seconds']}秒")
+        return [(game['url'], game['title'], game['game_id']) for game in games]
     
     def get_game_page_urls(self, limit=None):
         """
         获取游戏页面URL列表
         
+        每个来源优先使用JSON内容片段接口，失败时回退到完整HTML页面
+        
         Args:
             limit: 限制获取的游戏数量
             
         Returns:
-            list: 游戏URL和标题的列表
+            list: (游戏URL, 标题, 游戏ID)列表，HTML宽松模式下游戏ID可能为None
         """
         offset = self.start_offset
         max_to_fetch = self.max_games if limit is None else min(self.max_games, limit)
         games = []
-        page_size = 36  # itch.io每页显示36个游戏
+        seen_urls = set()
         
         print(f"------------------------------")
         print(f"开始获取游戏列表 - 最大数量: {max_to_fetch}, 偏移量: {offset}")
         
+        if self.categories:
+            games = self.get_category_game_urls(max_to_fetch)
+            print(f"------------------------------")
+            return games
+        
         # 尝试不同的页面类型
         page_types = [
-            # 格式: (URL模板, 描述)
-            (f"https://itch.io/games/free/platform-web?offset={offset}", "普通自由网页游戏"),
-            (f"https://itch.io/games/top-rated/free/platform-web?offset={offset}", "排名最高网页游戏"),
-            (f"https://itch.io/games/genre-action/free/platform-web?offset={offset}", "动作类游戏"),
-            (f"https://itch.io/games/genre-puzzle/free/platform-web?offset={offset}", "解谜类游戏")
+            # 格式: (列表页URL, 描述)
+            (DEFAULT_LISTING_URL, "普通自由网页游戏"),
+            ("https://itch.io/games/top-rated/free/platform-web", "排名最高网页游戏"),
+            ("https://itch.io/games/genre-action/free/platform-web", "动作类游戏"),
+            ("https://itch.io/games/genre-puzzle/free/platform-web", "解谜类游戏")
         ]
         
+        def add_game(game_url, game_title, game_id):
+            # 跳过重复的游戏URL
+            if game_url in seen_urls:
+                return
+            seen_urls.add(game_url)
+            games.append((game_url, game_title, game_id))
+            self.processed_count += 1
+            print(f"添加游戏: {game_title} ({game_url})")
+        
         # 从列表中尝试不同的页面类型，直到获取足够的游戏
-        for url_template, description in page_types:
+        for base_url, description in page_types:
             if len(games) >= max_to_fetch:
                 break
-                
-            print(f"尝试从 {description} 列表获取游戏 (URL: {url_template})")
+            
+            print(f"尝试从 {description} 列表获取游戏 (URL: {base_url})")
             
             try:
-                html_content = self.fetch_url(url_template)
-                if not html_content:
-                    print(f"无法获取 {description} 列表HTML内容")
-                    continue
-                
-                print(f"成功获取 {description} 列表HTML内容，长度: {len(html_content)} 字符")
-                
-                # 保存列表页HTML用于调试
-                if self.debug_save_html:
-                    try:
-                        debug_file = os.path.join(DEBUG_HTML_DIR, f"game_list_{description.replace(' ', '_')}_offset_{offset}.html")
-                        with open(debug_file, 'w', encoding='utf-8') as f:
-                            f.write(html_content)
-                        print(f"已保存游戏列表HTML到 {debug_file}")
-                    except Exception as e:
-                        print(f"保存游戏列表HTML失败: {e}")
-                
-                # 使用三种不同的正则表达式模式尝试提取游戏链接
-                extraction_patterns = [
-                    # 标准游戏链接格式
-                    (r'<a\s+class="game_link"\s+href="(https://[^"]+\.itch\.io/[^"]+)"[^>]*>[\s\S]*?<div\s+class="game_title">([\s\S]*?)</div>', "标准模式"),
-                    # 备用格式 - 链接后跟标题
-                    (r'<a\s+href="(https://[^"]+\.itch\.io/[^"]+)"[^>]*class="[^"]*game[^"]*"[^>]*>[\s\S]*?<div\s+class="[^"]*title[^"]*">([\s\S]*?)</div>', "备用模式"),
-                    # 最宽松模式 - 任何itch.io链接
-                    (r'<a\s+href="(https://[^"]+\.itch\.io/[^"]+)"[^>]*>([\s\S]*?)</a>', "宽松模式")
-                ]
-                
-                for pattern, pattern_name in extraction_patterns:
-                    if len(games) >= max_to_fetch:
-                        break
-                        
-                    matches = re.findall(pattern, html_content, re.DOTALL)
-                    print(f"使用{pattern_name}找到 {len(matches)} 个游戏匹配项")
-                    
-                    if matches:
-                        # 处理找到的匹配项
-                        for game_url, game_title in matches:
-                            if len(games) >= max_to_fetch:
-                                break
-                                
-                            # 检查URL格式
-                            if not game_url.startswith("https://") or not ".itch.io/" in game_url:
-                                continue
-                                
-                            # 清理标题
-                            clean_title = html.unescape(game_title.strip())
-                            clean_title = re.sub(r'<[^>]+>', '', clean_title)
-                            clean_title = clean_title.strip()
-                            
-                            # 跳过没有标题的游戏
-                            if not clean_title:
-                                continue
-                                
-                            # 跳过重复的游戏URL
-                            if any(existing_url == game_url for existing_url, _ in games):
-                                continue
-                            
-                            games.append((game_url, clean_title))
-                            self.processed_count += 1
-                            
-                            print(f"添加游戏: {clean_title} ({game_url})")
+                feed_games = self.fetch_listing_feed(base_url, offset)
+                if feed_games:
+                    for game_url, game_title, game_id in feed_games:
+                        if len(games) >= max_to_fetch:
+                            break
+                        add_game(game_url, game_title, game_id)
+                else:
+                    print(f"{description} JSON接口不可用，回退到HTML页面")
+                    self.extract_games_from_html(f"{base_url}?offset={offset}", description, offset, max_to_fetch, games, add_game)
                 
                 if games:
                     # 如果这个来源找到了游戏，就不再尝试其他来源
+                    self.listing_source = base_url
                     print(f"从 {description} 来源找到 {len(games)} 个游戏，停止搜索其他来源")
                     break
             except Exception as e:
@@ -314,163 +910,126 @@ class FastItchIoScraper:
         print(f"------------------------------")
         return games
     
-    def get_iframe_src(self, game_page_html, game_url):
+    def extract_games_from_html(self, page_url, description, offset, max_to_fetch, games, add_game):
         """
-        从游戏页面中提取iframe源
+        从完整的列表页HTML中提取游戏（JSON接口不可用时的回退方案）
         
         Args:
-            game_page_html: 游戏页面HTML内容
-            game_url: 游戏URL，用于日志
-            
-        Returns:
-            str: iframe源URL
+            page_url: 列表页URL
+            description: 来源描述
+            offset: 分页偏移量
+            max_to_fetch: 最多获取的游戏数量
+            games: 已获取的游戏列表
+            add_game: 添加游戏的回调函数
         """
-        iframe_src = None
-        extraction_method = ""
-        
-        print(f"------------------------------")
-        print(f"开始提取iframe源 - {game_url}")
+        html_content = self.fetch_url(page_url)
+        if not html_content:
+            print(f"无法获取 {description} 列表HTML内容")
+            return
         
-        # 方法1: 检查html_embed区域中的iframe标签
-        if not iframe_src:
-            try:
-                print("尝试方法1: html_embed > iframe")
-                match = re.search(r'<div[^>]*id=["\'](html_embed_content|html_embed)["\']\s*[^>]*>[\s\S]*?<iframe[^>]*src=["\'](.*?)["\']', game_page_html, re.DOTALL)
-                if match:
-                    iframe_src = html.unescape(match.group(2))
-                    extraction_method = "html_embed_iframe"
-                    print(f"方法1成功: {iframe_src}")
-                else:
-                    print("方法1未找到匹配")
-            except Exception as e:
-                print(f"方法1出错: {e}")
+        print(f"成功获取 {description} 列表HTML内容，长度: {len(html_content)} 字符")
         
-        # 方法2: 检查html_embed区域中的data-iframe属性
-        if not iframe_src:
+        # 保存列表页HTML用于调试
+        if self.debug_save_html:
             try:
-                print("尝试方法2: html_embed > data-iframe")
-                match = re.search(r'<div[^>]*id=["\'](html_embed_content|html_embed)["\']\s*[^>]*data-iframe=["\']([^"\']+)["\']', game_page_html)
-                if match:
-                    iframe_src = html.unescape(match.group(2))
-                    extraction_method = "html_embed_data_iframe"
-                    print(f"方法2成功: {iframe_src}")
-                else:
-                    print("方法2未找到匹配")
+                debug_file = os.path.join(DEBUG_HTML_DIR, f"game_list_{description.replace(' ', '_')}_offset_{offset}.html")
+                with open(debug_file, 'w', encoding='utf-8') as f:
+                    f.write(html_content)
+                print(f"已保存游戏列表HTML到 {debug_file}")
             except Exception as e:
-                print(f"方法2出错: {e}")
+                print(f"保存游戏列表HTML失败: {e}")
         
-        # 方法3: 检查iframe_placeholder元素
-        if not iframe_src:
-            try:
-                print("尝试方法3: iframe_placeholder")
-                match = re.search(r'<div[^>]*class=["\'](iframe_placeholder)["\']\s*[^>]*data-iframe=["\']([^"\']+)["\']', game_page_html)
-                if match:
-                    iframe_src = html.unescape(match.group(2))
-                    extraction_method = "iframe_placeholder"
-                    print(f"方法3成功: {iframe_src}")
-                else:
-                    print("方法3未找到匹配")
-            except Exception as e:
-                print(f"方法3出错: {e}")
+        # 优先解析带游戏ID的游戏单元格
+        cell_games = run_parser(self.parse_pool, parse_game_cells, html_content).result()
+        print(f"使用游戏单元格模式找到 {len(cell_games)} 个游戏匹配项")
+        for game in cell_games:
+            if len(games) >= max_to_fetch:
+                return
+            add_game(game['url'], game['title'], game['game_id'])
+        if cell_games:
+            return
+        
+        # 使用三种不同的正则表达式模式尝试提取游戏链接
+        extraction_patterns = [
+            # 标准游戏链接格式
+            (r'<a\s+class="game_link"\s+href="(https://[^"]+\.itch\.io/[^"]+)"[^>]*>[\s\S]*?<div\s+class="game_title">([\s\S]*?)</div>', "标准模式"),
+            # 备用格式 - 链接后跟标题
+            (r'<a\s+href="(https://[^"]+\.itch\.io/[^"]+)"[^>]*class="[^"]*game[^"]*"[^>]*>[\s\S]*?<div\s+class="[^"]*title[^"]*">([\s\S]*?)</div>', "备用模式"),
+            # 最宽松模式 - 任何itch.io链接
+            (r'<a\s+href="(https://[^"]+\.itch\.io/[^"]+)"[^>]*>([\s\S]*?)</a>', "宽松模式")
+        ]
         
-        # 方法4: 查找包含id="game_drop"的区域
-        if not iframe_src:
-            try:
-                print("尝试方法4: game_drop区域")
-                match = re.search(r'<div[^>]*id=["\'](game_drop)["\']\s*[^>]*>[\s\S]*?data-iframe=["\'](.*?)["\']', game_page_html, re.DOTALL)
-                if match:
-                    iframe_src = html.unescape(match.group(2))
-                    extraction_method = "game_drop"
-                    print(f"方法4成功: {iframe_src}")
-                else:
-                    print("方法4未找到匹配")
-            except Exception as e:
-                print(f"方法4出错: {e}")
+        for pattern, pattern_name in extraction_patterns:
+            if len(games) >= max_to_fetch:
+                break
+                
+            matches = re.findall(pattern, html_content, re.DOTALL)
+            print(f"使用{pattern_name}找到 {len(matches)} 个游戏匹配项")
+            
+            # 处理找到的匹配项
+            for game_url, game_title in matches:
+                if len(games) >= max_to_fetch:
+                    break
+                    
+                # 检查URL格式
+                if not game_url.startswith("https://") or not ".itch.io/" in game_url:
+                    continue
+                    
+                # 清理标题
+                clean_title = html.unescape(game_title.strip())
+                clean_title = re.sub(r'<[^>]+>', '', clean_title)
+                clean_title = clean_title.strip()
+                
+                # 跳过没有标题的游戏
+                if not clean_title:
+                    continue
+                
+                add_game(game_url, clean_title, None)
+    
+    def get_iframe_src(self, game_page_html, game_url):
+        """
+        从游戏页面中提取iframe源(见parse_pool.find_iframe_src)
         
-        # 方法5: 直接搜索data-iframe属性，不限制元素类型
-        if not iframe_src:
-            try:
-                print("尝试方法5: 全局data-iframe搜索")
-                match = re.search(r'data-iframe=["\']([^"\']+)["\']', game_page_html)
-                if match:
-                    iframe_src = html.unescape(match.group(1))
-                    extraction_method = "global_data_iframe"
-                    print(f"方法5成功: {iframe_src}")
-                else:
-                    print("方法5未找到匹配")
-            except Exception as e:
-                print(f"方法5出错: {e}")
+        Returns:
+            tuple: (iframe源URL, 提取方法)，没有找到时iframe源为None
+        """
+        return find_iframe_src(game_page_html, game_url)
+    
+    def extract_page(self, game_page_html, game_url):
+        """
+        从游戏页面中提取iframe源和include_info指定的附加信息
         
-        # 方法6: 搜索嵌入式iframe
-        if not iframe_src:
-            try:
-                print("尝试方法6: 嵌入式iframe")
-                match = re.search(r'<iframe[^>]*src=["\']([^"\']+)["\'][^>]*class=["\'](game_frame)["\']', game_page_html)
-                if match:
-                    iframe_src = html.unescape(match.group(1))
-                    extraction_method = "embedded_iframe"
-                    print(f"方法6成功: {iframe_src}")
-                else:
-                    print("方法6未找到匹配")
-            except Exception as e:
-                print(f"方法6出错: {e}")
+        附加信息(简介、缩略图、作者、标签、评分、嵌入尺寸等)在一次遍历中提取，
+        不需要为了这些信息再次请求页面。
         
-        # 尝试清理和验证提取的URL
-        if iframe_src:
-            # 移除可能的换行符和多余空格
-            iframe_src = iframe_src.strip().replace('\n', '').replace('\r', '')
-            
-            # 如果iframe源不是URL格式，但包含完整的iframe标签，则尝试从中提取src
-            if '<iframe' in iframe_src and 'src=' in iframe_src:
-                try:
-                    print("从完整iframe标签中提取src")
-                    tag_match = re.search(r'src=["\']([^"\']+)["\']', iframe_src)
-                    if tag_match:
-                        iframe_src = html.unescape(tag_match.group(1))
-                        print(f"从标签中提取成功: {iframe_src}")
-                except Exception as e:
-                    print(f"从标签提取失败: {e}")
-
-            # 检查提取的URL是否有效
-            is_valid = iframe_src.startswith(('http://', 'https://', '//', '/')) and len(iframe_src) > 10
-            print(f"URL验证: {'有效' if is_valid else '无效'} - {iframe_src}")
-            
-            if not is_valid:
-                iframe_src = None
-                extraction_method = ""
-                print("提取的URL无效，设置为None")
-        
-        if iframe_src:
-            print(f"成功提取iframe源: {iframe_src}")
-            print(f"提取方法: {extraction_method}")
-        else:
-            print(f"所有方法均未找到iframe源")
+        Args:
+            game_page_html: 游戏页面HTML内容
+            game_url: 游戏URL，用于日志
             
-        print(f"------------------------------")
-        
-        return iframe_src, extraction_method
+        Returns:
+            dict: 提取结果，没有找到iframe源时iframe_src为None；include_info记录提取了哪些附加信息
+        """
+        return parse_game_page(game_page_html, game_url, self.include_info)
     
-    def process_game(self, game_url, game_title):
+    def start_game(self, game_url, game_title):
         """
-        处理单个游戏页面
+        获取游戏页面并开始提取
+        
+        命中缓存时直接使用缓存的提取结果；否则交给解析进程池，获取下一个游戏的同时在其他CPU核上解析
+        (没有进程池时在当前线程中解析)。
         
         Args:
             game_url: 游戏URL
             game_title: 游戏标题
             
         Returns:
-            dict: 游戏信息字典
+            tuple: (提取结果的Future, 页面哈希, 页面HTML, 是否命中缓存)，获取页面失败时返回None
         """
         print(f"开始处理游戏: {game_title} ({game_url})")
         
         try:
-            # 尝试两次获取页面内容，第二次使用不同的UA
-            game_page_html = self.fetch_url(game_url)
-            
-            if not game_page_html or len(game_page_html) < 1000:  # HTML太短可能是错误
-                print(f"首次获取页面失败或内容过短 ({len(game_page_html) if game_page_html else 0} 字符)，尝试第二次获取...")
-                time.sleep(1)  # 延迟1秒再试
-                game_page_html = self.fetch_url(game_url)
+            # HTML太短可能是错误页面，fetch_url会立即重新请求(使用不同的UA)
+            game_page_html = self.fetch_url(game_url, min_length=1000, archive=True)
             
             if not game_page_html:
                 print(f"无法获取游戏页面: {game_url}")
@@ -478,44 +1037,62 @@ class FastItchIoScraper:
                 
             print(f"成功获取游戏页面，HTML长度: {len(game_page_html)} 字符")
             
-            iframe_src, extraction_method = self.get_iframe_src(game_page_html, game_url)
+            # 页面内容没有变化时复用缓存的提取结果
+            page_hash = page_content_hash(game_page_html)
+            extracted = self.cache.get(game_url, page_hash, self.EXTRACTOR_VERSION) if self.cache else None
+            # 缓存的结果缺少这次需要的附加信息时重新提取
+            if extracted is not None and extracted['iframe_src'] and not set(self.include_info) <= set(extracted.get('include_info', ())):
+                extracted = None
+            if extracted is not None:
+                self.cache_hits += 1
+                print(f"命中提取结果缓存: {game_url}")
+                return completed_future(extracted), page_hash, None, True
             
+            self.cache_misses += 1
+            future = run_parser(self.parse_pool, parse_game_page, game_page_html, game_url, self.include_info)
+            return future, page_hash, game_page_html, False
+                
+        except Exception as e:
+            print(f"处理游戏 {game_title} 失败: {e}")
+            import traceback
+            print(f"详细错误: {traceback.format_exc()}")
+            return None
+    
+    def finish_game(self, started, game_url, game_title, game_id=None):
+        """
+        等待start_game开始的提取完成并生成结果
+        
+        Returns:
+            GameResult: 游戏信息，没有找到iframe源时返回None
+        """
+        if started is None:
+            return None
+        future, page_hash, game_page_html, from_cache = started
+        
+        try:
+            try:
+                extracted = future.result()
+            except Exception as e:
+                # 解析进程异常退出时在当前线程中重新解析
+                print(f"解析进程出错，改为在当前线程中解析: {e}")
+                extracted = self.extract_page(game_page_html, game_url)
+            if not from_cache and self.cache:
+                self.cache.put(game_url, page_hash, self.EXTRACTOR_VERSION, extracted)
+            
+            iframe_src = extracted['iframe_src']
             if iframe_src:
                 self.successful_count += 1
                 print(f"成功找到iframe源: {iframe_src}")
                 
-                # 获取额外的游戏信息
-                game_info = {
-                    "title": game_title,
-                    "url": game_url,
-                    "iframe_src": iframe_src,
-                    "extracted_method": extraction_method,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                # 尝试提取游戏简介
-                try:
-                    description_match = re.search(r'<div[^>]*class=["\']game_description["\'][^>]*>([\s\S]*?)</div>', game_page_html)
-                    if description_match:
-                        description = description_match.group(1).strip()
-                        # 清理HTML标签
-                        description = re.sub(r'<[^>]+>', '', description)
-                        # 实体解码
-                        description = html.unescape(description)
-                        game_info["description"] = description
-                except Exception as e:
-                    print(f"提取游戏简介失败: {e}")
-                
-                # 尝试提取缩略图URL
-                try:
-                    thumbnail_match = re.search(r'<img[^>]*class=["\']game_thumb["\'][^>]*src=["\']([^"\']+)["\']', game_page_html)
-                    if thumbnail_match:
-                        thumbnail_url = thumbnail_match.group(1)
-                        game_info["thumbnail_url"] = thumbnail_url
-                except Exception as e:
-                    print(f"提取缩略图URL失败: {e}")
-                
-                return game_info
+                return GameResult(
+                    title=game_title,
+                    url=game_url,
+                    iframe_src=iframe_src,
+                    extracted_method=extracted['extracted_method'],
+                    timestamp=datetime.now().isoformat(),
+                    game_id=game_id,
+                    **{field: extracted.get(field) for field in info_fields(self.include_info)}
+                )
             else:
                 print(f"未找到iframe源: {game_url}")
                 return None
@@ -526,39 +1103,76 @@ class FastItchIoScraper:
             print(f"详细错误: {traceback.format_exc()}")
             return None
     
-    def scrape(self):
-        """执行爬取过程"""
-        print(f"==========================================")
-        print(f"开始爬取 - 最大游戏数: {self.max_games}, 起始偏移: {self.start_offset}")
-        print(f"开始时间: {self.start_time.isoformat()}")
-        print(f"==========================================")
+    def process_game(self, game_url, game_title, game_id=None):
+        """
+        处理单个游戏页面
         
-        # 检查是否是单游戏模式（爬取单个游戏可以优化性能）
+        Args:
+            game_url: 游戏URL
+            game_title: 游戏标题
+            game_id: 列表页中得到的itch.io游戏ID
+            
+        Returns:
+            GameResult: 游戏信息
+        """
+        return self.finish_game(self.start_game(game_url, game_title), game_url, game_title, game_id)
+    
+    def iter_scrape(self):
+        """
+        以生成器方式执行爬取过程，每提取到一个结果就立即产出
+        
+        结果不会保存在爬取器中，调用方处理完即可丢弃，内存占用与max_games无关。
+        生成器结束后统计信息保存在self.stats中。
+        
+        Yields:
+            GameResult: 游戏结果
+        """
+        print(f"==========================================")
+        print(f"开始爬取 - 最大游戏数: {self.max_games}, 起始偏移: {self.start_offset}")
+        print(f"开始时间: {self.start_time.isoformat()}")
+        print(f"==========================================")
+        
+        # 检查是否是单游戏模式（爬取单个游戏可以优化性能）
         single_game_mode = self.max_games == 1
         print(f"单游戏模式: {single_game_mode}")
         
+        # 如果是单游戏模式，设置更激进的超时保护
+        if single_game_mode:
+            max_time_allowed = 8  # 单游戏模式下只给8秒时间
+        else:
+            max_time_allowed = 50  # 多游戏模式下给50秒时间
+        
+        # 任务的截止时间更早时以它为准，列表页和游戏页的请求都不会超过这个时间
+        scrape_deadline = self.start_time.timestamp() + max_time_allowed
+        self.deadline = scrape_deadline if self.deadline is None else min(self.deadline, scrape_deadline)
+        
         # 获取游戏页面URL
         game_urls = self.get_game_page_urls()
         
         if not game_urls:
             print("未找到任何游戏，爬取结束")
-            return [], {
+            self.stats = {
                 "total_processed": 0,
                 "successful_extractions": 0,
                 "elapsed_seconds": 0,
                 "timestamp": datetime.now().isoformat(),
                 "error": "No games found in the list page"
             }
+            return
         
-        # 如果是单游戏模式，设置更激进的超时保护
-        if single_game_mode:
-            max_time_allowed = 8  # 单游戏模式下只给8秒时间
-        else:
-            max_time_allowed = 50  # 多游戏模式下给50秒时间
+        # 有解析进程池时获取和解析流水线进行：页面交给解析进程后立即获取下一个游戏，
+        # 已经解析完成的游戏按列表顺序产出
+        pipelined = self.parse_pool is not None and not single_game_mode
+        pending = deque()
         
         # 处理每个游戏
-        for i, (game_url, game_title) in enumerate(game_urls):
+        # 在等待和处理当前游戏的同时预热接下来几个游戏的连接，每处理一个游戏向后多预热一个
+        warmer = get_connection_warmer()
+        warmer.warm((url for url, _, _ in game_urls[1:1 + WARM_AHEAD_GAMES]), context=url_opener.ssl_context)
+        for i, (game_url, game_title, game_id) in enumerate(game_urls):
             print(f"\n处理游戏 {i+1}/{len(game_urls)}: {game_title}")
+            warmer.warm((url for url, _, _ in game_urls[i + 1 + WARM_AHEAD_GAMES:i + 2 + WARM_AHEAD_GAMES]),
+                        context=url_opener.ssl_context)
             
             # 添加延迟（但单游戏模式下减少延迟）
             if i > 0:
@@ -568,22 +1182,36 @@ class FastItchIoScraper:
                     delay_time = self.delay
                     
                 print(f"等待 {delay_time} 秒...")
-                time.sleep(delay_time)
+                time.sleep(max(0, min(delay_time, self.deadline - time.time())))
                 
             # 检查是否超时
             elapsed = (datetime.now() - self.start_time).total_seconds()
-            if elapsed > max_time_allowed:
+            if time.time() >= self.deadline:
                 print(f"接近时间限制 ({elapsed:.2f}秒)，已处理 {i} 个游戏，提前结束")
                 break
+            
+            # 检查是否收到取消或暂停请求
+            if self.should_stop is not None and self.should_stop():
+                print(f"收到停止请求，已处理 {i} 个游戏，停止爬取")
+                break
                 
             # 处理游戏
-            result = self.process_game(game_url, game_title)
+            self.attempted_count = i + 1
+            if pipelined:
+                pending.append((i, game_url, game_title, game_id, self.start_game(game_url, game_title)))
+                while pending and (pending[0][4] is None or pending[0][4][0].done()):
+                    result = self.finish_pending(*pending.popleft())
+                    if result:
+                        yield result
+                continue
+            result = self.process_game(game_url, game_title, game_id)
             if result:
-                self.results.append(result)
+                result.position = self.start_offset + i
                 print(f"成功添加结果 - {game_title}")
+                yield result
                 
                 # 如果是单游戏模式并且已获取一个结果，直接结束
-                if single_game_mode and len(self.results) > 0:
+                if single_game_mode:
                     print("单游戏模式：已获取结果，提前结束爬取")
                     break
             else:
@@ -591,22 +1219,41 @@ class FastItchIoScraper:
             
             # 再次检查是否超时（处理游戏可能耗时很长）
             elapsed = (datetime.now() - self.start_time).total_seconds()
-            if elapsed > max_time_allowed:
+            if time.time() >= self.deadline:
                 print(f"处理游戏后超过时间限制 ({elapsed:.2f}秒)，提前结束")
                 break
         
+        # 等待还在解析的游戏
+        while pending:
+            result = self.finish_pending(*pending.popleft())
+            if result:
+                yield result
+        
+        # 关闭没有用到的预热连接
+        warmer.close_idle()
+        
         # 生成统计信息
         end_time = datetime.now()
         elapsed_time = (end_time - self.start_time).total_seconds()
-        stats = {
+        self.stats = {
             "total_processed": self.processed_count,
             "successful_extractions": self.successful_count,
             "elapsed_seconds": elapsed_time,
             "timestamp": end_time.isoformat(),
             "start_time": self.start_time.isoformat(),
             "end_time": end_time.isoformat(),
-            "single_game_mode": single_game_mode
+            "single_game_mode": single_game_mode,
+            "covered_range": [self.start_offset, self.start_offset + self.attempted_count]
         }
+        if self.cache:
+            self.stats["cache_hits"] = self.cache_hits
+            self.stats["cache_misses"] = self.cache_misses
+        self.stats.update(self.discovery_stats)
+        self.stats["fetch"] = dict(self.fetch_stats)
+        self.stats["transfer"] = self.transfer_stats.snapshot()
+        self.stats["connections"] = dict(get_dns_cache().stats(), **warmer.stats())
+        if self.parse_pool is not None:
+            self.stats["parse_pool"] = self.parse_pool.stats()
         
         print(f"==========================================")
         print(f"爬取完成")
@@ -615,93 +1262,402 @@ class FastItchIoScraper:
         print(f"耗时 {elapsed_time:.2f} 秒")
         print(f"成功率: {(self.successful_count / max(1, self.processed_count) * 100):.2f}%")
         print(f"==========================================")
+    
+    def finish_pending(self, index, game_url, game_title, game_id, started):
+        """流水线中一个游戏的提取完成后生成结果并设置列表位置"""
+        result = self.finish_game(started, game_url, game_title, game_id)
+        if result:
+            result.position = self.start_offset + index
+            print(f"成功添加结果 - {game_title}")
+        else:
+            print(f"未能获取结果 - {game_title}")
+        return result
+    
+    def scrape(self, on_result=None):
+        """
+        执行爬取过程
+        
+        Args:
+            on_result: 可选的回调函数，每得到一个GameResult就调用一次。
+                       提供回调时结果不会保存在self.results中
+            
+        Returns:
+            tuple: (结果字典列表, 统计信息)
+        """
+        for result in self.iter_scrape():
+            if on_result is not None:
+                on_result(result)
+            else:
+                self.results.append(result.to_dict())
         
-        return self.results, stats
+        return self.results, self.stats
+    
+# 爬取子进程每处理这么多个游戏保存一次部分结果
+JOB_SAVE_INTERVAL = 10
 
-def run_extraction_job(job_id, params):
+# Vercel上直接运行的任务的截止时间(秒)，要小于vercel.json中的maxDuration
+JOB_DEADLINE_SECONDS = float(os.environ.get('JOB_DEADLINE_SECONDS', '8'))
+
+# Vercel上函数的最长运行时间(秒)，与vercel.json中的maxDuration相同；任务结束后在剩余时间内发送通知
+FUNCTION_MAX_SECONDS = float(os.environ.get('FUNCTION_MAX_SECONDS', '10'))
+
+def job_stop_file(job_id):
+    """爬取子进程检查的停止文件，文件出现时子进程保存结果并退出"""
+    return os.path.join(JOBS_DATA_DIR, f"{job_id}.stop")
+
+def request_job_stop(job_id, action):
+    """
+    请求正在运行的任务在处理下一个游戏前停止
+
+    Args:
+        job_id: 任务ID
+        action: 'pause' 或 'cancel'
+    """
+    update_job(job_id, {'control': action})
+    try:
+        with open(job_stop_file(job_id), 'w', encoding='utf-8') as f:
+            f.write(action)
+    except Exception as e:
+        print(f"Error writing stop file for job {job_id}: {e}")
+
+def apply_job_control(job_id, action, checkpoint=None):
+    """
+    把任务标记为已暂停或已取消
+
+    暂停的任务保留检查点(偏移量游标和部分结果文件)，恢复时从检查点继续；
+    取消的任务删除部分结果。
+
+    Args:
+        job_id: 任务ID
+        action: 'pause' 或 'cancel'
+        checkpoint: 最新的检查点，为None时使用任务记录中的检查点
+    """
+    if checkpoint is None:
+        checkpoint = jobs[job_id].get('checkpoint')
+    
+    if action == 'pause':
+        update_job(job_id, {
+            'status': 'paused',
+            'paused_at': datetime.now().isoformat(),
+            'control': None,
+            'checkpoint': checkpoint,
+            'processed': (checkpoint or {}).get('processed', jobs[job_id].get('processed', 0))
+        })
+    else:
+        for part_file in (checkpoint or {}).get('part_files', []):
+            if os.path.exists(part_file):
+                os.remove(part_file)
+        update_job(job_id, {
+            'status': 'cancelled',
+            'cancelled_at': datetime.now().isoformat(),
+            'control': None,
+            'checkpoint': None
+        })
+    
+    stop_file = job_stop_file(job_id)
+    if os.path.exists(stop_file):
+        os.remove(stop_file)
+
+def recover_interrupted_part(job_id, checkpoint):
+    """
+    恢复服务器崩溃时正在爬取的分片已经保存的部分结果，并把游标移到这些结果之后
+    """
+    part_file = f"results/job_{job_id}_part{len(checkpoint['part_files'])}.json"
+    if not os.path.exists(part_file):
+        return
+    try:
+        with open(part_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception:
+        os.remove(part_file)
+        return
+    positions = [result['position'] for result in data if isinstance(result.get('position'), int)]
+    if not positions or max(positions) < checkpoint['cursor']:
+        os.remove(part_file)
+        return
+    checkpoint['part_files'].append(part_file)
+    checkpoint['processed'] += max(positions) + 1 - checkpoint['cursor']
+    checkpoint['cursor'] = max(positions) + 1
+
+def job_profile_prefix(job_id, start_offset):
+    """性能分析文件的路径前缀，和任务结果放在同一目录"""
+    return os.path.join(RESULTS_DIR, f"job_{job_id}_profile_{start_offset}")
+
+def record_profile_files(job_id, paths):
+    """把已生成的性能分析文件记录到任务中"""
+    profile_files = list(jobs[job_id].get('profile_files', []))
+    for path in paths:
+        if os.path.exists(path) and path not in profile_files:
+            profile_files.append(path)
+    update_job(job_id, {'profile_files': profile_files})
+
+@contextlib.contextmanager
+def profile_job(job_id):
+    """在本进程中运行的任务(Vercel)按任务参数进行性能分析"""
+    params = jobs[job_id].get('params') or {}
+    mode = params.get('profile')
+    if not mode:
+        yield
+        return
+    cursor = (jobs[job_id].get('checkpoint') or {}).get('cursor', params.get('offset') or 0)
+    profiler = Profiler(mode, job_profile_prefix(job_id, cursor)).start()
+    try:
+        yield
+    finally:
+        record_profile_files(job_id, profiler.stop())
+
+def run_scraper_process(job_id, start_offset, max_games, delay, output_file, log, processed_base=0, stop_file=None,
+                        categories=None, profile=None, include_info=None):
     """
-    Run the iframe extraction job in the background
+    Run iframe_scraper.py for one offset range and stream its output to the job log
     
     Args:
         job_id: Unique job identifier
-        params: Job parameters
+        start_offset: First listing offset to scrape
+        max_games: Number of listing games to scrape
+        delay: Request delay passed to the scraper
+        output_file: Where the scraper writes its results
+        log: Open job log file
+        processed_base: Games processed by earlier segments, for progress reporting
+        stop_file: The scraper saves its results and stops once this file exists
+        categories: Game categories fetched in parallel and interleaved; the default listing when empty
+        profile: Profiling mode ('sample', 'cprofile' or 'memory'); the profile is written next to the job results
+        include_info: Extra page information to extract (see page_metadata.INFO_FIELDS); description and thumbnail when None
+        
+    Returns:
+        int: Number of listing games the scraper processed
     """
-    # Update job status
-    update_job(job_id, {'status': 'processing'})
+    # Prepare command line arguments
+    cmd = [sys.executable, "iframe_scraper.py", "--max_games", str(max_games), "--output", output_file]
     
-    try:
-        # Prepare command line arguments
-        cmd = [sys.executable, "iframe_scraper.py"]
+    if start_offset:
+        cmd.extend(["--start_offset", str(start_offset)])
+    
+    if delay:
+        cmd.extend(["--delay", str(delay)])
+    
+    if stop_file:
+        cmd.extend(["--stop_file", stop_file])
+    
+    categories = normalize_categories(categories)
+    if categories:
+        cmd.extend(["--categories", ",".join(categories)])
+    
+    include_info = normalize_include_info(include_info)
+    if include_info:
+        cmd.extend(["--include_info", ",".join(include_info)])
+    
+    if archive_enabled():
+        cmd.extend(["--archive", ARCHIVE_DIR])
+    
+    # Save partial results often so an interrupted slice can be recovered
+    cmd.extend(["--save_interval", str(JOB_SAVE_INTERVAL)])
+    
+    # Scrapes running at the same time share the parse worker processes
+    cmd.extend(["--parse_workers", str(configured_workers() // max(1, MAX_CONCURRENT_SCRAPES))])
+    
+    if profile:
+        cmd.extend(["--profile", profile, "--profile_output", job_profile_prefix(job_id, start_offset)])
+    
+    # Run the extraction process
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1,
+        universal_newlines=True
+    )
+    
+    total_processed = 0
+    for line in iter(process.stdout.readline, ''):
+        log.write(line)
+        log.flush()
+        
+        # Update job info with progress data
+        if "找到 " in line and " 个游戏" in line:
+            try:
+                games_found = int(line.split("找到 ")[1].split(" 个游戏")[0])
+                update_job(job_id, {'found': games_found})
+            except:
+                pass
         
-        if params.get('max_games'):
-            cmd.extend(["--max_games", str(params['max_games'])])
+        if "成功找到iframe源" in line:
+            update_job(job_id, {'successful': jobs[job_id].get('successful', 0) + 1})
         
-        if params.get('offset'):
-            cmd.extend(["--start_offset", str(params['offset'])])
+        if "已处理 " in line and " 个游戏" in line:
+            try:
+                processed = int(line.split("已处理 ")[1].split(" 个游戏")[0])
+                update_job(job_id, {'processed': processed_base + processed})
+            except:
+                pass
         
-        if params.get('delay'):
-            cmd.extend(["--delay", str(params['delay'])])
+        if "总共处理 " in line and " 个游戏" in line:
+            try:
+                total_processed = int(line.split("总共处理 ")[1].split(" 个游戏")[0])
+            except:
+                pass
+    
+    # Wait for process to complete
+    process.wait()
+    
+    if profile:
+        record_profile_files(job_id, profile_paths(job_profile_prefix(job_id, start_offset), profile))
+    return total_processed
+
+def index_job_results(job_id, results=None):
+    """
+    Add a completed job's results to the persistent game index
+    
+    Args:
+        job_id: Unique job identifier
+        results: The job's results, read from its result file when None
+    """
+    try:
+        if results is None:
+            results = read_results(jobs[job_id]['result_file'], 'json')
+        count = get_game_index().add_results(results, job_id=job_id)
+        print(f"Indexed {count} games from job {job_id}")
+        # 结果的timestamp是实际获取页面的时间(沿用之前任务的结果时是当时的时间)，不会重复记为新的检查
+        revisits = get_revisit_scheduler().observe_results(results)
+        print(f"Recorded {revisits['checks']} revisit checks ({revisits['changes']} changed) from job {job_id}")
+    except Exception as e:
+        print(f"Error indexing results of job {job_id}: {e}")
+
+def run_extraction_slice(job_id, slice_size=None):
+    """
+    Run the next slice of an extraction job, resuming from its checkpoint
+    
+    Offset ranges already covered by fresh completed jobs are reused;
+    at most slice_size games of the remaining ranges are scraped. Progress
+    (cursor and part files) is checkpointed in the job record so the
+    scheduler can run other jobs before the next slice.
+    
+    Args:
+        job_id: Unique job identifier
+        slice_size: Max games to scrape in this slice, None for no limit
         
+    Returns:
+        bool: True when the job has finished (completed or failed)
+    """
+    job = jobs[job_id]
+    params = job['params']
+    
+    try:
         # Set output file specific to this job
         output_file = f"results/job_{job_id}.json"
-        cmd.extend(["--output", output_file])
-        
-        # Run the extraction process
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
+        log_file = f"logs/job_{job_id}.log"
+        
+        offset = params.get('offset') or 0
+        max_games = params.get('max_games') or 10
+        end = offset + max_games
+        
+        checkpoint = job.get('checkpoint') or {
+            'cursor': offset,
+            'processed': 0,
+            'reused': 0,
+            'part_files': []
+        }
+        
+        # Pause or cancel requested while the job was waiting for its next slice
+        if job.get('control'):
+            apply_job_control(job_id, job['control'], checkpoint)
+            return True
+        
+        recover_interrupted_part(job_id, checkpoint)
+        if job.get('status') != 'processing':
+            update_job(job_id, {'status': 'processing', 'started_at': datetime.now().isoformat()})
+        
+        finished = False
+        budget = slice_size
         
         # Capture log output
-        log_file = f"logs/job_{job_id}.log"
-        with open(log_file, 'w', encoding='utf-8') as log:
-            for line in iter(process.stdout.readline, ''):
-                log.write(line)
-                log.flush()
+        with open(log_file, 'a', encoding='utf-8') as log:
+            for kind, segment_start, segment_end, source_job_id in plan_job_segments(params, checkpoint['cursor'], end):
+                part_file = f"results/job_{job_id}_part{len(checkpoint['part_files'])}.json"
                 
-                # Update job info with progress data
-                if "找到 " in line and " 个游戏" in line:
-                    try:
-                        games_found = int(line.split("找到 ")[1].split(" 个游戏")[0])
-                        update_job(job_id, {'found': games_found})
-                    except:
-                        pass
+                if kind == 'reuse':
+                    segment_results = load_job_results(source_job_id, segment_start, segment_end)
+                    log.write(f"复用任务 {source_job_id} 中偏移量 {segment_start}-{segment_end} 的 {len(segment_results)} 个结果\n")
+                    with open(part_file, 'w', encoding='utf-8') as f:
+                        json.dump(segment_results, f, ensure_ascii=False)
+                    checkpoint['part_files'].append(part_file)
+                    checkpoint['reused'] += len(segment_results)
+                    checkpoint['cursor'] = segment_end
+                    continue
                 
-                if "成功找到iframe源" in line:
-                    update_job(job_id, {'successful': jobs[job_id].get('successful', 0) + 1})
+                if budget is not None:
+                    if budget <= 0:
+                        break
+                    segment_end = min(segment_end, segment_start + budget)
+                    budget -= segment_end - segment_start
                 
-                if "已处理 " in line and " 个游戏" in line:
-                    try:
-                        processed = int(line.split("已处理 ")[1].split(" 个游戏")[0])
-                        update_job(job_id, {'processed': processed})
-                    except:
-                        pass
+                # Scrape the uncovered range into a part file
+                segment_processed = run_scraper_process(
+                    job_id, segment_start, segment_end - segment_start, params.get('delay'),
+                    part_file, log, processed_base=checkpoint['processed'],
+                    stop_file=job_stop_file(job_id), categories=params.get('categories'),
+                    profile=params.get('profile'), include_info=params.get('include_info')
+                )
+                checkpoint['processed'] += segment_processed
+                checkpoint['cursor'] = segment_start + segment_processed
+                
+                if os.path.exists(part_file) and os.path.getsize(part_file) > 0:
+                    checkpoint['part_files'].append(part_file)
+                
+                # The scraper stopped early because of a pause or cancel request
+                if jobs[job_id].get('control'):
+                    log.write(f"任务在偏移量 {checkpoint['cursor']} 处停止: {jobs[job_id]['control']}\n")
+                    break
+                
+                # Stop at the first incomplete range so the covered range stays contiguous
+                if checkpoint['cursor'] < segment_end:
+                    finished = True
+                    break
+        
+        if jobs[job_id].get('control'):
+            apply_job_control(job_id, jobs[job_id]['control'], checkpoint)
+            return True
         
-        # Wait for process to complete
-        process.wait()
+        if checkpoint['cursor'] >= end:
+            finished = True
+        
+        if not finished:
+            update_job(job_id, {'checkpoint': checkpoint, 'processed': checkpoint['processed']})
+            return False
+        
+        # Merge reused and freshly scraped ranges into the job's result file
+        results = []
+        for part_file in checkpoint['part_files']:
+            with open(part_file, 'r', encoding='utf-8') as f:
+                results.extend(normalize_result(result) for result in json.load(f))
+        if checkpoint['part_files']:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False)
+            for part_file in checkpoint['part_files']:
+                os.remove(part_file)
         
         # Check if results were generated
         if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
-            # Read results file
-            with open(output_file, 'r', encoding='utf-8') as f:
-                results = json.load(f)
-                
             # Update job info
             update_job(job_id, {
                 'status': 'completed',
                 'completed_at': datetime.now().isoformat(),
                 'result_count': len(results),
-                'result_file': output_file
+                'result_file': output_file,
+                'processed': checkpoint['processed'],
+                'reused_results': checkpoint['reused'],
+                'covered_range': [offset, checkpoint['cursor']],
+                'listing_source': job_listing_source(params),
+                'checkpoint': None
             })
+            index_job_results(job_id, results)
         else:
             # Something went wrong
             update_job(job_id, {
                 'status': 'failed',
-                'error': 'No results were generated'
+                'error': 'No results were generated',
+                'checkpoint': None
             })
     
     except Exception as e:
@@ -710,8 +1666,417 @@ def run_extraction_job(job_id, params):
             'status': 'failed',
             'error': str(e)
         })
+    
+    return True
+
+def run_extraction_job(job_id, params):
+    """
+    Run the whole iframe extraction job without yielding to the scheduler
+    
+    Args:
+        job_id: Unique job identifier
+        params: Job parameters
+    """
+    jobs[job_id]['params'] = params
+    while not run_extraction_slice(job_id):
+        pass
+
+# web角色把任务放入队列目录，由爬取工作进程认领(改名为 <任务ID>.claimed.<进程ID>)
+QUEUE_DIR = os.path.join(JOBS_DATA_DIR, 'queue')
+QUEUE_STATE_FILE = os.path.join(JOBS_DATA_DIR, '.queue_state.json')
+WORKER_POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', '1'))
+
+def job_claim_file(job_id):
+    return os.path.join(QUEUE_DIR, f"{job_id}.claimed.{os.getpid()}")
+
+def run_job_slice(job_id, slice_size):
+    """Run one slice and release the worker's queue claim once the job has finished"""
+    finished = run_extraction_slice(job_id, slice_size)
+    if finished and os.path.exists(job_claim_file(job_id)):
+        os.remove(job_claim_file(job_id))
+    return finished
+
+scheduler = JobScheduler(run_job_slice, max_concurrent=MAX_CONCURRENT_SCRAPES, slice_size=JOB_SLICE_SIZE)
+
+def enqueue_job(job_id):
+    """把任务交给调度器，web角色下写入队列目录交给爬取工作进程，协调节点拆分成工作单元"""
+    job = jobs[job_id]
+    if SERVER_ROLE == 'coordinator':
+        plan_work_units(job_id)
+    elif SERVER_ROLE == 'web':
+        os.makedirs(QUEUE_DIR, exist_ok=True)
+        with open(os.path.join(QUEUE_DIR, job_id), 'w', encoding='utf-8') as f:
+            f.write(job.get('priority', 'normal'))
+    else:
+        scheduler.submit(job_id, job.get('submitter', 'unknown'), job.get('priority', 'normal'))
+
+def dequeue_job(job_id):
+    """把还没开始运行的任务移出队列，返回任务是否还在排队"""
+    if SERVER_ROLE == 'coordinator':
+        # 没有单元被租出时，任务不在任何工作节点上运行
+        with lease_lock:
+            units = (jobs[job_id].get('checkpoint') or {}).get('units', [])
+            expire_leases(units)
+            return not has_leased_units(units)
+    if scheduler.remove(job_id):
+        return True
+    try:
+        os.remove(os.path.join(QUEUE_DIR, job_id))
+        return True
+    except OSError:
+        return False
+
+def job_may_be_running(job_id):
+    """任务是否可能正在本进程或其他进程中运行"""
+    if 'VERCEL' in os.environ or SERVER_ROLE == 'web':
+        # 其他请求或爬取工作进程中的运行情况无法从这里得知
+        return True
+    if SERVER_ROLE == 'coordinator':
+        return has_leased_units((jobs[job_id].get('checkpoint') or {}).get('units', []))
+    return scheduler.is_running(job_id)
+
+def get_queue_info(job_id):
+    """任务的排队位置和预计开始时间，web角色下读取爬取工作进程发布的队列状态"""
+    if SERVER_ROLE != 'web':
+        return scheduler.queue_info(job_id)
+    try:
+        with open(QUEUE_STATE_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return state.get('jobs', {}).get(job_id)
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def claim_queued_jobs():
+    """
+    认领队列目录中的新任务和已退出的工作进程留下的任务，交给本进程的调度器
+
+    Returns:
+        int: 认领的任务数
+    """
+    claimed = 0
+    for name in os.listdir(QUEUE_DIR):
+        job_id, _, pid = name.partition('.claimed.')
+        if pid and (not pid.isdigit() or process_alive(int(pid))):
+            continue
+        # Renaming is atomic, so only one worker wins each job
+        try:
+            os.rename(os.path.join(QUEUE_DIR, name), job_claim_file(job_id))
+        except OSError:
+            continue
+        job = jobs.get(job_id)
+        if job is None or job.get('status') not in ('queued', 'processing'):
+            os.remove(job_claim_file(job_id))
+            continue
+        scheduler.submit(job_id, job.get('submitter', 'unknown'), job.get('priority', 'normal'))
+        claimed += 1
+    return claimed
+
+def publish_queue_state():
+    """把调度器的排队信息写入共享文件，供web进程的/api/status读取"""
+    tmp_file = f"{QUEUE_STATE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump({'updated_at': datetime.now().isoformat(), 'jobs': scheduler.snapshot()}, f)
+    os.replace(tmp_file, QUEUE_STATE_FILE)
+
+def run_scrape_worker():
+    """爬取工作进程的主循环：认领排队的任务并在调度器中运行"""
+    print(f"Scrape worker {os.getpid()} started, max {MAX_CONCURRENT_SCRAPES} concurrent scrapes")
+    setup_result_directories()
+    os.makedirs(QUEUE_DIR, exist_ok=True)
+    start_retention_sweeper()
+    get_notification_sender().start()
+    
+    while True:
+        try:
+            claimed = claim_queued_jobs()
+            if claimed:
+                print(f"Claimed {claimed} queued jobs")
+            publish_queue_state()
+        except Exception as e:
+            print(f"Error in scrape worker loop: {e}")
+        time.sleep(WORKER_POLL_INTERVAL)
+
+def resume_pending_jobs():
+    """重新排队服务器重启前未完成的任务，从检查点继续运行"""
+    for job_id, job in list(jobs.items()):
+        if job.get('status') in ('queued', 'processing') and job.get('params'):
+            enqueue_job(job_id)
+
+# 协调节点: 每个工作单元的游戏数、租约有效期(秒)和单元最多分配的次数
+LEASE_UNIT_SIZE = int(os.environ.get('LEASE_UNIT_SIZE', '50'))
+LEASE_SECONDS = int(os.environ.get('LEASE_SECONDS', '60'))
+LEASE_MAX_ATTEMPTS = int(os.environ.get('LEASE_MAX_ATTEMPTS', '3'))
+
+# 设置后工作节点必须在X-Worker-Token请求头中提供相同的值
+WORKER_TOKEN = os.environ.get('WORKER_TOKEN')
+
+# 保护工作单元的分配、心跳和完成
+lease_lock = threading.RLock()
+
+def plan_work_units(job_id):
+    """
+    把任务拆分成工作单元，保存在检查点的units字段中
+
+    新鲜的已完成任务覆盖的范围直接复用结果，成为已完成的单元；
+    其余范围按LEASE_UNIT_SIZE拆分成待分配的单元。已经拆分过的任务(暂停后恢复)保持不变。
+    """
+    with lease_lock:
+        job = jobs[job_id]
+        if (job.get('checkpoint') or {}).get('units') is not None:
+            finish_work_units_if_done(job_id)
+            return
+        params = job['params']
+        offset = params.get('offset') or 0
+        end = offset + (params.get('max_games') or 10)
+        checkpoint = {'cursor': offset, 'processed': 0, 'reused': 0, 'part_files': [], 'units': []}
+
+        for kind, segment_start, segment_end, source_job_id in plan_job_segments(params, offset, end):
+            if kind == 'scrape':
+                checkpoint['units'].extend(split_units(segment_start, segment_end, LEASE_UNIT_SIZE))
+                continue
+            part_file = f"results/job_{job_id}_unit{len(checkpoint['units'])}.json"
+            segment_results = load_job_results(source_job_id, segment_start, segment_end)
+            with open(part_file, 'w', encoding='utf-8') as f:
+                json.dump(segment_results, f, ensure_ascii=False)
+            checkpoint['part_files'].append(part_file)
+            checkpoint['reused'] += len(segment_results)
+            checkpoint['units'].append({
+                'start': segment_start,
+                'end': segment_end,
+                'status': UNIT_DONE,
+                'attempts': 0,
+                'lease': None,
+                'processed': segment_end - segment_start,
+                'part_file': part_file,
+                'reused_from': source_job_id
+            })
+
+        update_job(job_id, {'checkpoint': checkpoint})
+        finish_work_units_if_done(job_id)
+
+def work_unit_progress(checkpoint):
+    """已完成单元和正在运行的单元处理的游戏数(不含复用的单元)"""
+    return sum(
+        unit['processed'] for unit in checkpoint['units']
+        if unit['status'] in (UNIT_DONE, UNIT_LEASED) and not unit.get('reused_from')
+    )
+
+def finish_work_units_if_done(job_id):
+    """
+    所有单元都已结束时合并结果；有暂停或取消请求且没有单元在运行时应用它
+
+    调用时需持有lease_lock
+    """
+    job = jobs[job_id]
+    checkpoint = job.get('checkpoint')
+    if not checkpoint or checkpoint.get('units') is None or job.get('status') not in ('queued', 'processing'):
+        return
+    units = checkpoint['units']
+    if job.get('control'):
+        if not has_leased_units(units):
+            for unit in units:
+                if unit['status'] == UNIT_LEASED:
+                    release_unit(unit)
+            apply_job_control(job_id, job['control'], checkpoint)
+        return
+    if units_finished(units):
+        merge_work_units(job_id)
+
+def merge_work_units(job_id):
+    """按偏移量顺序合并所有单元的结果，完成任务"""
+    job = jobs[job_id]
+    params = job['params']
+    checkpoint = job['checkpoint']
+    offset = params.get('offset') or 0
+    output_file = f"results/job_{job_id}.json"
+
+    results = []
+    for unit in checkpoint['units']:
+        if unit['status'] == UNIT_DONE and unit['part_file'] and os.path.exists(unit['part_file']):
+            with open(unit['part_file'], 'r', encoding='utf-8') as f:
+                results.extend(normalize_result(result) for result in json.load(f))
+    if results:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False)
+    for part_file in checkpoint['part_files']:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+
+    failed_units = sum(1 for unit in checkpoint['units'] if unit['status'] == UNIT_FAILED)
+    if results:
+        update_job(job_id, {
+            'status': 'completed',
+            'completed_at': datetime.now().isoformat(),
+            'result_count': len(results),
+            'result_file': output_file,
+            'processed': work_unit_progress(checkpoint),
+            'reused_results': checkpoint['reused'],
+            'failed_units': failed_units,
+            'covered_range': [offset, covered_until(checkpoint['units'], offset)],
+            'listing_source': job_listing_source(params),
+            'checkpoint': None
+        })
+        index_job_results(job_id, results)
+    else:
+        update_job(job_id, {
+            'status': 'failed',
+            'error': 'No results were generated',
+            'failed_units': failed_units,
+            'checkpoint': None
+        })
+
+def is_loopback_host(host):
+    """主机名或地址是否只能从本机访问"""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def worker_authorized():
+    """检查工作节点的令牌(没有设置WORKER_TOKEN时只接受本机的工作节点)"""
+    if not WORKER_TOKEN:
+        return is_loopback_host(request.remote_addr or '')
+    return hmac.compare_digest(request.headers.get('X-Worker-Token', ''), WORKER_TOKEN)
+
+def find_leased_unit(lease_id):
+    """
+    Returns:
+        tuple: (任务ID, 单元)，租约对应的任务或单元不存在时返回 (None, None)
+    """
+    job_id, index = parse_lease_id(lease_id)
+    if job_id is None or not JOB_ID_PATTERN.match(job_id) or job_id not in jobs:
+        return None, None
+    units = (jobs[job_id].get('checkpoint') or {}).get('units') or []
+    if index >= len(units):
+        return None, None
+    return job_id, units[index]
+
+# 产物保留策略: 类型、目录、默认保留天数、默认目录大小上限(MB)，可用环境变量
+# RETENTION_<类型>_DAYS / RETENTION_<类型>_MAX_MB 修改；Vercel上/tmp空间有限，上限更小
+_small_tmp = 'VERCEL' in os.environ
+RETENTION_POLICIES = [
+    RetentionPolicy.from_env('jobs', JOBS_DATA_DIR, 30, 20 if _small_tmp else 100),
+    RetentionPolicy.from_env('results', RESULTS_DIR, 14, 100 if _small_tmp else 1024),
+    RetentionPolicy.from_env('logs', LOGS_DIR, 7, 20 if _small_tmp else 200),
+    RetentionPolicy.from_env('debug_html', DEBUG_HTML_DIR, 1, 20 if _small_tmp else 200),
+    RetentionPolicy.from_env('archive', ARCHIVE_DIR, 90, 100 if _small_tmp else 4096)
+]
+CACHE_RETENTION_DAYS = float(os.environ.get('RETENTION_CACHE_DAYS', '30'))
+RETENTION_SWEEP_INTERVAL = int(os.environ.get('RETENTION_SWEEP_INTERVAL', '600'))
+
+UUID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+_last_sweep = 0
+sweep_lock = threading.Lock()
+
+def sweep_artifacts():
+    """
+    按保留策略清理过期和超出大小上限的产物，进行中和暂停的任务的文件不会被删除
+
+    Returns:
+        dict: 每类产物的清理统计
+    """
+    active_job_ids = {
+        job_id for job_id, job in jobs.scan()
+        if job.get('status') in ACTIVE_JOB_STATUSES
+    }
+    
+    archive = get_default_archive()
+    open_archive_files = archive.open_files() if archive is not None else set()
+    # 运行中的任务(包括使用--archive的爬虫子进程)会写入归档目录中的任意文件，这时整个目录都不清理
+    archive_in_use = archive_enabled() and any(job.get('status') == 'processing' for _, job in jobs.scan())
+    
+    def protect(filename):
+        # 锁文件和队列状态等内部文件，以及正在写入的归档文件
+        if filename.startswith('.') or filename in open_archive_files:
+            return True
+        match = UUID_PATTERN.search(filename)
+        return match is not None and match.group(0) in active_job_ids
+    
+    summary = {}
+    for policy in RETENTION_POLICIES:
+        if policy.name == 'archive' and archive_in_use:
+            stats = sweep_directory(policy, lambda filename: True)
+        else:
+            stats = sweep_directory(policy, protect)
+        if policy.name == 'jobs':
+            # 任务记录文件被删除后，内存中的记录也一起删除
+            for filename in stats['deleted_files']:
+                jobs.pop(filename.rsplit('.', 1)[0], None)
+        summary[policy.name] = {key: stats[key] for key in ('deleted', 'freed_bytes', 'remaining_bytes')}
+    
+    cache = get_default_cache()
+    if cache is not None and CACHE_RETENTION_DAYS > 0:
+        summary['cache'] = {'deleted': cache.purge_older_than(CACHE_RETENTION_DAYS * DAY)}
+    
+    # 已发送的通知和任务记录保留同样长的时间
+    jobs_policy = RETENTION_POLICIES[0]
+    if jobs_policy.ttl_seconds:
+        summary['notifications'] = {
+            'deleted': get_notification_sender().outbox.purge_finished_older_than(jobs_policy.ttl_seconds)
+        }
+    
+    summary['evicted_from_memory'] = jobs.evict_idle(JOB_PRELOAD_SECONDS)
+    return summary
+
+def maybe_sweep_artifacts():
+    """距离上次清理超过RETENTION_SWEEP_INTERVAL秒时执行一次清理"""
+    global _last_sweep
+    if time.time() - _last_sweep < RETENTION_SWEEP_INTERVAL:
+        return None
+    if not sweep_lock.acquire(blocking=False):
+        return None
+    try:
+        _last_sweep = time.time()
+        summary = sweep_artifacts()
+        print(f"产物清理完成: {summary}")
+        return summary
+    except Exception as e:
+        print(f"产物清理失败: {e}")
+        return None
+    finally:
+        sweep_lock.release()
+
+def start_retention_sweeper():
+    """启动后台清理线程"""
+    def sweep_loop():
+        while True:
+            maybe_sweep_artifacts()
+            time.sleep(RETENTION_SWEEP_INTERVAL)
+    
+    thread = threading.Thread(target=sweep_loop, name='retention-sweeper', daemon=True)
+    thread.start()
 
 # 修改模拟数据处理函数，优化真实爬取功能
+def run_inline_job(job_id, params):
+    """
+    Run a job inside the request (Vercel) and send its notifications afterwards
+    
+    Background threads stop once the response is sent, so notifications are
+    delivered here, with every send capped by the function's remaining time.
+    """
+    started = time.time()
+    with profile_job(job_id):
+        mock_process_job(job_id, params)
+    try:
+        # 留出0.5秒返回响应
+        summary = get_notification_sender().deliver_due(deadline=started + FUNCTION_MAX_SECONDS - 0.5)
+        if any(summary.values()):
+            print(f"Notifications after job {job_id}: {summary}")
+    except Exception as e:
+        print(f"Error sending notifications for job {job_id}: {e}")
+
 def mock_process_job(job_id, params):
     """
     A mock job processing function for demonstration purposes
@@ -724,6 +2089,11 @@ def mock_process_job(job_id, params):
     # Update job status
     update_job(job_id, {'status': 'processing'})
     
+    # 所有请求都要在截止时间之前结束，避免函数被Vercel强制终止
+    job_deadline = time.time() + JOB_DEADLINE_SECONDS
+    # 所有分段共用的传输字节数统计
+    transfer_stats = TransferStats()
+    
     # Create a results directory if it doesn't exist
     try:
         if not os.path.exists(RESULTS_DIR):
@@ -737,6 +2107,10 @@ def mock_process_job(job_id, params):
         offset = params.get('offset', 0)
         delay = min(max(params.get('delay', 1.0), 1.0), 2.0)  # 确保延迟在1-2秒之间
         
+        # 恢复暂停的任务时从检查点的偏移量继续
+        checkpoint = jobs[job_id].get('checkpoint') or {}
+        cursor = checkpoint.get('cursor', offset)
+        
         # 强制使用真实爬虫，禁用回退机制
         use_real_scraper = True
         print(f"强制使用真实爬虫模式 (禁用回退)")
@@ -746,8 +2120,10 @@ def mock_process_job(job_id, params):
         if not os.path.exists(LOGS_DIR):
             os.makedirs(LOGS_DIR)
         
-        with open(log_file_path, 'w', encoding='utf-8') as log_file:
+        with open(log_file_path, 'a' if checkpoint else 'w', encoding='utf-8') as log_file:
             log_file.write(f"===== 任务开始: {job_id} =====\n")
+            if checkpoint:
+                log_file.write(f"从检查点恢复: 偏移量 {cursor}\n")
             log_file.write(f"时间: {datetime.now().isoformat()}\n")
             log_file.write(f"参数: max_games={max_games}, offset={offset}, delay={delay}\n")
             log_file.write(f"环境变量: USE_REAL_SCRAPER=true (强制启用)\n")
@@ -764,16 +2140,108 @@ def mock_process_job(job_id, params):
             print("=== 强制使用真实爬虫进行爬取 ===")
             print(f"最大游戏数: {max_games}, 偏移量: {offset}, 延迟: {delay}秒")
             
+            # 结果边爬取边写入文件，内存中不保留结果列表
+            writer = StreamingResultWriter(result_file)
+            stats = {}
+            
+            # 先写入暂停前已经得到的部分结果
+            for part_file in checkpoint.get('part_files', []):
+                with open(part_file, 'r', encoding='utf-8') as f:
+                    for result in json.load(f).get('results', []):
+                        writer.write(result)
+                os.remove(part_file)
+            # 各分段的结果实际来自的列表，只有都来自同一个列表时才能被其他任务按偏移量复用
+            listing_sources = set(checkpoint.get('listing_sources', []))
+            
             try:
-                # 创建自定义爬虫实例
-                scraper = FastItchIoScraper(max_games=max_games, start_offset=offset, delay=delay)
+                # 已完成的重叠任务覆盖的范围直接复用结果，只爬取剩余的部分
+                segments = plan_job_segments(params, cursor, offset + max_games)
+                returned_count = 0
+                covered_until = cursor
+                stats = {
+                    'total_processed': checkpoint.get('processed', 0),
+                    'successful_extractions': 0,
+                    'reused_results': 0,
+                    'elapsed_seconds': 0
+                }
+                
+                for kind, segment_start, segment_end, source_job_id in segments:
+                    if kind == 'reuse':
+                        reused = load_job_results(source_job_id, segment_start, segment_end, url_field='url')
+                        listing_sources.add(jobs[source_job_id].get('listing_source'))
+                        log_file.write(f"复用任务 {source_job_id} 中偏移量 {segment_start}-{segment_end} 的 {len(reused)} 个结果\n")
+                        for result in reused:
+                            writer.write(result)
+                        stats['reused_results'] += len(reused)
+                        covered_until = segment_end
+                        continue
+                    
+                    # 创建自定义爬虫实例
+                    log_file.write(f"爬取偏移量 {segment_start}-{segment_end}\n")
+                    scraper = FastItchIoScraper(
+                        max_games=segment_end - segment_start, start_offset=segment_start, delay=delay,
+                        categories=params.get('categories'), deadline=job_deadline,
+                        include_info=params.get('include_info')
+                    )
+                    scraper.should_stop = lambda: bool(jobs[job_id].get('control'))
+                    scraper.transfer_stats = transfer_stats
+                    
+                    # 执行爬取，每得到一个结果就写入结果文件
+                    for result in scraper.iter_scrape():
+                        returned_count += 1
+                        log_file.write(f"结果 {returned_count}: {result.title} - {result.iframe_src}\n")
+                        
+                        # 确保每个结果都有iframe_src
+                        if result.iframe_src:
+                            result.extracted_method = "real_scraper"  # 明确标记为实时爬取
+                            writer.write(result)
+                        else:
+                            log_file.write(f"警告: 跳过没有iframe_src的结果: {result.title}\n")
+                        log_file.flush()
+                        
+                        update_job(job_id, {
+                            'processed': stats['total_processed'] + scraper.processed_count,
+                            'successful': writer.count
+                        })
+                    
+                    listing_sources.add(scraper.listing_source)
+                    stats['total_processed'] += scraper.stats.get('total_processed', 0)
+                    stats['successful_extractions'] += scraper.stats.get('successful_extractions', 0)
+                    stats['elapsed_seconds'] += scraper.stats.get('elapsed_seconds', 0)
+                    
+                    # 这一段没有爬完(超时或列表不足)时不再继续后面的范围，保证覆盖范围连续
+                    covered_until = scraper.stats.get('covered_range', [segment_start, segment_start])[1]
+                    if covered_until < segment_end:
+                        break
                 
-                # 执行爬取
-                results, stats = scraper.scrape()
+                stats['covered_range'] = [offset, covered_until]
+                
+                # 收到暂停或取消请求时保存部分结果和检查点后结束
+                control = jobs[job_id].get('control')
+                if control:
+                    writer.close({
+                        "job_id": job_id,
+                        "timestamp": datetime.now().isoformat(),
+                        "params": params,
+                        "partial": True,
+                        "count": writer.count
+                    })
+                    partial_file = os.path.join(RESULTS_DIR, f"job_{job_id}_partial.json")
+                    os.replace(result_file, partial_file)
+                    log_file.write(f"任务在偏移量 {covered_until} 处停止: {control}\n")
+                    apply_job_control(job_id, control, {
+                        'cursor': covered_until,
+                        'processed': stats['total_processed'],
+                        'part_files': [partial_file],
+                        'listing_sources': sorted(listing_sources, key=str)
+                    })
+                    return
                 
                 # 更新状态并输出统计信息
-                log_file.write(f"爬取完成: 处理了 {stats['total_processed']} 个游戏，成功提取 {stats['successful_extractions']} 个iframe源\n")
+                log_file.write(f"爬取完成: 处理了 {stats['total_processed']} 个游戏，成功提取 {stats['successful_extractions']} 个iframe源，复用 {stats['reused_results']} 个结果\n")
                 log_file.write(f"耗时: {stats['elapsed_seconds']:.2f}秒\n")
+                transfer_total = transfer_stats.snapshot()['total']
+                log_file.write(f"传输: {transfer_total['compressed_bytes']} 字节，解压后 {transfer_total['uncompressed_bytes']} 字节\n")
                 log_file.flush()
                 
                 update_job(job_id, {
@@ -787,7 +2255,7 @@ def mock_process_job(job_id, params):
                     # 测试网络连接
                     test_url = "https://itch.io/games/free/platform-web"
                     headers = {
-                        'User-Agent': scraper.get_random_user_agent(),
+                        'User-Agent': random.choice(USER_AGENTS),
                         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
                     }
                     req = urllib.request.Request(test_url, headers=headers)
@@ -810,44 +2278,29 @@ def mock_process_job(job_id, params):
                 log_file.write("-------------------------\n")
                 log_file.flush()
                 
-                # 无论结果如何，都使用真实爬取的数据
-                if results:
-                    log_file.write(f"成功获取 {len(results)} 个结果\n")
-                    for i, result in enumerate(results):
-                        log_file.write(f"结果 {i+1}: {result.get('title')} - {result.get('iframe_src')}\n")
-                        
-                    # 确保每个结果都有iframe_src
-                    valid_results = []
-                    for result in results:
-                        if result.get('iframe_src'):
-                            valid_results.append(result)
-                            result['extracted_method'] = "real_scraper"  # 明确标记为实时爬取
-                        else:
-                            log_file.write(f"警告: 跳过没有iframe_src的结果: {result.get('title')}\n")
-                    
-                    if valid_results:
-                        log_file.write(f"有效结果数: {len(valid_results)}\n")
-                        sample_results = valid_results
-                    else:
-                        log_file.write("警告: 没有有效的iframe源结果\n")
-                        # 创建一个明确标记失败的结果
-                        sample_results = [{
-                            "title": "爬取失败 - 无有效结果",
-                            "url": "https://itch.io/games/free/platform-web",
-                            "iframe_src": "",
-                            "extracted_method": "real_scraper_failed",
-                            "error": "No valid iframe sources found"
-                        }]
+                if writer.count:
+                    log_file.write(f"成功获取 {returned_count} 个结果，复用 {stats['reused_results']} 个结果\n")
+                    log_file.write(f"有效结果数: {writer.count}\n")
+                elif returned_count:
+                    log_file.write("警告: 没有有效的iframe源结果\n")
+                    # 创建一个明确标记失败的结果
+                    writer.write({
+                        "title": "爬取失败 - 无有效结果",
+                        "url": "https://itch.io/games/free/platform-web",
+                        "iframe_src": "",
+                        "extracted_method": "real_scraper_failed",
+                        "error": "No valid iframe sources found"
+                    })
                 else:
                     log_file.write("警告: 爬取完成但没有结果\n")
                     # 创建一个明确标记失败的结果
-                    sample_results = [{
+                    writer.write({
                         "title": "爬取失败 - 无结果",
                         "url": "https://itch.io/games/free/platform-web",
                         "iframe_src": "",
                         "extracted_method": "real_scraper_failed",
                         "error": "No results returned from scraper"
-                    }]
+                    })
             except Exception as e:
                 log_file.write(f"错误: 真实爬取失败: {e}\n")
                 import traceback
@@ -855,36 +2308,28 @@ def mock_process_job(job_id, params):
                 log_file.write(f"错误详情:\n{error_trace}\n")
                 
                 print(f"真实爬取失败: {e}")
-                import traceback
-                print(f"详细错误: {traceback.format_exc()}")
+                print(f"详细错误: {error_trace}")
                 
-                # 创建一个明确标记错误的结果
-                sample_results = [{
+                # 创建一个明确标记错误的结果，已写入的部分结果保留在文件中
+                writer.write({
                     "title": f"爬取失败 - {str(e)[:50]}",
                     "url": "https://itch.io/games/free/platform-web",
                     "iframe_src": "",
                     "extracted_method": "real_scraper_error",
                     "error": str(e)
-                }]
+                })
             
-            # 添加元数据到结果中
-            result_with_metadata = {
-                "metadata": {
-                    "job_id": job_id,
-                    "timestamp": datetime.now().isoformat(),
-                    "params": params,
-                    "source": "real_scraper",  # 即使失败也标记为真实爬取
-                    "count": len(sample_results),
-                    "vercel_env": 'VERCEL' in os.environ,
-                    "env_vars": {k: os.environ.get(k, 'not_set') for k in ['USE_REAL_SCRAPER', 'VERCEL', 'PYTHONUNBUFFERED']},
-                    "execution_time": stats['elapsed_seconds'] if 'stats' in locals() else 0
-                },
-                "results": sample_results
-            }
-            
-            # 保存结果
-            with open(result_file, 'w', encoding='utf-8') as f:
-                json.dump(result_with_metadata, f, indent=2, ensure_ascii=False)
+            # 在结果之后写入元数据并关闭文件
+            writer.close({
+                "job_id": job_id,
+                "timestamp": datetime.now().isoformat(),
+                "params": params,
+                "source": "real_scraper",  # 即使失败也标记为真实爬取
+                "count": writer.count,
+                "vercel_env": 'VERCEL' in os.environ,
+                "env_vars": {k: os.environ.get(k, 'not_set') for k in ['USE_REAL_SCRAPER', 'VERCEL', 'PYTHONUNBUFFERED']},
+                "execution_time": stats.get('elapsed_seconds', 0)
+            })
             
             log_file.write(f"结果已保存到: {result_file}\n")
             log_file.write(f"===== 任务结束: {job_id} =====\n")
@@ -896,13 +2341,18 @@ def mock_process_job(job_id, params):
             update_job(job_id, {
                 'status': 'completed',
                 'completed_at': datetime.now().isoformat(),
-                'result_count': len(sample_results),
+                'result_count': writer.count,
                 'result_file': result_file,
-                'processed': stats['total_processed'] if 'stats' in locals() else 0,
-                'successful': stats['successful_extractions'] if 'stats' in locals() else 0,
-                'found': stats['total_processed'] if 'stats' in locals() else 0,
+                'processed': stats.get('total_processed', 0),
+                'successful': stats.get('successful_extractions', 0),
+                'found': stats.get('total_processed', 0),
+                'covered_range': stats.get('covered_range'),
+                'listing_source': listing_sources.pop() if len(listing_sources) == 1 else None,
+                'transfer': transfer_stats.snapshot(),
+                'checkpoint': None,
                 'source': "real_scraper"  # 即使失败也标记为真实爬取
             })
+            index_job_results(job_id)
     except Exception as e:
         print(f"Error in mock processing: {e}")
         import traceback
@@ -923,13 +2373,25 @@ def mock_process_job(job_id, params):
             'error': str(e)
         })
 
+# 页面源文件和构建结果(python static_assets.py build)所在的目录
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def catch_all(path):
-    if path == '':
-        return send_from_directory('.', 'index.html')
-    else:
-        return send_from_directory('.', path)
+    """Serve the allow-listed pages and hashed assets with ETags and precompressed bodies"""
+    asset = get_asset_bundle(APP_DIR, os.path.join(APP_DIR, DEFAULT_DIST_DIR)).get(path)
+    if asset is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Not found'
+        }), 404
+    status, headers, body = asset_response(
+        asset,
+        request.headers.get('If-None-Match'),
+        request.headers.get('Accept-Encoding')
+    )
+    return app.response_class(body, status=status, headers=headers)
 
 @app.route('/api/extract', methods=['POST'])
 def extract():
@@ -947,10 +2409,6 @@ def extract():
         
         # Email is now optional
         
-        # Generate job ID
-        job_id = str(uuid.uuid4())
-        print(f"Generated job ID: {job_id}")
-        
         # Process numeric parameters safely
         try:
             max_games = int(data.get('max_games', 10))
@@ -967,45 +2425,138 @@ def extract():
         except (ValueError, TypeError):
             delay = 2
         
-        # Create job record
-        jobs[job_id] = {
-            'id': job_id,
-            'email': data.get('email', ''),  # Email is now optional
-            'params': {
-                'max_games': max_games,
-                'offset': offset,
-                'delay': delay,
-                'categories': data.get('categories', []),
-                'include_info': data.get('include_info', [])
-            },
-            'status': 'queued',
-            'created_at': datetime.now().isoformat(),
-            'processed': 0,
-            'successful': 0,
-            'found': 0
+        params = {
+            'max_games': max_games,
+            'offset': offset,
+            'delay': delay,
+            'categories': normalize_categories(data.get('categories')),
+            'include_info': normalize_include_info(data.get('include_info')),
+            'profile': normalize_profile_mode(data.get('profile'))
         }
+        email = (data.get('email') or '').strip()  # Email is now optional
+        webhook_url = (data.get('webhook_url') or '').strip()
+        if webhook_url:
+            # Only public hosts: the server must not be used to reach internal services
+            try:
+                check_webhook_url(webhook_url)
+            except ValueError as e:
+                return jsonify({
+                    'status': 'error',
+                    'message': str(e)
+                }), 400
+        submitter = job_submitter(data)
+        
+        # No background threads on Vercel, so clean up old artifacts between requests
+        if 'VERCEL' in os.environ:
+            maybe_sweep_artifacts()
+        priority = job_priority(params, data.get('priority'))
+        
+        with jobs_lock:
+            # Coalesce with an identical job that is running or finished recently
+            # (profiled jobs always scrape, so they get a profile of their own)
+            existing_job_id, existing_state = find_identical_job(params) if not params['profile'] else (None, None)
+            
+            if existing_state == 'running':
+                existing_job = jobs[existing_job_id]
+                updates = {'attached_requests': existing_job.get('attached_requests', 0) + 1}
+                if email and email != existing_job.get('email') and email not in existing_job.get('notify_emails', []):
+                    updates['notify_emails'] = existing_job.get('notify_emails', []) + [email]
+                if webhook_url and webhook_url != existing_job.get('webhook_url') and webhook_url not in existing_job.get('notify_webhooks', []):
+                    updates['notify_webhooks'] = existing_job.get('notify_webhooks', []) + [webhook_url]
+                update_job(existing_job_id, updates)
+                print(f"Attached request to running job {existing_job_id}")
+                
+                return jsonify({
+                    'status': 'success',
+                    'message': 'Attached to an identical running extraction job',
+                    'job_id': existing_job_id,
+                    'coalesced': True
+                })
+            
+            # Generate job ID
+            job_id = str(uuid.uuid4())
+            print(f"Generated job ID: {job_id}")
+            
+            # Create job record
+            jobs[job_id] = {
+                'id': job_id,
+                'email': email,
+                'webhook_url': webhook_url,
+                'params': params,
+                'request_key': job_request_key(params),
+                'submitter': submitter,
+                'priority': priority,
+                'status': 'queued',
+                'created_at': datetime.now().isoformat(),
+                'processed': 0,
+                'successful': 0,
+                'found': 0
+            }
+            
+            if existing_state == 'completed':
+                # Answer from a copy of the existing result file instead of crawling again
+                # (retention or embed checks of the source job must not touch this job's results)
+                source_job = jobs[existing_job_id]
+                result_file = copy_result_file(source_job.get('result_file'), job_id)
+                if result_file is None:
+                    existing_state = None
+            
+            if existing_state == 'completed':
+                jobs[job_id].update({
+                    'status': 'completed',
+                    'completed_at': datetime.now().isoformat(),
+                    'result_count': source_job.get('result_count'),
+                    'result_file': result_file,
+                    'processed': source_job.get('processed', 0),
+                    'successful': source_job.get('successful', 0),
+                    'found': source_job.get('found', 0),
+                    'covered_range': source_job.get('covered_range'),
+                    'listing_source': source_job.get('listing_source'),
+                    'source': source_job.get('source', 'unknown'),
+                    'reused_from': existing_job_id
+                })
+            
+            # Save job to file
+            save_job(job_id)
+            print(f"Saved job {job_id} to file")
         
-        # Save job to file
-        save_job(job_id)
-        print(f"Saved job {job_id} to file")
+        if existing_state == 'completed':
+            print(f"Reused results of completed job {existing_job_id} for job {job_id}")
+            notify_job_finished(job_id)
+            return jsonify({
+                'status': 'success',
+                'message': 'Answered from the results of an identical recent job',
+                'job_id': job_id,
+                'reused_from': existing_job_id
+            })
         
         # Check if we're running on Vercel or locally
         in_vercel = 'VERCEL' in os.environ
         print(f"Running in Vercel environment: {in_vercel}")
         
         if in_vercel:
+            # On Vercel there is no background queue, so admit the job only if a scrape slot is free
+            if not scheduler.try_acquire_inline():
+                update_job(job_id, {
+                    'status': 'failed',
+                    'error': 'Too many extraction jobs are running, please retry later'
+                })
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Too many extraction jobs are running, please retry later',
+                    'job_id': job_id
+                }), 429
+            
             # On Vercel, use mock processing since we can't run background threads
             print(f"Using mock processing for job {job_id}")
-            mock_process_job(job_id, jobs[job_id]['params'])
+            try:
+                run_inline_job(job_id, jobs[job_id]['params'])
+            finally:
+                scheduler.release_inline()
         else:
-            # Start extraction process in a new thread for local development
-            print(f"Starting background thread for job {job_id}")
-            thread = threading.Thread(
-                target=run_extraction_job,
-                args=(job_id, jobs[job_id]['params'])
-            )
-            thread.daemon = True
-            thread.start()
+            # Queue the job; the scheduler runs it in slices on a background thread
+            print(f"Queueing job {job_id} with {priority} priority for {submitter}")
+            enqueue_job(job_id)
         
         # Return job ID to client
         return jsonify({
@@ -1045,8 +2596,30 @@ def job_status(job_id):
             'successful': jobs[job_id].get('successful', 0),
             'found': jobs[job_id].get('found', 0),
             'completed_at': jobs[job_id].get('completed_at'),
-            'result_count': jobs[job_id].get('result_count')
+            'result_count': jobs[job_id].get('result_count'),
+            'reused_from': jobs[job_id].get('reused_from'),
+            'reused_results': jobs[job_id].get('reused_results', 0),
+            'attached_requests': jobs[job_id].get('attached_requests', 0),
+            'priority': jobs[job_id].get('priority'),
+            'control': jobs[job_id].get('control'),
+            'resume_offset': (jobs[job_id].get('checkpoint') or {}).get('cursor'),
+            'embed_check': jobs[job_id].get('embed_check'),
+            'transfer': jobs[job_id].get('transfer'),
+            'profile_files': [os.path.basename(path) for path in jobs[job_id].get('profile_files', [])]
         }
+        
+        # Work unit counts of jobs split by the coordinator
+        units = (jobs[job_id].get('checkpoint') or {}).get('units')
+        if units is not None:
+            job_info['work_units'] = unit_summary(units)
+        
+        # Queue position and estimated start time while waiting for a scrape slot
+        queue_info = get_queue_info(job_id)
+        if queue_info is not None:
+            job_info.update(queue_info)
+            job_info['estimated_start_at'] = datetime.fromtimestamp(
+                time.time() + queue_info['estimated_start_seconds']
+            ).isoformat()
         print(f"Returning job info: {job_info}")
         
         return jsonify({
@@ -1063,11 +2636,666 @@ def job_status(job_id):
             'message': f'Server error: {str(e)}'
         }), 500
 
+def control_job(job_id, action):
+    """Pause or cancel a job; queued jobs stop at once, running jobs at the next game"""
+    if job_id not in jobs:
+        return jsonify({
+            'status': 'error',
+            'message': 'Job not found'
+        }), 404
+    
+    allowed = ('queued', 'processing', 'paused') if action == 'cancel' else ('queued', 'processing')
+    status = jobs[job_id]['status']
+    if status not in allowed:
+        return jsonify({
+            'status': 'error',
+            'message': f'Cannot {action} a job that is {status}'
+        }), 409
+    
+    with jobs_lock:
+        if status == 'paused' or dequeue_job(job_id) or not job_may_be_running(job_id):
+            # Not running anywhere, apply immediately
+            apply_job_control(job_id, action)
+        else:
+            # Running: the scraper stops cooperatively and checkpoints its progress
+            request_job_stop(job_id, action)
+    
+    return jsonify({
+        'status': 'success',
+        'job_id': job_id,
+        'job_status': jobs[job_id]['status'],
+        'control': jobs[job_id].get('control')
+    })
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued, running or paused job and discard its partial results"""
+    try:
+        return control_job(job_id, 'cancel')
+    except Exception as e:
+        print(f"Error in cancel endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/jobs/<job_id>/pause', methods=['POST'])
+def pause_job(job_id):
+    """Pause a queued or running job, keeping its checkpoint"""
+    try:
+        return control_job(job_id, 'pause')
+    except Exception as e:
+        print(f"Error in pause endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    """Resume a paused job from its checkpoint"""
+    try:
+        if job_id not in jobs:
+            return jsonify({
+                'status': 'error',
+                'message': 'Job not found'
+            }), 404
+        
+        job = jobs[job_id]
+        if job['status'] != 'paused':
+            return jsonify({
+                'status': 'error',
+                'message': f"Cannot resume a job that is {job['status']}"
+            }), 409
+        
+        resumed_from = (job.get('checkpoint') or {}).get('cursor')
+        update_job(job_id, {'status': 'queued', 'control': None, 'resumed_at': datetime.now().isoformat()})
+        
+        if 'VERCEL' in os.environ:
+            # No background queue on Vercel, continue inline if a scrape slot is free
+            if not scheduler.try_acquire_inline():
+                update_job(job_id, {'status': 'paused'})
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Too many extraction jobs are running, please retry later'
+                }), 429
+            try:
+                run_inline_job(job_id, job['params'])
+            finally:
+                scheduler.release_inline()
+        else:
+            enqueue_job(job_id)
+        
+        return jsonify({
+            'status': 'success',
+            'job_id': job_id,
+            'job_status': jobs[job_id]['status'],
+            'resumed_from': resumed_from
+        })
+    except Exception as e:
+        print(f"Error in resume endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+def worker_error(message, code):
+    return jsonify({
+        'status': 'error',
+        'message': message
+    }), code
+
+@app.route('/api/work/lease', methods=['POST'])
+def lease_work():
+    """
+    Lease the next pending work unit to a worker node (coordinator role only)
+    
+    Units of high priority jobs are leased first; units whose lease expired
+    are leased again. Returns lease null when there is no work.
+    """
+    try:
+        if SERVER_ROLE != 'coordinator':
+            return worker_error('This server is not a coordinator', 404)
+        if not worker_authorized():
+            return worker_error('Invalid worker token', 403)
+        data = request.get_json(silent=True) or {}
+        worker_id = str(data.get('worker_id') or request.remote_addr)[:200]
+        
+        with lease_lock:
+            candidates = [
+                (job_id, job) for job_id, job in list(jobs.items())
+                if job.get('status') in ('queued', 'processing') and (job.get('checkpoint') or {}).get('units')
+            ]
+            candidates.sort(key=lambda item: (PRIORITIES.index(item[1].get('priority', 'normal')), item[1].get('created_at', '')))
+            for job_id, job in candidates:
+                units = job['checkpoint']['units']
+                if expire_leases(units):
+                    print(f"Re-issuing expired work units of job {job_id}")
+                    update_job(job_id, {'checkpoint': job['checkpoint']})
+                if job.get('control'):
+                    finish_work_units_if_done(job_id)
+                    continue
+                index = next_pending_unit(units)
+                if index is None:
+                    continue
+                
+                lease = grant_lease(job_id, units, index, worker_id, LEASE_SECONDS)
+                updates = {'checkpoint': job['checkpoint']}
+                if job['status'] != 'processing':
+                    updates.update({'status': 'processing', 'started_at': datetime.now().isoformat()})
+                update_job(job_id, updates)
+                unit = units[index]
+                print(f"Leased unit {index} ({unit['start']}-{unit['end']}) of job {job_id} to {worker_id}")
+                return jsonify({
+                    'status': 'success',
+                    'lease': {
+                        'lease_id': lease['id'],
+                        'job_id': job_id,
+                        'start_offset': unit['start'],
+                        'max_games': unit['end'] - unit['start'],
+                        'delay': job['params'].get('delay'),
+                        'categories': job['params'].get('categories'),
+                        'profile': job['params'].get('profile'),
+                        'include_info': normalize_include_info(job['params'].get('include_info')),
+                        'lease_seconds': LEASE_SECONDS,
+                        'heartbeat_interval': max(1, LEASE_SECONDS // 3)
+                    }
+                })
+        
+        return jsonify({
+            'status': 'success',
+            'lease': None
+        })
+    except Exception as e:
+        print(f"Error in lease endpoint: {str(e)}")
+        return worker_error(f'Server error: {str(e)}', 500)
+
+@app.route('/api/work/heartbeat', methods=['POST'])
+def heartbeat_work():
+    """Extend a lease; tells the worker to stop when the job was paused or cancelled"""
+    try:
+        if SERVER_ROLE != 'coordinator':
+            return worker_error('This server is not a coordinator', 404)
+        if not worker_authorized():
+            return worker_error('Invalid worker token', 403)
+        data = request.get_json(silent=True) or {}
+        
+        with lease_lock:
+            job_id, unit = find_leased_unit(data.get('lease_id'))
+            if unit is None or not lease_matches(unit, data.get('lease_id')):
+                return worker_error('Lease lost', 409)
+            
+            job = jobs[job_id]
+            unit['lease']['expires'] = time.time() + LEASE_SECONDS
+            if isinstance(data.get('processed'), int):
+                unit['processed'] = max(0, min(data['processed'], unit['end'] - unit['start']))
+            update_job(job_id, {
+                'checkpoint': job['checkpoint'],
+                'processed': work_unit_progress(job['checkpoint'])
+            })
+            stop = bool(job.get('control')) or job.get('status') not in ('queued', 'processing')
+        
+        return jsonify({
+            'status': 'success',
+            'stop': stop,
+            'lease_seconds': LEASE_SECONDS
+        })
+    except Exception as e:
+        print(f"Error in heartbeat endpoint: {str(e)}")
+        return worker_error(f'Server error: {str(e)}', 500)
+
+@app.route('/api/work/complete', methods=['POST'])
+def complete_work():
+    """
+    Accept the results of a work unit
+    
+    The first completion of a unit wins; a late completion from a worker
+    whose lease expired is still accepted while the unit has not been
+    completed by another worker.
+    """
+    try:
+        if SERVER_ROLE != 'coordinator':
+            return worker_error('This server is not a coordinator', 404)
+        if not worker_authorized():
+            return worker_error('Invalid worker token', 403)
+        data = request.get_json(silent=True) or {}
+        results = data.get('results')
+        problem = validate_unit_results(results)
+        if problem:
+            return worker_error(problem, 400)
+        
+        with lease_lock:
+            job_id, unit = find_leased_unit(data.get('lease_id'))
+            if unit is None or jobs[job_id].get('status') not in ('queued', 'processing', 'paused'):
+                return worker_error('Lease lost', 409)
+            if unit['status'] == UNIT_DONE:
+                return jsonify({
+                    'status': 'success',
+                    'message': 'Unit already completed'
+                })
+            
+            job = jobs[job_id]
+            checkpoint = job['checkpoint']
+            index = checkpoint['units'].index(unit)
+            part_file = f"results/job_{job_id}_unit{index}.json"
+            with open(part_file, 'w', encoding='utf-8') as f:
+                json.dump(results, f, ensure_ascii=False)
+            
+            size = unit['end'] - unit['start']
+            processed = data.get('processed')
+            completed_by = (unit['lease'] or {}).get('worker')
+            unit.update({
+                'status': UNIT_DONE,
+                'lease': None,
+                'processed': max(0, min(processed, size)) if isinstance(processed, int) else size,
+                'part_file': part_file,
+                'completed_by': completed_by
+            })
+            checkpoint['part_files'].append(part_file)
+            offset = job['params'].get('offset') or 0
+            checkpoint['cursor'] = covered_until(checkpoint['units'], offset)
+            
+            # Profiles of the unit, keyed by suffix such as '.sample.collapsed'
+            profiles = data.get('profiles') or {}
+            if job['params'].get('profile') and isinstance(profiles, dict):
+                prefix = job_profile_prefix(job_id, unit['start'])
+                suffixes = [path[len(prefix):] for path in profile_paths(prefix, job['params']['profile'])]
+                for suffix, text in profiles.items():
+                    if suffix in suffixes and isinstance(text, str):
+                        with open(prefix + suffix, 'w', encoding='utf-8') as f:
+                            f.write(text)
+                record_profile_files(job_id, [prefix + suffix for suffix in suffixes])
+            update_job(job_id, {
+                'checkpoint': checkpoint,
+                'processed': work_unit_progress(checkpoint),
+                'successful': job.get('successful', 0) + len(results)
+            })
+            print(f"Unit {index} of job {job_id} completed with {len(results)} results")
+            finish_work_units_if_done(job_id)
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Unit completed'
+        })
+    except Exception as e:
+        print(f"Error in complete endpoint: {str(e)}")
+        return worker_error(f'Server error: {str(e)}', 500)
+
+@app.route('/api/work/fail', methods=['POST'])
+def fail_work():
+    """
+    Give a work unit back: it is leased again, or marked failed after
+    LEASE_MAX_ATTEMPTS failed attempts
+    """
+    try:
+        if SERVER_ROLE != 'coordinator':
+            return worker_error('This server is not a coordinator', 404)
+        if not worker_authorized():
+            return worker_error('Invalid worker token', 403)
+        data = request.get_json(silent=True) or {}
+        
+        with lease_lock:
+            job_id, unit = find_leased_unit(data.get('lease_id'))
+            if unit is None or not lease_matches(unit, data.get('lease_id')):
+                return worker_error('Lease lost', 409)
+            
+            job = jobs[job_id]
+            # 因暂停或取消而停止的单元不算失败
+            stopped = data.get('reason') == 'stopped'
+            failed = not stopped and unit['attempts'] >= LEASE_MAX_ATTEMPTS
+            release_unit(unit, failed=failed)
+            if data.get('error'):
+                unit['error'] = str(data['error'])[:500]
+                print(f"Unit {unit['start']}-{unit['end']} of job {job_id} failed: {unit['error']}")
+            update_job(job_id, {
+                'checkpoint': job['checkpoint'],
+                'processed': work_unit_progress(job['checkpoint'])
+            })
+            finish_work_units_if_done(job_id)
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Unit marked failed' if failed else 'Unit released'
+        })
+    except Exception as e:
+        print(f"Error in fail endpoint: {str(e)}")
+        return worker_error(f'Server error: {str(e)}', 500)
+
+def run_embed_check(job_id):
+    """
+    Check every iframe_src of a completed job and store the results in its result file
+    
+    Each result gets an embed_check field and the summary goes into the
+    file's metadata and the job record.
+    """
+    update_job(job_id, {'embed_check': {'status': 'running', 'started_at': datetime.now().isoformat()}})
+    try:
+        result_file = jobs[job_id]['result_file']
+        with open(result_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        results = data.get('results', []) if isinstance(data, dict) else data
+        
+        summary = check_results(results)
+        if isinstance(data, dict):
+            data.setdefault('metadata', {})['embed_check'] = summary
+        
+        tmp_file = f"{result_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, result_file)
+        
+        summary.update({'status': 'completed', 'completed_at': datetime.now().isoformat()})
+        update_job(job_id, {'embed_check': summary})
+    except Exception as e:
+        print(f"Error checking embeds of job {job_id}: {e}")
+        update_job(job_id, {'embed_check': {'status': 'failed', 'error': str(e)}})
+
+@app.route('/api/jobs/<job_id>/check_embeds', methods=['POST'])
+def check_job_embeds(job_id):
+    """Validate the iframe_src of every result of a completed job"""
+    try:
+        if job_id not in jobs:
+            return jsonify({
+                'status': 'error',
+                'message': 'Job not found'
+            }), 404
+        
+        if jobs[job_id]['status'] != 'completed':
+            return jsonify({
+                'status': 'error',
+                'message': 'Job is not completed yet'
+            }), 400
+        
+        if (jobs[job_id].get('embed_check') or {}).get('status') == 'running':
+            return jsonify({
+                'status': 'success',
+                'message': 'Embed check already running',
+                'embed_check': jobs[job_id]['embed_check']
+            })
+        
+        if 'VERCEL' in os.environ:
+            # No background threads on Vercel; results are capped at a few games there
+            run_embed_check(job_id)
+        else:
+            thread = threading.Thread(target=run_embed_check, args=(job_id,))
+            thread.daemon = True
+            thread.start()
+        
+        return jsonify({
+            'status': 'success',
+            'message': 'Embed check started',
+            'embed_check': jobs[job_id].get('embed_check')
+        })
+    except Exception as e:
+        print(f"Error in check embeds endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/embeds/check')
+def check_embed():
+    """Check whether one iframe_src still resolves (cached for an hour)"""
+    try:
+        url = request.args.get('url', '').strip()
+        if not url:
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing iframe URL (url)'
+            }), 400
+        
+        # Only itch.io embed hosts, so the endpoint can't be used to probe arbitrary servers
+        if not is_embed_host(normalize_embed_url(url)):
+            return jsonify({
+                'status': 'error',
+                'message': f"Only {', '.join(EMBED_HOSTS)} embeds can be checked"
+            }), 400
+        
+        checker = EmbedChecker(concurrency=1, cache=get_default_check_cache())
+        try:
+            result = checker.check(url)
+        finally:
+            checker.close()
+        
+        return jsonify({
+            'status': 'success',
+            'url': url,
+            'embed_check': result
+        })
+    except Exception as e:
+        print(f"Error in embed check endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+def game_to_json(game):
+    """Format an index row for the API, with ISO timestamps"""
+    game = dict(game)
+    for key in ('first_seen', 'last_seen'):
+        if game.get(key) is not None:
+            game[key] = datetime.fromtimestamp(game[key]).isoformat()
+    return game
+
+def games_page_response(games, next_cursor):
+    return jsonify({
+        'status': 'success',
+        'count': len(games),
+        'games': [game_to_json(game) for game in games],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/games')
+def list_games():
+    """Query indexed games by method, game_id or last-seen time, newest first, with cursor pagination"""
+    try:
+        since = request.args.get('since')
+        if since:
+            since = datetime.fromisoformat(since).timestamp()
+        
+        index = get_game_index()
+        if request.args.get('q'):
+            games, next_cursor = index.search(
+                request.args['q'],
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', 50)
+            )
+        else:
+            games, next_cursor = index.query(
+                method=request.args.get('method'),
+                game_id=request.args.get('game_id'),
+                since=since,
+                cursor=request.args.get('cursor'),
+                limit=request.args.get('limit', 50)
+            )
+        return games_page_response(games, next_cursor)
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid parameter: {str(e)}'
+        }), 400
+    except Exception as e:
+        print(f"Error in games endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/games/search')
+def search_games():
+    """Full-text search over indexed game titles and descriptions"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing search query (q)'
+            }), 400
+        
+        games, next_cursor = get_game_index().search(
+            query,
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50)
+        )
+        return games_page_response(games, next_cursor)
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': f'Invalid parameter: {str(e)}'
+        }), 400
+    except Exception as e:
+        print(f"Error in games search endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/games/lookup')
+def lookup_game():
+    """Look up one indexed game by its itch.io URL"""
+    try:
+        url = request.args.get('url', '').strip()
+        if not url:
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing game URL (url)'
+            }), 400
+        
+        game = get_game_index().get(url)
+        if game is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Game not found in index'
+            }), 404
+        
+        return jsonify({
+            'status': 'success',
+            'game': game_to_json(game)
+        })
+    except Exception as e:
+        print(f"Error in games lookup endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/games/stats')
+def game_index_stats():
+    """Number of indexed games, total and per extraction method"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'index': get_game_index().stats()
+        })
+    except Exception as e:
+        print(f"Error in games stats endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/revisit/queue')
+def revisit_queue():
+    """Games most worth re-checking now, within the remaining daily request budget"""
+    try:
+        scheduler = get_revisit_scheduler()
+        daily_budget = request.args.get('budget', DEFAULT_DAILY_BUDGET, type=int)
+        horizon_hours = request.args.get('horizon_hours', 24, type=float)
+        budget = scheduler.remaining_budget(daily_budget)
+        queue = scheduler.plan(budget, horizon_seconds=horizon_hours * 3600)
+        return jsonify({
+            'status': 'success',
+            'daily_budget': daily_budget,
+            'remaining_budget': budget,
+            'expected_changes': sum(entry['stale_probability'] for entry in queue),
+            'queue': queue
+        })
+    except Exception as e:
+        print(f"Error in revisit queue endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/revisit/history')
+def revisit_history():
+    """Check statistics, estimated change rate and change history of one game"""
+    try:
+        url = request.args.get('url', '').strip()
+        if not url:
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing game URL (url)'
+            }), 400
+        
+        history = get_revisit_scheduler().history(url)
+        if history is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Game has no revisit history'
+            }), 404
+        
+        return jsonify({
+            'status': 'success',
+            'history': history
+        })
+    except Exception as e:
+        print(f"Error in revisit history endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/revisit/stats')
+def revisit_stats():
+    """Checks, detected changes and expected freshness of the revisit history"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'revisit': get_revisit_scheduler().stats()
+        })
+    except Exception as e:
+        print(f"Error in revisit stats endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
 # 修改下载API端点，支持更灵活的结果格式
+def export_results(job_id, result_file, data, format_name):
+    """
+    Convert a job's results to another format, reusing an earlier conversion
+    
+    Returns:
+        str: Path of the converted file
+    """
+    export_file = os.path.join(RESULTS_DIR, f"job_{job_id}{RESULT_FORMATS[format_name].extension}")
+    if os.path.exists(export_file) and os.path.getmtime(export_file) >= os.path.getmtime(result_file):
+        return export_file
+    
+    # Write to a temporary file so a concurrent download never sees a partial export
+    tmp_file = f"{export_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    writer = get_writer(format_name, tmp_file)
+    try:
+        for result in data['results']:
+            writer.write(result)
+    finally:
+        writer.close(data['metadata'])
+    os.replace(tmp_file, export_file)
+    return export_file
+
 @app.route('/api/download/<job_id>')
 def download_results(job_id):
-    """Download job results"""
+    """Download job results, optionally converted with ?format=csv|ndjson|columnar|parquet"""
     try:
+        format_name = request.args.get('format', 'json')
+        if format_name not in available_formats():
+            return jsonify({
+                'status': 'error',
+                'message': f"Unsupported format: {format_name}",
+                'formats': available_formats()
+            }), 400
+        
         if job_id not in jobs:
             return jsonify({
                 'status': 'error',
@@ -1107,10 +3335,10 @@ def download_results(job_id):
                 },
                 "results": data
             }
-        
-        # 保存回文件
-        with open(result_file, 'w', encoding='utf-8') as f:
-            json.dump(formatted_results, f, indent=2, ensure_ascii=False)
+            
+            # 保存回文件
+            with open(result_file, 'w', encoding='utf-8') as f:
+                json.dump(formatted_results, f, ensure_ascii=False)
         
         # 输出简单的结果摘要
         result_summary = {
@@ -1121,6 +3349,15 @@ def download_results(job_id):
         }
         print(f"下载结果: {result_summary}")
         
+        if format_name != 'json':
+            writer_class = RESULT_FORMATS[format_name]
+            return send_file(
+                export_results(job_id, result_file, formatted_results, format_name),
+                mimetype=writer_class.mimetype,
+                as_attachment=True,
+                download_name=f'iframe_results_{job_id}{writer_class.extension}'
+            )
+        
         return send_file(
             result_file,
             mimetype='application/json',
@@ -1136,6 +3373,107 @@ def download_results(job_id):
             'message': f'Server error: {str(e)}'
         }), 500
 
+@app.route('/api/jobs/<job_id>/profile')
+def job_profile(job_id):
+    """List a job's profile files, or download one with ?file=<name>"""
+    try:
+        if job_id not in jobs:
+            return jsonify({
+                'status': 'error',
+                'message': 'Job not found'
+            }), 404
+        
+        profile_files = [path for path in jobs[job_id].get('profile_files', []) if os.path.exists(path)]
+        name = request.args.get('file')
+        if not name:
+            return jsonify({
+                'status': 'success',
+                'mode': (jobs[job_id].get('params') or {}).get('profile'),
+                'files': [{'name': os.path.basename(path), 'size': os.path.getsize(path)} for path in profile_files]
+            })
+        
+        # Only files recorded for this job can be downloaded
+        for path in profile_files:
+            if os.path.basename(path) == name:
+                mimetype = 'application/octet-stream' if path.endswith('.prof') else 'text/plain'
+                return send_file(os.path.abspath(path), mimetype=mimetype, as_attachment=True, download_name=name)
+        return jsonify({
+            'status': 'error',
+            'message': 'Profile file not found'
+        }), 404
+    except Exception as e:
+        print(f"Error in job profile endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+# /api/debug/profile最长的分析时间(秒)
+MAX_DEBUG_PROFILE_SECONDS = 60
+
+def profiling_allowed():
+    """设置了ENABLE_PROFILING或请求来自本机时允许分析整个服务器进程"""
+    if os.environ.get('ENABLE_PROFILING', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/api/debug/profile')
+def debug_profile():
+    """
+    Profile the whole server process for ?seconds=N (default 5)
+    
+    mode=sample (default) returns collapsed stacks of all threads, ready for
+    flamegraph.pl or speedscope; mode=memory returns collapsed allocation
+    stacks weighted by bytes; summary=1 returns the text summary instead.
+    """
+    try:
+        if not profiling_allowed():
+            return jsonify({
+                'status': 'error',
+                'message': 'Profiling is only available locally or with ENABLE_PROFILING set'
+            }), 403
+        
+        mode = request.args.get('mode', 'sample')
+        if mode not in PROFILE_MODES or mode == 'cprofile':
+            # cProfile only sees the request thread, which just sleeps here
+            return jsonify({
+                'status': 'error',
+                'message': 'mode must be sample or memory'
+            }), 400
+        try:
+            seconds = float(request.args.get('seconds', 5))
+        except ValueError:
+            seconds = 5
+        seconds = max(0.1, min(seconds, MAX_DEBUG_PROFILE_SECONDS))
+        
+        profiler = Profiler(mode).start()
+        time.sleep(seconds)
+        profiler.stop()
+        
+        body = profiler.summary() if request.args.get('summary') else profiler.collapsed_text()
+        return app.response_class(body, mimetype='text/plain')
+    except Exception as e:
+        print(f"Error in profile endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
+@app.route('/api/notifications/stats')
+def notification_stats():
+    """Counts of pending, sent and abandoned completion notifications"""
+    try:
+        return jsonify({
+            'status': 'success',
+            'notifications': get_notification_sender().outbox.stats()
+        })
+    except Exception as e:
+        print(f"Error in notification stats endpoint: {str(e)}")
+        return jsonify({
+            'status': 'error',
+            'message': f'Server error: {str(e)}'
+        }), 500
+
 # Add a healthcheck endpoint for Vercel
 @app.route('/api/healthcheck')
 def healthcheck():
@@ -1149,12 +3487,43 @@ def healthcheck():
 
 # For local development, we keep the old handlers
 if __name__ == '__main__':
+    # python server.py --worker runs the scrape worker pool for SERVER_ROLE=web servers
+    if '--worker' in sys.argv:
+        SERVER_ROLE = 'worker'
+        jobs.shared = True
+        run_scrape_worker()
+    
+    # python server.py --coordinator splits jobs into work units leased to
+    # worker nodes (python iframe_scraper.py --worker http://<host>:5000)
+    if '--coordinator' in sys.argv:
+        SERVER_ROLE = 'coordinator'
+    
+    # Set SERVER_HOST=0.0.0.0 so worker nodes on other machines can reach a coordinator.
+    # The interactive debugger allows running code, so it is only enabled on loopback.
+    host = os.environ.get('SERVER_HOST', '127.0.0.1')
+    debug = is_loopback_host(host)
+    if SERVER_ROLE == 'coordinator' and not debug and not WORKER_TOKEN:
+        print(f"Refusing to start a coordinator on {host} without WORKER_TOKEN: "
+              "any host on the network could submit work unit results")
+        sys.exit(1)
+    
     # Load existing jobs
     load_jobs()
     
     # Create necessary directories
     setup_result_directories()
     
+    # Continue jobs interrupted by a restart from their checkpoints
+    # (with the debug reloader only in the serving process, not in the file watcher)
+    if (not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true') and SERVER_ROLE in ('all', 'coordinator'):
+        resume_pending_jobs()
+        
+        # Expire old jobs, results, logs and debug HTML in the background
+        start_retention_sweeper()
+        
+        # Deliver notifications left in the outbox by the previous run
+        get_notification_sender().start()
+    
     # Start Flask server
-    print("Starting itch.io Game Iframe Extractor server on http://127.0.0.1:5000")
-    app.run(debug=True, host='127.0.0.1', port=5000) 
\ No newline at end of file
+    print(f"Starting itch.io Game Iframe Extractor server on http://{host}:5000")
+    app.run(debug=debug, host=host, port=5000) 
\ No newline at end of file
@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+静态文件
+
+服务器只提供ASSET_PAGES中列出的页面和构建时生成的assets/文件，
+不会把server.py等其他文件发送出去。
+
+构建(python static_assets.py build)时:
+    - index.html中内联的<script>和<style>提取成单独的文件，文件名带内容哈希(如 assets/index.0.3f2a1b4c9d.js)
+    - HTML/JS/CSS去掉缩进、空行和注释
+    - 每个文件预先生成gzip和brotli(安装了可选依赖brotli时)压缩版本
+结果写入static_dist/目录(dist/是PyInstaller的输出目录)，文件列表在static_dist/manifest.json中。没有构建结果或页面已修改时，
+服务器在第一次请求时在内存中构建(Vercel上不运行构建步骤)。
+
+响应带强ETag，带哈希的文件使用 Cache-Control: public, max-age=31536000, immutable，
+页面使用no-cache，浏览器每次用ETag验证，没有变化时返回304。
+"""
+
+import os
+import re
+import sys
+import json
+import gzip
+import time
+import hashlib
+import argparse
+import mimetypes
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 提供的页面，extract_inline为True时内联的脚本和样式提取成带哈希的文件；
+# iframe_viewer.html会和结果一起保存到本地使用，保持为单个文件
+ASSET_PAGES = {
+    'index.html': {'extract_inline': True},
+    'iframe_viewer.html': {'extract_inline': False}
+}
+
+# 网站根路径对应的页面
+DEFAULT_PAGE = 'index.html'
+
+DEFAULT_DIST_DIR = 'static_dist'
+
+# 带哈希的文件和页面的缓存策略
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PAGE_CACHE_CONTROL = 'no-cache'
+
+# 小于这个大小的文件不压缩
+MIN_COMPRESS_BYTES = 256
+
+# 源文件修改后最多这么久(秒)重新构建，便于本地开发
+SOURCE_CHECK_INTERVAL = 2
+
+INLINE_BLOCK_PATTERN = re.compile(r'<(script|style)(\s[^>]*)?>(.*?)</\1>', re.IGNORECASE | re.DOTALL)
+PROTECTED_BLOCK_PATTERN = re.compile(r'<(script|style|pre|textarea)\b[^>]*>.*?</\1>', re.IGNORECASE | re.DOTALL)
+HTML_COMMENT_PATTERN = re.compile(r'<!--(?!\[if).*?-->', re.DOTALL)
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+def content_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def minify_css(text):
+    """去掉CSS中的注释和多余的空白"""
+    text = CSS_COMMENT_PATTERN.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+    text = re.sub(r':\s+', ':', text)
+    return text.replace(';}', '}').strip()
+
+def minify_js(text):
+    """
+    去掉JS中的缩进、空行和整行注释
+
+    只按行处理，不合并行(不依赖分号)，模板字符串中的行保持不变
+    """
+    lines = []
+    in_template = False
+    for line in text.split('\n'):
+        if in_template:
+            lines.append(line)
+        else:
+            stripped = line.strip()
+            if stripped and not stripped.startswith('//'):
+                lines.append(stripped)
+        # 未转义的反引号数量为奇数时进入或离开模板字符串
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines)
+
+def minify_html(text):
+    """去掉HTML中的注释、缩进和空行，script、style、pre、textarea中的内容单独处理或保持不变"""
+    parts = []
+    position = 0
+    for match in PROTECTED_BLOCK_PATTERN.finditer(text):
+        parts.append(_minify_markup(text[position:match.start()]))
+        block = match.group(0)
+        tag = match.group(1).lower()
+        if tag in ('script', 'style'):
+            inline = INLINE_BLOCK_PATTERN.match(block)
+            if inline and 'src=' not in (inline.group(2) or ''):
+                body = minify_js(inline.group(3)) if tag == 'script' else minify_css(inline.group(3))
+                block = f"<{tag}{inline.group(2) or ''}>{body}</{tag}>"
+        parts.append(block)
+        position = match.end()
+    parts.append(_minify_markup(text[position:]))
+    return ''.join(parts)
+
+def _minify_markup(text):
+    text = HTML_COMMENT_PATTERN.sub('', text)
+    # 保留换行作为元素之间的空白
+    minified = '\n'.join(line.strip() for line in text.split('\n') if line.strip())
+    if not minified:
+        return '\n' if text else ''
+    if text[:1].isspace():
+        minified = '\n' + minified
+    if text[-1:].isspace():
+        minified += '\n'
+    return minified
+
+class Asset:
+    """一个可以提供的文件及其压缩版本"""
+
+    def __init__(self, path, body, immutable, encodings=None):
+        """
+        Args:
+            path: URL路径(不含开头的/)
+            body: 文件内容(bytes)
+            immutable: 文件名带内容哈希，可以永久缓存
+            encodings: 压缩方式 -> 压缩后的内容，为None时按需生成
+        """
+        self.path = path
+        self.body = body
+        self.immutable = immutable
+        self.digest = content_digest(body)
+        content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        self.content_type = content_type
+        self.encodings = encodings if encodings is not None else compress_variants(body)
+
+    def etag(self, encoding=None):
+        """强ETag，不同的压缩版本使用不同的ETag"""
+        suffix = {'gzip': '-gz', 'br': '-br'}.get(encoding, '')
+        return f'"{self.digest[:20]}{suffix}"'
+
+    @property
+    def cache_control(self):
+        return IMMUTABLE_CACHE_CONTROL if self.immutable else PAGE_CACHE_CONTROL
+
+def compress_variants(body):
+    """生成gzip和brotli压缩版本，压缩后没有变小的不保留"""
+    if len(body) < MIN_COMPRESS_BYTES:
+        return {}
+    variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+class AssetBundle:
+    """构建好的静态文件"""
+
+    def __init__(self, assets, sources):
+        """
+        Args:
+            assets: URL路径 -> Asset
+            sources: 页面文件名 -> 构建时的内容哈希，用于判断构建结果是否过期
+        """
+        self.assets = assets
+        self.sources = sources
+
+    @classmethod
+    def build(cls, source_dir='.'):
+        """从页面源文件构建"""
+        assets = {}
+        sources = {}
+        for page, options in ASSET_PAGES.items():
+            with open(os.path.join(source_dir, page), 'rb') as f:
+                raw = f.read()
+            sources[page] = content_digest(raw)
+            text = raw.decode('utf-8')
+            if options['extract_inline']:
+                text = extract_inline_blocks(page, text, assets)
+            assets[page] = Asset(page, minify_html(text).encode('utf-8'), immutable=False)
+        return cls(assets, sources)
+
+    @classmethod
+    def load(cls, dist_dir, source_dir='.'):
+        """读取构建结果，不存在或页面源文件已修改时返回None"""
+        try:
+            with open(os.path.join(dist_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('sources') != source_digests(source_dir):
+            return None
+        assets = {}
+        for path, entry in manifest['assets'].items():
+            with open(os.path.join(dist_dir, path), 'rb') as f:
+                body = f.read()
+            encodings = {}
+            for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+                if encoding in entry['encodings']:
+                    with open(os.path.join(dist_dir, path + suffix), 'rb') as f:
+                        encodings[encoding] = f.read()
+            assets[path] = Asset(path, body, entry['immutable'], encodings)
+        return cls(assets, manifest['sources'])
+
+    def write(self, dist_dir):
+        """把构建结果和压缩版本写入dist_dir"""
+        manifest = {'sources': self.sources, 'assets': {}}
+        for path, asset in self.assets.items():
+            target = os.path.join(dist_dir, path)
+            os.makedirs(os.path.dirname(target) or dist_dir, exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(asset.body)
+            for encoding, data in asset.encodings.items():
+                with open(target + ('.gz' if encoding == 'gzip' else '.br'), 'wb') as f:
+                    f.write(data)
+            manifest['assets'][path] = {
+                'etag': asset.etag(),
+                'immutable': asset.immutable,
+                'size': len(asset.body),
+                'encodings': {encoding: len(data) for encoding, data in asset.encodings.items()}
+            }
+        with open(os.path.join(dist_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        return manifest
+
+    def get(self, path):
+        """URL路径对应的文件，不在允许列表中时返回None"""
+        return self.assets.get(path or DEFAULT_PAGE)
+
+def extract_inline_blocks(page, text, assets):
+    """把页面中内联的<script>和<style>提取成带哈希的文件，返回修改后的页面"""
+    name = os.path.splitext(page)[0]
+    counter = [0]
+
+    def replace(match):
+        tag, attributes, body = match.group(1).lower(), match.group(2) or '', match.group(3)
+        # 有src的脚本和非标准类型(如text/tailwindcss)的块保持不变
+        if 'src=' in attributes or 'type=' in attributes or not body.strip():
+            return match.group(0)
+        minified = (minify_js(body) if tag == 'script' else minify_css(body)).encode('utf-8')
+        extension = 'js' if tag == 'script' else 'css'
+        path = f"assets/{name}.{counter[0]}.{content_digest(minified)[:10]}.{extension}"
+        counter[0] += 1
+        assets[path] = Asset(path, minified, immutable=True)
+        if tag == 'script':
+            return f'<script src="/{path}"></script>'
+        return f'<link rel="stylesheet" href="/{path}">'
+
+    return INLINE_BLOCK_PATTERN.sub(replace, text)
+
+def source_digests(source_dir='.'):
+    digests = {}
+    for page in ASSET_PAGES:
+        with open(os.path.join(source_dir, page), 'rb') as f:
+            digests[page] = content_digest(f.read())
+    return digests
+
+def choose_encoding(asset, accept_encoding):
+    """按Accept-Encoding选择压缩版本(优先brotli)，不压缩时返回None"""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        if name and not re.search(r'q=0(\.0*)?\s*$', params):
+            accepted.add(name.strip().lower())
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.encodings and (encoding in accepted or '*' in accepted):
+            return encoding
+    return None
+
+def etag_matches(asset, if_none_match):
+    """If-None-Match中是否有这个文件任一版本的ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    etags = {asset.etag(encoding) for encoding in (None, 'gzip', 'br')}
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in etags:
+            return True
+    return False
+
+def asset_response(asset, if_none_match=None, accept_encoding=None):
+    """
+    Returns:
+        tuple: (状态码, 响应头字典, 响应体)，ETag匹配时为304且没有响应体
+    """
+    encoding = choose_encoding(asset, accept_encoding)
+    headers = {
+        'ETag': asset.etag(encoding),
+        'Cache-Control': asset.cache_control,
+        'Vary': 'Accept-Encoding',
+        'X-Content-Type-Options': 'nosniff'
+    }
+    if etag_matches(asset, if_none_match):
+        return 304, headers, b''
+    headers['Content-Type'] = asset.content_type
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        return 200, headers, asset.encodings[encoding]
+    return 200, headers, asset.body
+
+# 进程内共享的构建结果
+_bundle = None
+_bundle_checked_at = 0
+_bundle_lock = threading.Lock()
+
+def get_asset_bundle(source_dir='.', dist_dir=DEFAULT_DIST_DIR):
+    """
+    获取构建结果：优先使用dist_dir中的构建结果，过期或不存在时在内存中构建；
+    之后每SOURCE_CHECK_INTERVAL秒检查一次页面源文件是否修改
+    """
+    global _bundle, _bundle_checked_at
+    with _bundle_lock:
+        if _bundle is not None and time.time() - _bundle_checked_at < SOURCE_CHECK_INTERVAL:
+            return _bundle
+        _bundle_checked_at = time.time()
+        if _bundle is not None and _bundle.sources == source_digests(source_dir):
+            return _bundle
+        _bundle = AssetBundle.load(dist_dir, source_dir) or AssetBundle.build(source_dir)
+        return _bundle
+
+def main():
+    """构建静态文件"""
+    parser = argparse.ArgumentParser(description='构建静态文件: 压缩、提取内联脚本和样式、生成gzip/brotli版本')
+    parser.add_argument('command', choices=['build'], help='build: 构建到输出目录')
+    parser.add_argument('--source', type=str, default='.', help='页面所在目录，默认为当前目录')
+    parser.add_argument('--out', type=str, default=DEFAULT_DIST_DIR, help=f'输出目录，默认为{DEFAULT_DIST_DIR}')
+    args = parser.parse_args()
+
+    bundle = AssetBundle.build(args.source)
+    manifest = bundle.write(args.out)
+    for path, entry in sorted(manifest['assets'].items()):
+        sizes = ', '.join(f"{encoding} {size}" for encoding, size in entry['encodings'].items())
+        print(f"{path}: {entry['size']} 字节{'，' + sizes if sizes else ''}")
+    if brotli is None:
+        print("没有安装brotli，只生成了gzip版本", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+压缩传输
+
+请求时声明支持gzip/deflate(安装了可选依赖brotli时还支持br)，
+读取响应时边接收边解压，并按主机统计传输的压缩字节数和解压后的字节数。
+解压后超过MAX_RESPONSE_BYTES(默认32MB)的响应会被放弃，避免很小的压缩数据解压后耗尽内存。
+"""
+
+import os
+import zlib
+import threading
+import urllib.parse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 请求头中声明支持的压缩格式
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli is not None else 'gzip, deflate'
+
+# 解压后响应体的大小上限(字节)，游戏页面和列表页远小于这个大小
+MAX_DECODED_BYTES = int(os.environ.get('MAX_RESPONSE_BYTES', str(32 * 1024 * 1024)))
+
+class ResponseTooLarge(ValueError):
+    """解压后的响应体超过大小上限"""
+
+def has_zlib_header(data):
+    """数据是否以zlib头开始"""
+    return len(data) >= 2 and data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0
+
+class StreamDecoder:
+    """按Content-Encoding逐块解压响应体"""
+
+    def __init__(self, encoding, max_size=MAX_DECODED_BYTES):
+        """
+        Args:
+            encoding: Content-Encoding响应头
+            max_size: 解压后的大小上限(字节)，超过时抛出ResponseTooLarge；为None时不限制
+        """
+        self.encoding = (encoding or 'identity').strip().lower()
+        self.max_size = max_size
+        self.size = 0
+        self._first_chunk = True
+        if self.encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self._decompressor = None  # 第一块数据到达时判断是否带zlib头
+        elif self.encoding == 'br':
+            if brotli is None:
+                raise ValueError("服务器返回了brotli压缩的内容，但没有安装brotli")
+            self._decompressor = brotli.Decompressor()
+        elif self.encoding == 'identity':
+            self._decompressor = None
+        else:
+            raise ValueError(f"不支持的Content-Encoding: {encoding}")
+
+    def decompress(self, chunk):
+        """解压一块数据，解压后的总大小超过max_size时抛出ResponseTooLarge"""
+        if self.encoding == 'identity':
+            return self._count(chunk)
+        if self.encoding == 'deflate' and self._first_chunk:
+            # 按规范deflate应带zlib头，但有的服务器发送的是原始deflate数据
+            self._decompressor = zlib.decompressobj(zlib.MAX_WBITS if has_zlib_header(chunk) else -zlib.MAX_WBITS)
+        self._first_chunk = False
+        # 最多只解压出比剩余额度多一个字节的数据，不会先在内存中展开整个压缩炸弹
+        limit = 0 if self.max_size is None else self.max_size - self.size + 1
+        if self.encoding == 'br':
+            try:
+                return self._count(self._decompressor.process(chunk, output_buffer_limit=limit))
+            except TypeError:
+                # brotli 1.1之前不支持限制输出大小
+                return self._count(self._decompressor.process(chunk))
+        return self._count(self._decompressor.decompress(chunk, limit))
+
+    def flush(self):
+        """返回解压器中剩余的数据"""
+        if self._decompressor is None or self.encoding == 'br':
+            return b''
+        return self._count(self._decompressor.flush())
+
+    def _count(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            raise ResponseTooLarge(f"解压后的响应超过 {self.max_size} 字节")
+        return data
+
+def read_response(response, chunk_size=65536, should_cancel=None, max_size=MAX_DECODED_BYTES):
+    """
+    分块读取并解压响应体
+
+    Args:
+        response: urllib或http.client的响应对象
+        chunk_size: 每次读取的字节数
+        should_cancel: 每块之间调用，需要停止读取时由它抛出异常
+        max_size: 解压后的大小上限(字节)，为None时不限制
+
+    Returns:
+        tuple: (解压后的响应体, 传输的字节数)
+
+    Raises:
+        ResponseTooLarge: 解压后超过max_size
+    """
+    decoder = StreamDecoder(response.headers.get('Content-Encoding'), max_size)
+    chunks = []
+    wire_bytes = 0
+    while True:
+        if should_cancel is not None:
+            should_cancel()
+        chunk = response.read(chunk_size)
+        if not chunk:
+            break
+        wire_bytes += len(chunk)
+        chunks.append(decoder.decompress(chunk))
+    chunks.append(decoder.flush())
+    return b''.join(chunks), wire_bytes
+
+class TransferStats:
+    """按主机统计的传输字节数"""
+
+    def __init__(self):
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def record(self, url, wire_bytes, body_bytes):
+        """记录一个响应传输的字节数和解压后的字节数"""
+        host = urllib.parse.urlsplit(url).netloc
+        with self._lock:
+            entry = self._hosts.setdefault(host, {'responses': 0, 'compressed_bytes': 0, 'uncompressed_bytes': 0})
+            entry['responses'] += 1
+            entry['compressed_bytes'] += wire_bytes
+            entry['uncompressed_bytes'] += body_bytes
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: hosts为主机 -> responses、compressed_bytes、uncompressed_bytes，total为所有主机的合计
+        """
+        with self._lock:
+            hosts = {host: dict(entry) for host, entry in self._hosts.items()}
+        total = {'responses': 0, 'compressed_bytes': 0, 'uncompressed_bytes': 0}
+        for entry in hosts.values():
+            for key in total:
+                total[key] += entry[key]
+        return {'hosts': hosts, 'total': total}
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+分布式爬取的工作单元租约
+
+协调节点(python server.py --coordinator)把任务按偏移量范围拆分成工作单元，保存在任务检查点的
+units字段中。工作节点(python iframe_scraper.py --worker <协调节点URL>)领取单元的租约，
+运行期间定期发送心跳，完成后把结果发回协调节点；租约过期(工作节点退出或失联)的单元
+会重新分配给其他工作节点。
+
+本文件包含协调节点使用的单元和租约操作，以及工作节点的主循环。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+
+from result_writers import read_results
+from profiling import profile_paths
+
+UNIT_PENDING = 'pending'
+UNIT_LEASED = 'leased'
+UNIT_DONE = 'done'
+UNIT_FAILED = 'failed'
+
+def split_units(start, end, unit_size):
+    """把偏移量范围[start, end)拆分成最多unit_size个游戏的工作单元"""
+    return [
+        {
+            'start': unit_start,
+            'end': min(unit_start + unit_size, end),
+            'status': UNIT_PENDING,
+            'attempts': 0,
+            'lease': None,
+            'processed': 0,
+            'part_file': None
+        }
+        for unit_start in range(start, end, unit_size)
+    ]
+
+def make_lease_id(job_id, index):
+    """租约ID，包含任务ID和单元序号，协调节点可以直接找到对应的单元"""
+    return f"{job_id}:{index}:{uuid.uuid4().hex[:12]}"
+
+def parse_lease_id(lease_id):
+    """
+    Returns:
+        tuple: (任务ID, 单元序号)，格式不正确时返回(None, None)
+    """
+    parts = str(lease_id or '').split(':')
+    if len(parts) != 3 or not parts[1].isdigit():
+        return None, None
+    return parts[0], int(parts[1])
+
+def expire_leases(units, now=None):
+    """
+    把租约已过期的单元恢复为待分配
+
+    Returns:
+        int: 恢复的单元数
+    """
+    now = time.time() if now is None else now
+    expired = 0
+    for unit in units:
+        if unit['status'] == UNIT_LEASED and unit['lease']['expires'] < now:
+            unit['status'] = UNIT_PENDING
+            unit['lease'] = None
+            unit['processed'] = 0
+            expired += 1
+    return expired
+
+def next_pending_unit(units):
+    """第一个待分配的单元序号，没有时返回None"""
+    for index, unit in enumerate(units):
+        if unit['status'] == UNIT_PENDING:
+            return index
+    return None
+
+def grant_lease(job_id, units, index, worker_id, lease_seconds, now=None):
+    """把单元租给工作节点，返回租约"""
+    now = time.time() if now is None else now
+    unit = units[index]
+    unit['status'] = UNIT_LEASED
+    unit['attempts'] += 1
+    unit['processed'] = 0
+    unit['lease'] = {
+        'id': make_lease_id(job_id, index),
+        'worker': worker_id,
+        'granted_at': now,
+        'expires': now + lease_seconds
+    }
+    return unit['lease']
+
+def lease_matches(unit, lease_id):
+    """单元当前是否由这个租约持有"""
+    return unit['status'] == UNIT_LEASED and unit['lease'] is not None and unit['lease']['id'] == lease_id
+
+def release_unit(unit, failed=False):
+    """工作节点放弃单元，failed为True时不再分配"""
+    unit['status'] = UNIT_FAILED if failed else UNIT_PENDING
+    unit['lease'] = None
+    unit['processed'] = 0
+
+def has_leased_units(units, now=None):
+    """是否有租约未过期的单元"""
+    now = time.time() if now is None else now
+    return any(unit['status'] == UNIT_LEASED and unit['lease']['expires'] >= now for unit in units)
+
+def units_finished(units):
+    """所有单元都已完成或失败"""
+    return all(unit['status'] in (UNIT_DONE, UNIT_FAILED) for unit in units)
+
+def covered_until(units, offset):
+    """从offset开始连续完成的范围的结束偏移量"""
+    cursor = offset
+    for unit in units:
+        if unit['status'] != UNIT_DONE:
+            break
+        cursor = unit['start'] + min(unit['processed'], unit['end'] - unit['start'])
+        if cursor < unit['end']:
+            break
+    return cursor
+
+def unit_summary(units):
+    """各状态的单元数量"""
+    summary = {UNIT_PENDING: 0, UNIT_LEASED: 0, UNIT_DONE: 0, UNIT_FAILED: 0}
+    for unit in units:
+        summary[unit['status']] += 1
+    summary['total'] = len(units)
+    return summary
+
+# 工作节点发回的结果中允许的字段及其类型(与iframe_scraper.py的命令行结果相同)
+UNIT_RESULT_FIELDS = {
+    'title': str,
+    'game_url': str,
+    'iframe_src': str,
+    'position': int,
+    'timestamp': str,
+    'game_id': (str, int),
+    'description': str,
+    'thumbnail_url': str,
+    'author': str,
+    'author_url': str,
+    'tags': list,
+    'rating': (int, float),
+    'rating_count': int,
+    'embed_width': int,
+    'embed_height': int,
+    'fullscreen': bool,
+    'mobile_friendly': bool,
+    'game_info': dict,
+    'embed_check': dict
+}
+
+# 每个结果必须包含的字段
+UNIT_RESULT_REQUIRED = ('game_url', 'iframe_src')
+
+def validate_unit_results(results):
+    """
+    检查工作节点发回的结果，合并到任务结果、游戏索引和变化历史之前调用
+
+    Returns:
+        str: 第一个问题的说明，所有结果都有效时返回None
+    """
+    if not isinstance(results, list):
+        return 'results must be a list'
+    for i, result in enumerate(results):
+        if not isinstance(result, dict):
+            return f'result {i} is not an object'
+        unknown = set(result) - set(UNIT_RESULT_FIELDS)
+        if unknown:
+            return f"result {i} has unexpected fields: {', '.join(sorted(unknown))}"
+        for field in UNIT_RESULT_REQUIRED:
+            if not result.get(field):
+                return f'result {i} is missing {field}'
+        for field, value in result.items():
+            expected = UNIT_RESULT_FIELDS[field]
+            # bool是int的子类，只有声明为bool的字段接受布尔值
+            if value is not None and (not isinstance(value, expected) or
+                                      (isinstance(value, bool) and expected is not bool)):
+                return f'result {i} has an invalid {field}'
+        if not result['game_url'].startswith(('http://', 'https://')):
+            return f'result {i} has an invalid game_url'
+    return None
+
+class CoordinatorClient:
+    """工作节点访问协调节点的HTTP客户端"""
+
+    def __init__(self, base_url, token=None, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def post(self, path, payload):
+        """
+        发送JSON请求
+
+        Returns:
+            tuple: (HTTP状态码, 响应JSON)
+        """
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['X-Worker-Token'] = self.token
+        req = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+            headers=headers,
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read().decode('utf-8') or '{}')
+        except urllib.error.HTTPError as e:
+            try:
+                body = json.loads(e.read().decode('utf-8') or '{}')
+            except ValueError:
+                body = {}
+            return e.code, body
+
+class LeaseHeartbeat(threading.Thread):
+    """租约心跳线程，协调节点要求停止或租约丢失时创建停止文件"""
+
+    def __init__(self, client, lease_id, interval, stop_file):
+        super().__init__(daemon=True)
+        self.client = client
+        self.lease_id = lease_id
+        self.interval = interval
+        self.stop_file = stop_file
+        self.processed = 0
+        self.stop_requested = False
+        self.lease_lost = False
+        self._finished = threading.Event()
+
+    def run(self):
+        while not self._finished.wait(self.interval):
+            try:
+                status, body = self.client.post('/api/work/heartbeat', {
+                    'lease_id': self.lease_id,
+                    'processed': self.processed
+                })
+            except Exception as e:
+                # 暂时连不上协调节点时继续爬取，租约过期后由协调节点重新分配
+                print(f"心跳失败: {e}")
+                continue
+            if status == 409:
+                self.lease_lost = True
+            elif body.get('stop'):
+                self.stop_requested = True
+            if self.lease_lost or self.stop_requested:
+                with open(self.stop_file, 'w', encoding='utf-8') as f:
+                    f.write('lease lost' if self.lease_lost else 'stop')
+                return
+
+    def finish(self):
+        self._finished.set()
+
+def run_leased_unit(client, lease, scraper_script):
+    """
+    运行一个工作单元：在子进程中运行爬虫，完成后把结果发回协调节点
+
+    Args:
+        client: CoordinatorClient
+        lease: 协调节点返回的租约
+        scraper_script: iframe_scraper.py的路径
+    """
+    lease_id = lease['lease_id']
+    with tempfile.TemporaryDirectory(prefix='iframe_worker_') as work_dir:
+        output_file = os.path.join(work_dir, 'results.json')
+        stop_file = os.path.join(work_dir, 'stop')
+        cmd = [
+            sys.executable, scraper_script,
+            '--start_offset', str(lease['start_offset']),
+            '--max_games', str(lease['max_games']),
+            '--output', output_file,
+            '--stop_file', stop_file,
+            '--save_interval', '10'
+        ]
+        if lease.get('delay'):
+            cmd.extend(['--delay', str(lease['delay'])])
+        if lease.get('categories'):
+            cmd.extend(['--categories', ','.join(lease['categories'])])
+        if lease.get('include_info'):
+            cmd.extend(['--include_info', ','.join(lease['include_info'])])
+        profile_prefix = os.path.join(work_dir, 'profile')
+        if lease.get('profile'):
+            cmd.extend(['--profile', lease['profile'], '--profile_output', profile_prefix])
+
+        heartbeat = LeaseHeartbeat(client, lease_id, lease.get('heartbeat_interval', 20), stop_file)
+        heartbeat.start()
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1
+        )
+        processed = 0
+        for line in iter(process.stdout.readline, ''):
+            sys.stdout.write(line)
+            for marker in ('已处理 ', '总共处理 '):
+                if marker in line and ' 个游戏' in line:
+                    try:
+                        processed = int(line.split(marker)[1].split(' 个游戏')[0])
+                        heartbeat.processed = processed
+                    except ValueError:
+                        pass
+        process.wait()
+        heartbeat.finish()
+
+        if heartbeat.lease_lost:
+            print(f"租约 {lease_id} 已失效，丢弃结果")
+            return
+        if heartbeat.stop_requested:
+            client.post('/api/work/fail', {'lease_id': lease_id, 'reason': 'stopped'})
+            print(f"协调节点要求停止单元 {lease_id}")
+            return
+        if process.returncode != 0:
+            client.post('/api/work/fail', {'lease_id': lease_id, 'error': f"爬虫退出码 {process.returncode}"})
+            return
+
+        results = read_results(output_file) if os.path.exists(output_file) else []
+        # 文字格式的性能分析结果随结果一起发回协调节点
+        profiles = {}
+        if lease.get('profile'):
+            for path in profile_paths(profile_prefix, lease['profile']):
+                if os.path.exists(path) and not path.endswith('.prof'):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        profiles[os.path.basename(path)[len('profile'):]] = f.read()
+        status, body = client.post('/api/work/complete', {
+            'lease_id': lease_id,
+            'processed': processed,
+            'results': results,
+            'profiles': profiles
+        })
+        print(f"单元 {lease_id} 完成: 处理 {processed} 个游戏，{len(results)} 个结果，协调节点响应 {status} {body.get('message', '')}")
+
+def run_worker(coordinator_url, worker_id=None, token=None, poll_interval=5):
+    """
+    工作节点主循环：领取租约、运行工作单元，没有工作时等待poll_interval秒
+
+    Args:
+        coordinator_url: 协调节点的地址，如 http://127.0.0.1:5000
+        worker_id: 工作节点名称，默认为 主机名:进程ID
+        token: 协调节点设置了WORKER_TOKEN时需要提供
+        poll_interval: 没有工作时再次领取的间隔(秒)
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    scraper_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'iframe_scraper.py')
+    client = CoordinatorClient(coordinator_url, token)
+    print(f"工作节点 {worker_id} 已启动，协调节点: {coordinator_url}")
+
+    while True:
+        try:
+            status, body = client.post('/api/work/lease', {'worker_id': worker_id})
+        except Exception as e:
+            print(f"无法连接协调节点: {e}")
+            time.sleep(poll_interval)
+            continue
+        lease = body.get('lease') if status == 200 else None
+        if not lease:
+            if status != 200:
+                print(f"领取工作失败: {status} {body.get('message', '')}")
+            time.sleep(poll_interval)
+            continue
+
+        print(f"领取单元 {lease['lease_id']}: 偏移量 {lease['start_offset']}，{lease['max_games']} 个游戏")
+        try:
+            run_leased_unit(client, lease, scraper_script)
+        except Exception as e:
+            print(f"运行单元 {lease['lease_id']} 出错: {e}")
+            try:
+                client.post('/api/work/fail', {'lease_id': lease['lease_id'], 'error': str(e)})
+            except Exception:
+                pass